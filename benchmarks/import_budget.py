@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入耗时预算检查
+
+在干净的子进程中导入 viral_article_cli，检查三件事：
+1. 导入耗时（python -X importtime 的累计值，取多次最小值）不超过预算
+2. 导入后没有加载SDK、YAML、asyncio等重量级模块（应在使用时才导入）
+3. 导入不产生副作用（不在当前目录创建日志等文件）
+
+任一项不满足时以非零退出码结束，可放在发布前检查或CI中跟踪启动耗时。
+
+使用方法:
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 60 --runs 10 --top 15
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULE = "viral_article_cli"
+
+DEFAULT_BUDGET_MS = 75.0
+
+# 导入模块时不应加载的模块（只在对应功能被使用时导入）
+DEFERRED_MODULES = (
+    'openai', 'anthropic', 'google.generativeai', 'httpx', 'yaml',
+    'asyncio', 'concurrent.futures',
+)
+
+_PROBE = """
+import json, sys
+sys.path.insert(0, {root!r})
+import {module}
+print(json.dumps(sorted(name for name in {deferred!r} if name in sys.modules)))
+"""
+
+
+def measure_once(cwd: str) -> Tuple[Dict[str, Tuple[int, int]], List[str]]:
+    """
+    运行一次导入
+
+    Returns:
+        tuple: ({模块: (自身耗时us, 累计耗时us)}, 被提前加载的模块列表)；
+               字典只包含由 viral_article_cli 触发导入的模块及其自身
+    """
+    probe = _PROBE.format(root=str(ROOT), module=MODULE, deferred=DEFERRED_MODULES)
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', probe],
+        cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    # -X importtime 按完成顺序输出，子模块在父模块之前，缩进更深
+    timings: Dict[str, Tuple[int, int]] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, raw_name = line[len('import time:'):].split('|')
+        name = raw_name.strip()
+        top_level = len(raw_name) - len(raw_name.lstrip()) <= 1
+        if top_level and name != MODULE:
+            timings.clear()
+            continue
+        timings[name] = (int(self_us), int(cumulative_us))
+        if name == MODULE:
+            break
+    loaded = json.loads(completed.stdout.strip().splitlines()[-1])
+    return timings, loaded
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=f'{MODULE} 导入耗时预算检查')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS, help='导入耗时预算（毫秒）')
+    parser.add_argument('--runs', type=int, default=5, help='重复次数，取最小值')
+    parser.add_argument('--top', type=int, default=10, help='列出累计耗时最高的模块数')
+    args = parser.parse_args()
+
+    # 先生成字节码缓存，避免把编译时间计入预算（设置了 PYTHONDONTWRITEBYTECODE 时导入不会写缓存）
+    import py_compile
+    py_compile.compile(str(ROOT / f"{MODULE}.py"), doraise=True)
+
+    failures = []
+    best = None
+    with tempfile.TemporaryDirectory() as cwd:
+        for _ in range(max(1, args.runs)):
+            timings, loaded = measure_once(cwd)
+            if best is None or timings[MODULE][1] < best[MODULE][1]:
+                best = timings
+        created = os.listdir(cwd)
+
+    total_ms = best[MODULE][1] / 1000
+    print(f"{MODULE} 导入耗时: {total_ms:.1f}ms（自身 {best[MODULE][0] / 1000:.1f}ms，预算 {args.budget_ms:.0f}ms）")
+    print(f"\n累计耗时最高的 {args.top} 个模块:")
+    ranked = sorted(
+        ((name, cumulative) for name, (_, cumulative) in best.items() if name != MODULE),
+        key=lambda item: item[1], reverse=True
+    )
+    for name, cumulative in ranked[:args.top]:
+        print(f"  {cumulative / 1000:8.1f}ms  {name}")
+
+    if total_ms > args.budget_ms:
+        failures.append(f"导入耗时 {total_ms:.1f}ms 超出预算 {args.budget_ms:.0f}ms")
+    if loaded:
+        failures.append(f"导入时加载了应延迟导入的模块: {', '.join(loaded)}")
+    if created:
+        failures.append(f"导入时在当前目录创建了文件: {', '.join(created)}")
+
+    print()
+    for failure in failures:
+        print(f"❌ {failure}")
+    if failures:
+        return 1
+    print("✅ 导入耗时预算检查通过")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟API服务（基准测试用）
+
+在一个端口上同时模拟三种协议，包括流式输出：
+- OpenAI:    POST /v1/chat/completions
+- Anthropic: POST /v1/messages
+- Gemini:    POST /v1beta/models/{model}:generateContent
+             POST /v1beta/models/{model}:streamGenerateContent
+
+可配置首字延迟、输出速度、输出长度、错误率与429比例，
+只依赖标准库，不访问任何真实API。
+
+使用方法:
+    python benchmarks/mock_server.py --port 8765 --ttft 0.3 --tps 300
+    python viral_article_cli.py "测试主题" --base-url http://127.0.0.1:8765/v1 --api-key mock
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass, asdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+
+# 生成内容时循环使用的中文段落
+SAMPLE_TEXT = (
+    "很多人以为写出爆款靠的是运气，其实背后有一套可以复用的方法。"
+    "先抓住读者最关心的问题，再用一个具体的故事把道理讲透，"
+    "最后给出马上就能用的行动清单。"
+)
+
+_GEMINI_PATH_RE = re.compile(r'^/v1beta/models/([^:/]+):(generateContent|streamGenerateContent)$')
+
+
+@dataclass
+class MockSettings:
+    """模拟服务参数"""
+    ttft: float = 0.2               # 首个token前的延迟（秒）
+    tokens_per_second: float = 200  # 输出速度
+    output_tokens: int = 400        # 每次响应的输出token数（受请求 max_tokens 限制）
+    chunk_tokens: int = 8           # 流式每块的token数
+    error_rate: float = 0.0         # 返回503的概率
+    rate_limit_rate: float = 0.0    # 返回429的概率
+    retry_after: float = 0.2        # 429响应的 Retry-After（秒）
+
+
+class MockStats:
+    """请求计数（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def bump(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts)
+
+
+def make_tokens(count: int) -> List[str]:
+    """生成指定数量的"token"（每个token为1个汉字，约每80个token分段）"""
+    tokens = []
+    for i in range(count):
+        char = SAMPLE_TEXT[i % len(SAMPLE_TEXT)]
+        tokens.append(char + ("\n\n" if i % 80 == 79 else ""))
+    return tokens
+
+
+def estimate_prompt_tokens(body: Dict[str, Any]) -> int:
+    """按请求体长度粗略估算输入token数"""
+    return max(1, len(json.dumps(body, ensure_ascii=False)) // 2)
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """模拟三种协议的请求处理器"""
+
+    protocol_version = "HTTP/1.1"
+    settings = MockSettings()
+    stats = MockStats()
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    # ------------------------------------------------------------------
+    # 路由
+    # ------------------------------------------------------------------
+
+    def do_GET(self) -> None:
+        path = urlparse(self.path).path
+        if path == '/health':
+            self._send_json(200, {"status": "ok"})
+        elif path == '/stats':
+            self._send_json(200, {"settings": asdict(self.settings), "counts": self.stats.snapshot()})
+        else:
+            self._send_json(404, {"error": {"message": f"not found: {path}"}})
+
+    def do_HEAD(self) -> None:
+        # 客户端连接预热
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self) -> None:
+        url = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid json"}})
+            return
+
+        gemini = _GEMINI_PATH_RE.match(url.path)
+        if url.path.endswith('/chat/completions'):
+            protocol = 'openai'
+        elif url.path.endswith('/messages'):
+            protocol = 'anthropic'
+        elif gemini:
+            protocol = 'gemini'
+        else:
+            # 包括 Gemini cachedContents：返回404，客户端回退为普通系统提示词
+            self.stats.bump('not_found')
+            self._send_json(404, {"error": {"code": 404, "message": f"not found: {url.path}"}})
+            return
+
+        self.stats.bump(f'{protocol}_requests')
+        if self._inject_failure(protocol):
+            return
+
+        if protocol == 'openai':
+            self._openai(body)
+        elif protocol == 'anthropic':
+            self._anthropic(body)
+        else:
+            stream = gemini.group(2) == 'streamGenerateContent'
+            sse = parse_qs(url.query).get('alt') == ['sse']
+            self._gemini(body, gemini.group(1), stream, sse)
+
+    def _inject_failure(self, protocol: str) -> bool:
+        """按配置的概率返回429或503"""
+        roll = random.random()
+        if roll < self.settings.rate_limit_rate:
+            self.stats.bump('rate_limited')
+            self._send_json(
+                429,
+                {"error": {"code": 429, "type": "rate_limit_error", "message": "mock rate limit"}},
+                headers={"Retry-After": f"{self.settings.retry_after:g}"}
+            )
+            return True
+        if roll < self.settings.rate_limit_rate + self.settings.error_rate:
+            self.stats.bump('errors')
+            self._send_json(
+                503,
+                {"error": {"code": 503, "type": "overloaded_error", "message": "mock overloaded"}}
+            )
+            return True
+        return False
+
+    # ------------------------------------------------------------------
+    # 输出节奏
+    # ------------------------------------------------------------------
+
+    def _plan(self, max_tokens: Optional[int]) -> Tuple[List[str], bool]:
+        """返回 (输出token列表, 是否因 max_tokens 截断)"""
+        count = self.settings.output_tokens
+        truncated = bool(max_tokens) and max_tokens < count
+        if truncated:
+            count = max_tokens
+        return make_tokens(count), truncated
+
+    def _paced_chunks(self, tokens: List[str]) -> Iterator[str]:
+        """按首字延迟与输出速度逐块产出文本"""
+        time.sleep(self.settings.ttft)
+        size = max(1, self.settings.chunk_tokens)
+        interval = size / self.settings.tokens_per_second if self.settings.tokens_per_second else 0
+        for i in range(0, len(tokens), size):
+            if i:
+                time.sleep(interval)
+            yield "".join(tokens[i:i + size])
+
+    def _full_text(self, tokens: List[str]) -> str:
+        """非流式：等待完整生成时间后一次返回"""
+        duration = self.settings.ttft
+        if self.settings.tokens_per_second:
+            duration += len(tokens) / self.settings.tokens_per_second
+        time.sleep(duration)
+        return "".join(tokens)
+
+    # ------------------------------------------------------------------
+    # 各协议
+    # ------------------------------------------------------------------
+
+    def _openai(self, body: Dict[str, Any]) -> None:
+        model = body.get('model', 'mock')
+        tokens, truncated = self._plan(body.get('max_tokens') or body.get('max_completion_tokens'))
+        finish_reason = "length" if truncated else "stop"
+        prompt_tokens = estimate_prompt_tokens(body)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        base = {"id": "chatcmpl-mock", "created": int(time.time()), "model": model}
+
+        if not body.get('stream'):
+            self._send_json(200, dict(base, object="chat.completion", choices=[{
+                "index": 0,
+                "message": {"role": "assistant", "content": self._full_text(tokens)},
+                "finish_reason": finish_reason,
+            }], usage=usage))
+            return
+
+        def events() -> Iterator[str]:
+            chunk = dict(base, object="chat.completion.chunk")
+            for text in self._paced_chunks(tokens):
+                yield self._sse(dict(chunk, choices=[{
+                    "index": 0, "delta": {"role": "assistant", "content": text}, "finish_reason": None
+                }]))
+            yield self._sse(dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": finish_reason}]))
+            if (body.get('stream_options') or {}).get('include_usage'):
+                yield self._sse(dict(chunk, choices=[], usage=usage))
+            yield "data: [DONE]\n\n"
+
+        self._send_stream('text/event-stream', events())
+
+    def _anthropic(self, body: Dict[str, Any]) -> None:
+        model = body.get('model', 'mock')
+        tokens, truncated = self._plan(body.get('max_tokens'))
+        stop_reason = "max_tokens" if truncated else "end_turn"
+        input_tokens = estimate_prompt_tokens(body)
+        message = {
+            "id": "msg_mock", "type": "message", "role": "assistant", "model": model,
+            "stop_sequence": None,
+        }
+
+        if not body.get('stream'):
+            self._send_json(200, dict(
+                message,
+                content=[{"type": "text", "text": self._full_text(tokens)}],
+                stop_reason=stop_reason,
+                usage={"input_tokens": input_tokens, "output_tokens": len(tokens)}
+            ))
+            return
+
+        def events() -> Iterator[str]:
+            yield self._sse({"type": "message_start", "message": dict(
+                message, content=[], stop_reason=None,
+                usage={"input_tokens": input_tokens, "output_tokens": 1}
+            )}, event="message_start")
+            yield self._sse({
+                "type": "content_block_start", "index": 0,
+                "content_block": {"type": "text", "text": ""}
+            }, event="content_block_start")
+            for text in self._paced_chunks(tokens):
+                yield self._sse({
+                    "type": "content_block_delta", "index": 0,
+                    "delta": {"type": "text_delta", "text": text}
+                }, event="content_block_delta")
+            yield self._sse({"type": "content_block_stop", "index": 0}, event="content_block_stop")
+            yield self._sse({
+                "type": "message_delta",
+                "delta": {"stop_reason": stop_reason, "stop_sequence": None},
+                "usage": {"output_tokens": len(tokens)}
+            }, event="message_delta")
+            yield self._sse({"type": "message_stop"}, event="message_stop")
+
+        self._send_stream('text/event-stream', events())
+
+    def _gemini(self, body: Dict[str, Any], model: str, stream: bool, sse: bool) -> None:
+        config = body.get('generationConfig') or body.get('generation_config') or {}
+        tokens, truncated = self._plan(config.get('maxOutputTokens') or config.get('max_output_tokens'))
+        prompt_tokens = estimate_prompt_tokens(body)
+        usage = {
+            "promptTokenCount": prompt_tokens,
+            "candidatesTokenCount": len(tokens),
+            "totalTokenCount": prompt_tokens + len(tokens),
+        }
+
+        def response(text: str, finish: bool) -> Dict[str, Any]:
+            candidate: Dict[str, Any] = {"content": {"parts": [{"text": text}], "role": "model"}, "index": 0}
+            data: Dict[str, Any] = {"candidates": [candidate], "modelVersion": model}
+            if finish:
+                candidate["finishReason"] = "MAX_TOKENS" if truncated else "STOP"
+                data["usageMetadata"] = usage
+            return data
+
+        if not stream:
+            self._send_json(200, response(self._full_text(tokens), True))
+            return
+
+        def chunks() -> Iterator[Dict[str, Any]]:
+            # 延后一块输出，使最后一块携带 finishReason 与用量
+            pending = None
+            for text in self._paced_chunks(tokens):
+                if pending is not None:
+                    yield response(pending, False)
+                pending = text
+            yield response(pending or "", True)
+
+        if sse:
+            self._send_stream('text/event-stream', (self._sse(data) for data in chunks()))
+            return
+
+        # REST 传输的流式响应是逐步输出的JSON数组
+        def array() -> Iterator[str]:
+            for i, data in enumerate(chunks()):
+                yield ("[" if i == 0 else ",\r\n") + json.dumps(data, ensure_ascii=False)
+            yield "]"
+
+        self._send_stream('application/json', array())
+
+    # ------------------------------------------------------------------
+    # 输出
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+        prefix = f"event: {event}\n" if event else ""
+        return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    def _send_json(self, status: int, data: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _send_stream(self, content_type: str, parts: Iterator[str]) -> None:
+        """以 chunked 编码逐块发送，保持连接可复用"""
+        self.send_response(200)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        try:
+            for part in parts:
+                data = part.encode('utf-8')
+                self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端提前断开（如提前停止流式生成）
+            self.close_connection = True
+
+
+class MockServer(ThreadingHTTPServer):
+    """多线程模拟服务"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+
+def create_server(settings: MockSettings, host: str = '127.0.0.1', port: int = 0) -> MockServer:
+    """
+    创建模拟服务（port=0 时自动选择空闲端口）
+
+    Returns:
+        MockServer: 调用 serve_forever() 启动
+    """
+    handler = type('ConfiguredMockHandler', (MockHandler,), {
+        'settings': settings,
+        'stats': MockStats(),
+    })
+    return MockServer((host, port), handler)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='OpenAI/Anthropic/Gemini 本地模拟服务')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765, help='监听端口，0为自动选择')
+    parser.add_argument('--ttft', type=float, default=MockSettings.ttft, help='首字延迟（秒）')
+    parser.add_argument('--tps', type=float, default=MockSettings.tokens_per_second, help='每秒输出token数')
+    parser.add_argument('--output-tokens', type=int, default=MockSettings.output_tokens, help='每次响应的输出token数')
+    parser.add_argument('--chunk-tokens', type=int, default=MockSettings.chunk_tokens, help='流式每块token数')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回503的概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='返回429的概率')
+    parser.add_argument('--retry-after', type=float, default=MockSettings.retry_after, help='429的Retry-After秒数')
+    args = parser.parse_args()
+
+    settings = MockSettings(
+        ttft=args.ttft,
+        tokens_per_second=args.tps,
+        output_tokens=args.output_tokens,
+        chunk_tokens=args.chunk_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+    )
+    server = create_server(settings, args.host, args.port)
+    # 首行输出实际地址，供基准测试脚本读取
+    print(f"http://{args.host}:{server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
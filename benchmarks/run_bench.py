@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+离线基准测试
+
+启动本地模拟服务（benchmarks/mock_server.py），在不访问真实API的情况下
+测量生成器在并发负载下的吞吐、延迟、首字延迟（TTFT）与内存，
+以及CLI的冷启动与单次运行耗时。
+
+每个场景在独立子进程中运行，客户端池、熔断器与内存峰值互不影响。
+结果可保存为JSON，并与其他提交的结果对比。
+
+使用方法:
+    python benchmarks/run_bench.py
+    python benchmarks/run_bench.py --requests 200 --concurrency 32 --output before.json
+    python benchmarks/run_bench.py --compare before.json
+    python benchmarks/run_bench.py --platforms openai --modes stream --rate-limit-rate 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform as platform_module
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+from urllib.request import urlopen
+
+ROOT = Path(__file__).resolve().parent.parent
+CLI_PATH = ROOT / "viral_article_cli.py"
+MOCK_SERVER_PATH = Path(__file__).resolve().parent / "mock_server.py"
+
+PLATFORMS = ('openai', 'claude', 'gemini')
+MODES = ('complete', 'stream', 'async')
+
+# 对比时数值越小越好的指标
+LOWER_IS_BETTER = (
+    'wall_seconds', 'latency_p50', 'latency_p95', 'latency_p99',
+    'ttft_p50', 'ttft_p95', 'rss_peak_mb', 'rss_delta_mb',
+    'import_seconds', 'cli_p50', 'cli_p95', 'failed', 'retries',
+)
+
+
+def base_url_for(server_url: str, platform: str) -> str:
+    """各SDK对 base_url 的约定不同：OpenAI 需要包含 /v1"""
+    return f"{server_url}/v1" if platform == 'openai' else server_url
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def rss_mb() -> float:
+    """当前进程的峰值常驻内存（MB）"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# ============================================================================
+# 模拟服务
+# ============================================================================
+
+class MockServerProcess:
+    """以子进程运行模拟服务"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.command = [
+            sys.executable, str(MOCK_SERVER_PATH), '--port', '0',
+            '--ttft', str(args.ttft),
+            '--tps', str(args.tps),
+            '--output-tokens', str(args.output_tokens),
+            '--chunk-tokens', str(args.chunk_tokens),
+            '--error-rate', str(args.error_rate),
+            '--rate-limit-rate', str(args.rate_limit_rate),
+            '--retry-after', str(args.retry_after),
+        ]
+        self.process: Optional[subprocess.Popen] = None
+        self.url = ""
+
+    def __enter__(self) -> 'MockServerProcess':
+        self.process = subprocess.Popen(self.command, stdout=subprocess.PIPE, text=True)
+        self.url = self.process.stdout.readline().strip()
+        if not self.url:
+            raise RuntimeError("模拟服务启动失败")
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.process.terminate()
+        self.process.wait(timeout=10)
+
+    def stats(self) -> Dict[str, int]:
+        with urlopen(f"{self.url}/stats") as response:
+            return json.loads(response.read())['counts']
+
+
+# ============================================================================
+# 生成器场景（在子进程中执行）
+# ============================================================================
+
+def _scenario_worker(spec: Dict[str, Any], queue: Any) -> None:
+    """在独立进程中运行一个场景，通过队列返回指标"""
+    try:
+        queue.put(_run_scenario(spec))
+    except BaseException as e:  # noqa: B902 - 子进程中的任何异常都需要回传
+        queue.put({'error': f"{type(e).__name__}: {e}"})
+
+
+def _run_scenario(spec: Dict[str, Any]) -> Dict[str, Any]:
+    sys.path.insert(0, str(ROOT))
+    import logging
+    logging.disable(logging.INFO)
+    import viral_article_cli as vac
+
+    config = vac.GenerationConfig(
+        topic="如何在30天内养成早起习惯",
+        platform=spec['platform'],
+        api_key="mock",
+        word_count=spec['word_count'],
+        max_tokens=spec['max_tokens'],
+        stream=spec['mode'] == 'stream',
+        use_cache=False,
+        prompt_cache=False,
+        base_url=spec['base_url'],
+    )
+    vac.default_retry_policy = vac.RetryPolicy(base_delay=spec['retry_base_delay'])
+
+    def generate_one() -> Any:
+        generator = vac.create_generator(config)
+        generator.add_sink(vac.CallbackSink(lambda text: None))
+        return generator.generate()
+
+    async def agenerate_all(count: int) -> List[Any]:
+        semaphore = asyncio.Semaphore(spec['concurrency'])
+
+        async def one() -> Any:
+            async with semaphore:
+                try:
+                    return await vac.create_generator(config).agenerate()
+                except vac.ViralContentError as e:
+                    return e
+        return await asyncio.gather(*(one() for _ in range(count)))
+
+    def run_threads(count: int) -> List[Any]:
+        def safe() -> Any:
+            try:
+                return generate_one()
+            except vac.ViralContentError as e:
+                return e
+        with ThreadPoolExecutor(max_workers=spec['concurrency']) as executor:
+            return list(executor.map(lambda _: safe(), range(count)))
+
+    run = (lambda n: asyncio.run(agenerate_all(n))) if spec['mode'] == 'async' else run_threads
+
+    # 预热：建立连接、加载Skill，不计入结果
+    run(min(spec['concurrency'], spec['requests']))
+    vac._circuit_breakers.clear()
+    baseline = rss_mb()
+
+    start = time.perf_counter()
+    outcomes = run(spec['requests'])
+    wall = time.perf_counter() - start
+
+    results = [r for r in outcomes if isinstance(r, vac.GenerationResult)]
+    latencies = [r.duration_seconds for r in results]
+    ttfts = [r.timings.ttft for r in results if r.timings.ttft is not None]
+    output_tokens = sum(r.output_tokens for r in results)
+    errors = sorted({str(e)[:120] for e in outcomes if not isinstance(e, vac.GenerationResult)})
+
+    return {
+        'requests': spec['requests'],
+        'succeeded': len(results),
+        'failed': len(outcomes) - len(results),
+        'retries': sum(r.timings.retries for r in results),
+        'wall_seconds': wall,
+        'requests_per_second': len(results) / wall if wall else None,
+        'output_tokens_per_second': output_tokens / wall if wall else None,
+        'latency_p50': percentile(latencies, 0.5),
+        'latency_p95': percentile(latencies, 0.95),
+        'latency_p99': percentile(latencies, 0.99),
+        'ttft_p50': percentile(ttfts, 0.5),
+        'ttft_p95': percentile(ttfts, 0.95),
+        'rss_peak_mb': rss_mb(),
+        'rss_delta_mb': rss_mb() - baseline,
+        'errors': errors[:5],
+    }
+
+
+def run_generator_scenario(spec: Dict[str, Any], server: MockServerProcess) -> Dict[str, Any]:
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    before = server.stats()
+    process = context.Process(target=_scenario_worker, args=(spec, queue))
+    process.start()
+    metrics = queue.get()
+    process.join()
+    after = server.stats()
+    metrics['server_rate_limited'] = after.get('rate_limited', 0) - before.get('rate_limited', 0)
+    metrics['server_errors'] = after.get('errors', 0) - before.get('errors', 0)
+    return metrics
+
+
+# ============================================================================
+# CLI 场景
+# ============================================================================
+
+def run_cli_scenario(server: MockServerProcess, runs: int) -> Dict[str, Any]:
+    """测量模块导入耗时与完整CLI单次运行耗时（含进程启动）"""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    import_times = []
+    for _ in range(max(3, runs)):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, '-c', 'import viral_article_cli'],
+            cwd=ROOT, env=env, check=True, capture_output=True
+        )
+        import_times.append(time.perf_counter() - start)
+
+    cli_times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env['HOME'] = tmp
+        for i in range(runs):
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [
+                    sys.executable, str(CLI_PATH), "如何在30天内养成早起习惯",
+                    '--platform', 'openai', '--api-key', 'mock', '--no-cache',
+                    '--base-url', base_url_for(server.url, 'openai'),
+                    '--output', str(Path(tmp) / f"out_{i}.md"),
+                ],
+                cwd=tmp, env=env, capture_output=True, text=True
+            )
+            cli_times.append(time.perf_counter() - start)
+            if completed.returncode != 0:
+                return {'error': completed.stderr.strip()[-500:]}
+
+    return {
+        'import_seconds': min(import_times),
+        'cli_p50': percentile(cli_times, 0.5),
+        'cli_p95': percentile(cli_times, 0.95),
+    }
+
+
+# ============================================================================
+# 结果输出与对比
+# ============================================================================
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args: str) -> str:
+        try:
+            return subprocess.run(
+                ['git', *args], cwd=ROOT, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {
+        'commit': git('rev-parse', '--short', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+    }
+
+
+def format_value(value: Any) -> str:
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    old_scenarios = (baseline or {}).get('scenarios', {})
+    for name, metrics in report['scenarios'].items():
+        print(f"\n[{name}]")
+        if 'error' in metrics:
+            print(f"  ❌ {metrics['error']}")
+            continue
+        old = old_scenarios.get(name, {})
+        for key, value in metrics.items():
+            if key == 'errors':
+                for error in value:
+                    print(f"  ! {error}")
+                continue
+            line = f"  {key:<26}{format_value(value):>12}"
+            previous = old.get(key)
+            if isinstance(value, (int, float)) and isinstance(previous, (int, float)) and previous:
+                change = (value - previous) / previous * 100
+                better = change < 0 if key in LOWER_IS_BETTER else change > 0
+                marker = "✅" if better and abs(change) >= 5 else ("⚠️ " if abs(change) >= 5 else "  ")
+                line += f"   {format_value(previous):>12} {change:+7.1f}% {marker}"
+            print(line)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='爆款内容生成器离线基准测试')
+    parser.add_argument('--platforms', default=','.join(PLATFORMS), help='逗号分隔的平台')
+    parser.add_argument('--modes', default=','.join(MODES), help='逗号分隔: complete,stream,async')
+    parser.add_argument('--requests', type=int, default=50, help='每个场景的请求数')
+    parser.add_argument('--concurrency', type=int, default=8, help='并发数')
+    parser.add_argument('--word-count', type=int, default=1000)
+    parser.add_argument('--max-tokens', type=int, default=4096)
+    parser.add_argument('--cli-runs', type=int, default=5, help='CLI场景运行次数，0为跳过')
+    parser.add_argument('--ttft', type=float, default=0.2, help='模拟首字延迟（秒）')
+    parser.add_argument('--tps', type=float, default=400, help='模拟每秒输出token数')
+    parser.add_argument('--output-tokens', type=int, default=400, help='模拟每次输出token数')
+    parser.add_argument('--chunk-tokens', type=int, default=8)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟503概率')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='模拟429概率')
+    parser.add_argument('--retry-after', type=float, default=0.2)
+    parser.add_argument('--retry-base-delay', type=float, default=0.1, help='客户端重试基础退避（秒）')
+    parser.add_argument('--output', help='保存结果JSON')
+    parser.add_argument('--compare', help='与之前保存的结果JSON对比')
+    args = parser.parse_args()
+
+    platforms = [p.strip() for p in args.platforms.split(',') if p.strip()]
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    settings = {
+        key: getattr(args, key) for key in (
+            'requests', 'concurrency', 'word_count', 'max_tokens', 'ttft', 'tps',
+            'output_tokens', 'chunk_tokens', 'error_rate', 'rate_limit_rate',
+            'retry_after', 'retry_base_delay',
+        )
+    }
+    report: Dict[str, Any] = {
+        'meta': dict(
+            git_revision(),
+            timestamp=datetime.now().isoformat(timespec='seconds'),
+            python=platform_module.python_version(),
+            machine=platform_module.platform(),
+            settings=settings,
+        ),
+        'scenarios': {},
+    }
+
+    with MockServerProcess(args) as server:
+        print(f"模拟服务: {server.url}")
+        for platform in platforms:
+            for mode in modes:
+                name = f"{platform}/{mode}"
+                print(f"运行 {name} ...", flush=True)
+                spec = dict(settings, platform=platform, mode=mode, base_url=base_url_for(server.url, platform))
+                report['scenarios'][name] = run_generator_scenario(spec, server)
+        if args.cli_runs > 0:
+            print("运行 cli ...", flush=True)
+            report['scenarios']['cli'] = run_cli_scenario(server, args.cli_runs)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        meta = baseline.get('meta', {})
+        print(f"\n对比基线: {meta.get('commit')} ({meta.get('timestamp')})")
+        if meta.get('settings') != settings:
+            print("⚠️  基线的测试参数与本次不同，结果可能不可比")
+    print_report(report, baseline)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"\n结果已保存: {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
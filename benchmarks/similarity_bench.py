@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+相似度索引基准测试
+
+向临时索引写入大量随机主题，测量近重复主题查询的单次耗时，
+用于确认查询耗时不随已存条目数增长（LSH只比较候选条目）。
+
+使用方法:
+    python benchmarks/similarity_bench.py
+    python benchmarks/similarity_bench.py --items 200000 --queries 2000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from viral_article_cli import (  # noqa: E402
+    SimilarityIndex, TOPIC_SHINGLE_SIZE, minhash_signature, shingles,
+)
+
+# 常用汉字区间内随机取字组成主题
+_CHARSET = [chr(code) for code in range(0x4E00, 0x4E00 + 3000)]
+
+
+def random_topic(rng: random.Random) -> str:
+    return ''.join(rng.choice(_CHARSET) for _ in range(rng.randint(8, 20)))
+
+
+def percentile(values, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='相似度索引查询耗时基准')
+    parser.add_argument('--items', type=int, default=100_000, help='预先写入的条目数')
+    parser.add_argument('--queries', type=int, default=1000, help='查询次数')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SimilarityIndex(str(Path(tmp) / 'similarity.sqlite3'))
+
+        start = time.perf_counter()
+        topics = []
+        batch = []
+        for i in range(args.items):
+            topic = random_topic(rng)
+            topics.append(topic)
+            batch.append((topic, minhash_signature(shingles(topic, TOPIC_SHINGLE_SIZE)), f"item-{i}"))
+            if len(batch) == 10_000:
+                index.add_many('topic', batch)
+                batch = []
+        if batch:
+            index.add_many('topic', batch)
+        print(f"写入 {index.count('topic')} 个条目，耗时 {time.perf_counter() - start:.1f}秒")
+
+        # 一半查询为已有主题的改写（应命中），一半为新主题
+        queries = []
+        for i in range(args.queries):
+            if i % 2 == 0:
+                topic = rng.choice(topics)
+                queries.append((topic[:-2] + rng.choice(_CHARSET), True))
+            else:
+                queries.append((random_topic(rng), False))
+        start = time.perf_counter()
+        signatures = [(minhash_signature(shingles(q, TOPIC_SHINGLE_SIZE)), hit) for q, hit in queries]
+        signature_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        lookups = []
+        hits = false_hits = 0
+        for signature, expected in signatures:
+            start = time.perf_counter()
+            match = index.nearest('topic', signature)
+            lookups.append((time.perf_counter() - start) * 1000)
+            found = match is not None and match.similarity >= 0.6
+            hits += found and expected
+            false_hits += found and not expected
+
+    half = args.queries // 2
+    print(
+        f"查询耗时（不含签名计算）: p50 {statistics.median(lookups):.3f}ms，"
+        f"p95 {percentile(lookups, 0.95):.3f}ms，p99 {percentile(lookups, 0.99):.3f}ms"
+    )
+    print(f"签名计算: 平均 {signature_ms:.3f}ms/主题")
+    print(f"改写主题命中 {hits}/{args.queries - half}，新主题误报 {false_hits}/{half}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""测试公共夹具：模块导入路径与本地模拟服务"""
+
+import sys
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+import viral_article_cli as vac  # noqa: E402
+from mock_server import MockSettings, create_server  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def reset_circuit_breakers():
+    """熔断器为进程内全局状态，每个测试前后清空"""
+    vac._circuit_breakers.clear()
+    yield
+    vac._circuit_breakers.clear()
+
+
+@contextmanager
+def serve_mock(settings: MockSettings):
+    """在后台线程运行模拟服务，返回服务地址"""
+    server = create_server(settings)
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def mock_api():
+    """
+    本地模拟服务（OpenAI / Anthropic / Gemini 协议）
+
+    返回 (服务地址, 设置)；测试可直接修改设置的字段调整延迟、输出长度与错误率。
+    """
+    settings = MockSettings(ttft=0.01, tokens_per_second=20000, output_tokens=200, chunk_tokens=8)
+    try:
+        with serve_mock(settings) as base_url:
+            yield base_url, settings
+    finally:
+        vac.client_pool.close()
+
+
+def make_config(base_url: str, platform: str = 'openai', **overrides) -> vac.GenerationConfig:
+    """指向模拟服务的生成配置（不使用响应缓存）"""
+    if platform == 'openai':
+        base_url = f"{base_url}/v1"
+    values = dict(
+        topic='测试主题', platform=platform, api_key='mock', base_url=base_url,
+        word_count=500, use_cache=False,
+    )
+    values.update(overrides)
+    return vac.GenerationConfig(**values)
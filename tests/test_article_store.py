@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""文章库：存储、全文检索与Markdown导入导出"""
+
+import time
+from dataclasses import replace
+
+import pytest
+
+import viral_article_cli as vac
+
+
+def _result(content, platform='openai', quality=None):
+    result = vac.GenerationResult(
+        content=content, platform=platform, model='gpt-4o', tokens_used=100, duration_seconds=1.0
+    )
+    if quality is not None:
+        result.quality = quality
+    return result
+
+
+class TestArticleStore:
+
+    def test_add_get_and_full_text_search(self, tmp_path):
+        store = vac.ArticleStore(str(tmp_path / 'articles.sqlite3'))
+        config = vac.GenerationConfig(topic='AI写作', api_key='secret', platform='openai')
+        article_id = store.add(config, _result("# 标题\n\n提示词工程是写作效率的关键。"))
+        store.add(replace(config, topic='爬山装备'), _result("登山杖与冲锋衣的选择。", platform='claude'))
+
+        article = store.get(article_id)
+        assert article.content.startswith("# 标题")
+        assert 'api_key' not in article.config
+
+        assert [a.id for a in store.query(text='提示词工程')] == [article_id]
+        # 短于3个字符的词退化为逐篇检查
+        assert [a.topic for a in store.query(text='登山')] == ['爬山装备']
+        assert [a.topic for a in store.query(platform='claude')] == ['爬山装备']
+        assert store.query(text='不存在的内容') == []
+
+    def test_time_filters_and_limit(self, tmp_path):
+        store = vac.ArticleStore(str(tmp_path / 'articles.sqlite3'))
+        config = vac.GenerationConfig(topic='主题')
+        first = store.add(config, _result("第一篇"))
+        second = store.add(replace(config, topic='主题二'), _result("第二篇"))
+        assert {a.id for a in store.query()} == {first, second}
+        assert len(store.query(limit=1)) == 1
+        assert store.query(until=time.time() - 3600) == []
+        assert store.query(since=time.time() + 3600) == []
+
+    def test_sort_by_score_and_min_score(self, tmp_path):
+        store = vac.ArticleStore(str(tmp_path / 'articles.sqlite3'))
+        config = vac.GenerationConfig(topic='主题')
+        low = store.add(config, _result("低分", quality={'total': 10.0}))
+        high = store.add(replace(config, topic='主题二'), _result("高分", quality={'total': 25.0}))
+        assert [a.id for a in store.query(sort='score')] == [high, low]
+        assert [a.id for a in store.query(min_score=20)] == [high]
+        with pytest.raises(vac.ValidationError):
+            store.query(sort='unknown')
+
+    def test_export_and_import_round_trip(self, tmp_path):
+        store = vac.ArticleStore(str(tmp_path / 'articles.sqlite3'))
+        article_id = store.add(vac.GenerationConfig(topic='往返测试'), _result("正文内容。"))
+        exported = store.export(article_id, str(tmp_path / 'out.md'))
+
+        other = vac.ArticleStore(str(tmp_path / 'other.sqlite3'))
+        imported = other.import_markdown(exported)
+        assert imported is not None
+        assert other.import_markdown(exported) is None
+        article = other.get(imported)
+        assert article.topic == '往返测试'
+        assert article.content.strip() == "正文内容。"
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""截断续写：上文的发送方式与拼接处的空白"""
+
+import asyncio
+
+import pytest
+
+import viral_article_cli as vac
+
+pytestmark = pytest.mark.filterwarnings('ignore::FutureWarning')
+
+
+def _generator(platform):
+    config = vac.GenerationConfig(
+        topic='测试主题', platform=platform, api_key='mock', base_url='http://127.0.0.1:9',
+        max_tokens=64, max_continuations=1, use_cache=False,
+    )
+    return vac.create_generator(config)
+
+
+class _FakeChunks:
+    """第一次请求输出以空白结尾并被截断，续写请求开头重复输出该空白"""
+
+    def __init__(self, first, second):
+        self.outputs = [first, second]
+        self.partials = []
+
+    def _next(self, state, partial):
+        self.partials.append(partial)
+        state.truncated = len(self.partials) == 1
+        return self.outputs[len(self.partials) - 1]
+
+    def __call__(self, prompt, state, partial):
+        for text in self._next(state, partial):
+            yield text
+
+    async def achunks(self, prompt, state, partial):
+        for text in self._next(state, partial):
+            yield text
+
+
+@pytest.mark.parametrize('skip, text, expected', [
+    (0, "\n\n正文", ("\n\n正文", 0)),
+    (2, "\n\n正文", ("正文", 0)),
+    (1, "\n\n## 标题", ("\n## 标题", 0)),
+    (2, "\n", ("", 1)),
+    (2, "正文", ("正文", 0)),
+])
+def test_skip_rejoined_whitespace(skip, text, expected):
+    assert vac.ContentGenerator._skip_rejoined_whitespace(text, skip) == expected
+
+
+def test_claude_prefill_is_stripped_and_join_is_not_duplicated():
+    generator = _generator('claude')
+    fake = _FakeChunks(["第一段。", "\n\n"], ["\n", "\n第二段。"])
+    state = vac.StreamState()
+    content = "".join(generator._chunks_with_continuation('prompt', state, fake))
+    assert fake.partials == ["", "第一段。"]
+    assert content == "第一段。\n\n第二段。"
+    assert state.continuations == 1
+
+
+def test_claude_async_join_is_not_duplicated():
+    generator = _generator('claude')
+    fake = _FakeChunks(["第一段。\n\n"], ["\n\n第二段。"])
+
+    async def collect():
+        state = vac.StreamState()
+        return "".join([t async for t in generator._achunks_with_continuation('prompt', state, fake.achunks)])
+
+    assert asyncio.run(collect()) == "第一段。\n\n第二段。"
+    assert fake.partials == ["", "第一段。"]
+
+
+def test_other_platforms_send_partial_unchanged():
+    generator = _generator('openai')
+    fake = _FakeChunks(["第一段。\n\n"], ["第二段。"])
+    content = "".join(generator._chunks_with_continuation('prompt', vac.StreamState(), fake))
+    assert fake.partials == ["", "第一段。\n\n"]
+    assert content == "第一段。\n\n第二段。"
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""端到端：对本地模拟服务执行非流式、流式、异步、续写与字数截止"""
+
+import asyncio
+
+import pytest
+
+import viral_article_cli as vac
+from conftest import make_config
+
+PLATFORMS = ['openai', 'claude', 'gemini']
+
+pytestmark = pytest.mark.filterwarnings('ignore::FutureWarning')
+
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_generate(mock_api, platform):
+    base_url, settings = mock_api
+    result = vac.create_generator(make_config(base_url, platform)).generate()
+    assert result.platform == platform
+    assert result.content
+    assert result.output_tokens == settings.output_tokens
+    assert not result.truncated
+    assert result.word_count == vac.count_words(result.content)
+
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_stream_reaches_sinks_in_order(mock_api, platform):
+    base_url, _ = mock_api
+    chunks = []
+    generator = vac.create_generator(make_config(base_url, platform, stream=True))
+    generator.add_sink(vac.CallbackSink(chunks.append))
+    result = generator.generate()
+    assert len(chunks) > 1
+    assert ''.join(chunks) == result.content
+    assert result.timings.ttft is not None
+
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_async_generate(mock_api, platform):
+    base_url, settings = mock_api
+
+    async def run_all():
+        configs = [make_config(base_url, platform, topic=f"主题{i}") for i in range(3)]
+        return await asyncio.gather(*(vac.create_generator(c).agenerate() for c in configs))
+
+    results = asyncio.run(run_all())
+    assert [r.output_tokens for r in results] == [settings.output_tokens] * 3
+
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_truncated_output_is_continued(mock_api, stream):
+    base_url, _ = mock_api
+    config = make_config(base_url, max_tokens=64, max_continuations=2, stream=stream, stop_policy='off')
+    result = vac.create_generator(config).generate()
+    assert result.continuations == 2
+    # 模拟服务按 max_tokens 截断且不记录上文，续写次数用完后仍如实标记截断
+    assert result.truncated
+    assert result.output_tokens == 64 * 3
+
+
+def test_injected_errors_are_retried(mock_api):
+    base_url, settings = mock_api
+    settings.rate_limit_rate = 0.5
+    settings.retry_after = 0.01
+    results = [vac.create_generator(make_config(base_url, topic=f"主题{i}")).generate() for i in range(4)]
+    assert all(r.output_tokens == settings.output_tokens for r in results)
+
+
+def test_length_stop_ends_stream_at_paragraph(mock_api):
+    base_url, settings = mock_api
+    settings.output_tokens = 4000
+    chunks = []
+    generator = vac.create_generator(make_config(base_url, word_count=100, stream=True, length_tolerance=0.0))
+    generator.add_sink(vac.CallbackSink(chunks.append))
+    result = generator.generate()
+    assert result.stopped_early
+    assert ''.join(chunks) == result.content
+    assert 100 <= result.word_count < 100 + vac.LengthGuard.MIN_GRACE_WORDS
+
+
+def test_stop_policy_off_keeps_full_output(mock_api):
+    base_url, settings = mock_api
+    settings.output_tokens = 400
+    config = make_config(base_url, word_count=100, stream=True, stop_policy='off')
+    result = vac.create_generator(config).generate()
+    assert not result.stopped_early
+    assert result.output_tokens == 400
+
+
+@pytest.mark.parametrize('platform', PLATFORMS)
+def test_length_stop_in_async_stream(mock_api, platform):
+    base_url, settings = mock_api
+    settings.output_tokens = 4000
+    config = make_config(base_url, platform, word_count=100, stream=True, length_tolerance=0.0)
+    result = asyncio.run(vac.create_generator(config).agenerate())
+    assert result.stopped_early
+    assert result.word_count < 100 + vac.LengthGuard.MIN_GRACE_WORDS
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""对冲生成：sinks 的占用与胜出结果的重写"""
+
+import pytest
+
+import viral_article_cli as vac
+from conftest import make_config, serve_mock
+from mock_server import MockSettings
+
+pytestmark = pytest.mark.filterwarnings('ignore::FutureWarning')
+
+
+def test_file_sink_reopen_closes_previous_handle(tmp_path):
+    sink = vac.FileSink(str(tmp_path / 'out.md'))
+    sink.open()
+    sink.write("被丢弃的部分内容")
+    first = sink._file
+    sink.open()
+    assert first.closed
+    sink.write("完整内容")
+    sink.close()
+    assert (tmp_path / 'out.md').read_text(encoding='utf-8') == "完整内容"
+
+
+def test_fast_primary_wins_without_hedge(mock_api, tmp_path):
+    base_url, _ = mock_api
+    path = tmp_path / 'out.md'
+    result = vac.generate_hedged(
+        make_config(base_url), make_config(base_url, 'claude'), hedge_delay=5,
+        sinks=[vac.FileSink(str(path))]
+    )
+    assert result.platform == 'openai'
+    assert path.read_text(encoding='utf-8') == result.content
+
+
+def test_backup_win_rewrites_sinks_after_streaming_primary_is_cancelled(tmp_path):
+    # 主平台在对冲延迟之后才输出首token并占用 sinks，但输出很慢；备用平台随后开始输出并先完成
+    slow = MockSettings(ttft=0.2, tokens_per_second=100, output_tokens=200, chunk_tokens=4)
+    fast = MockSettings(ttft=0.3, tokens_per_second=20000, output_tokens=200, chunk_tokens=8)
+    path = tmp_path / 'out.md'
+    chunks = []
+    try:
+        with serve_mock(slow) as primary_url, serve_mock(fast) as backup_url:
+            result = vac.generate_hedged(
+                make_config(primary_url), make_config(backup_url, 'claude'), hedge_delay=0.05,
+                sinks=[vac.FileSink(str(path)), vac.CallbackSink(chunks.append)]
+            )
+    finally:
+        vac.client_pool.close()
+    assert result.platform == 'claude'
+    # 主平台已输出的部分在前，随后是胜出结果的完整内容
+    streamed = ''.join(chunks)
+    assert len(streamed) > len(result.content) and streamed.endswith(result.content)
+    assert path.read_text(encoding='utf-8') == result.content
+
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""持久化批量任务队列"""
+
+import threading
+import time
+from dataclasses import replace
+
+import viral_article_cli as vac
+
+
+class TestJobStore:
+
+    def _configs(self, *topics, platform='openai'):
+        return [vac.GenerationConfig(topic=t, platform=platform, api_key='secret') for t in topics]
+
+    def test_enqueue_is_idempotent_and_drops_api_key(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'))
+        assert store.enqueue(self._configs('一', '二')) == 2
+        assert store.enqueue(self._configs('一', '二', '三')) == 1
+        job = store.claim('w1')
+        assert job.config.topic == '一'
+        assert job.config.api_key is None
+        assert job.attempts == 1
+
+    def test_claims_are_exclusive_and_filtered_by_platform(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'))
+        store.enqueue(self._configs('一') + self._configs('二', platform='claude'))
+        assert store.claim('w1', ['claude']).config.topic == '二'
+        assert store.claim('w2', ['claude']) is None
+        assert store.claim('w2').config.topic == '一'
+        assert store.claim('w3') is None
+        assert store.stats()['running'] == 2
+
+    def test_retryable_failure_is_requeued_with_delay(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'), max_attempts=2)
+        store.enqueue(self._configs('一'))
+        job = store.claim('w1')
+        assert store.fail(job, '503', retryable=True) == 'pending'
+        assert store.claim('w1') is None
+        assert store.next_ready_in() > 0
+
+    def test_permanent_failure_and_attempt_limit(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'), max_attempts=1)
+        store.enqueue(self._configs('一', '二'))
+        assert store.fail(store.claim('w1'), '401', retryable=False) == 'failed'
+        assert store.fail(store.claim('w1'), '503', retryable=True) == 'failed'
+        assert store.stats()['failed'] == 2
+        assert store.retry_failed() == 2
+        assert store.claim('w1').attempts == 1
+
+    def test_expired_lease_is_reclaimed(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'), lease_seconds=0.01)
+        store.enqueue(self._configs('一'))
+        first = store.claim('crashed-worker')
+        time.sleep(0.02)
+        second = store.claim('w2')
+        assert second.id == first.id
+        assert second.attempts == 2
+
+    def test_release_returns_jobs_without_counting_attempt(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'))
+        store.enqueue(self._configs('一'))
+        store.claim('w1')
+        assert store.release('w1') == 1
+        assert store.claim('w2').attempts == 1
+
+    def test_complete_records_tokens(self, tmp_path):
+        store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'))
+        store.enqueue(self._configs('一'))
+        job = store.claim('w1')
+        store.complete(job.id, 'out.md', tokens_used=123)
+        stats = store.stats()
+        assert stats['done'] == 1 and stats['tokens_used'] == 123
+
+    def test_concurrent_claims_never_duplicate(self, tmp_path):
+        path = str(tmp_path / 'jobs.sqlite3')
+        vac.JobStore(path).enqueue(self._configs(*[f"主题{i}" for i in range(40)]))
+        claimed = []
+        lock = threading.Lock()
+
+        def worker(name):
+            # 每个线程使用独立的 JobStore，模拟多个进程共享同一个任务库
+            store = vac.JobStore(path)
+            while True:
+                job = store.claim(name)
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job.id)
+                store.complete(job.id, f"{job.id}.md")
+
+        threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(claimed) == 40
+        assert len(set(claimed)) == 40
+
+
+def test_permanent_error_is_not_retried(tmp_path):
+    store = vac.JobStore(str(tmp_path / 'jobs.sqlite3'), max_attempts=3)
+    store.enqueue([vac.GenerationConfig(topic='一', platform='openai', max_tokens=0)])
+    summary = vac.run_job_queue(store, output_dir=str(tmp_path), api_keys={'openai': 'secret'})
+    assert summary.failed == 1
+    assert store.stats()['failed'] == 1
+    assert store.stats()['pending'] == 0
+
+
+def test_job_id_covers_length_and_endpoint_settings():
+    base = vac.GenerationConfig(topic='一')
+    ids = {vac.job_id_for(base)}
+    for change in (
+        {'stop_policy': 'off'}, {'length_tolerance': 0.3},
+        {'base_url': 'http://127.0.0.1:8000/v1'}, {'adaptation': True},
+    ):
+        ids.add(vac.job_id_for(replace(base, **change)))
+    assert len(ids) == 5
+    assert vac.job_id_for(replace(base, api_key='secret')) == vac.job_id_for(base)
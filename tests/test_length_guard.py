@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""字数统计与流式字数截止"""
+
+import pytest
+
+import viral_article_cli as vac
+
+
+def test_count_words_mixed_text():
+    assert vac.count_words("你好，世界！") == 4
+    assert vac.count_words("GPT-4o 在 2024 年发布") == 6
+    assert vac.count_words("## 标题\n- 列表") == 4
+
+
+class TestLengthGuard:
+
+    def test_passes_text_through_below_limit(self):
+        guard = vac.LengthGuard(100, tolerance=0.1, policy='paragraph')
+        assert guard.feed("一二三四五") == "一二三四五"
+        assert not guard.stopped
+
+    def test_stops_at_next_paragraph_boundary(self):
+        guard = vac.LengthGuard(10, tolerance=0.0, policy='paragraph')
+        emitted = guard.feed("一二三四五六七八九十")
+        emitted += guard.feed("十一十二。")
+        emitted += guard.feed("\n\n下一段不应输出")
+        assert guard.stopped
+        assert emitted == "一二三四五六七八九十十一十二。"
+        assert guard.feed("更多") == ""
+
+    def test_boundary_split_across_chunks(self):
+        guard = vac.LengthGuard(5, tolerance=0.0, policy='paragraph')
+        emitted = guard.feed("一二三四五六\n")
+        emitted += guard.feed("\n七八")
+        assert guard.stopped
+        assert emitted == "一二三四五六\n"
+
+    def test_section_policy_waits_for_heading(self):
+        guard = vac.LengthGuard(5, tolerance=0.0, policy='section')
+        emitted = guard.feed("一二三四五六")
+        emitted += guard.feed("\n\n段落边界不截止")
+        assert not guard.stopped
+        emitted += guard.feed("\n## 下一节")
+        assert guard.stopped
+        assert emitted == "一二三四五六\n\n段落边界不截止"
+
+    def test_hard_limit_cuts_at_sentence_end(self):
+        guard = vac.LengthGuard(10, tolerance=0.0, policy='paragraph')
+        assert guard.hard_limit == 10 + guard.MIN_GRACE_WORDS
+        text = "字" * guard.hard_limit
+        assert guard.feed(text) == text
+        assert guard.feed("还有半句。之后的内容") == "还有半句。"
+        assert guard.stopped
+
+    def test_single_chunk_crossing_the_limit_is_cut(self):
+        guard = vac.LengthGuard(5, tolerance=0.0, policy='paragraph')
+        emitted = guard.feed("一二\n\n三四五六\n\n七八九\n\n十")
+        assert guard.stopped
+        assert emitted == "一二\n\n三四五六"
+        assert guard.count == 6
+
+    def test_hard_limit_inside_single_chunk(self):
+        guard = vac.LengthGuard(10, tolerance=0.0, policy='paragraph')
+        text = "字" * (guard.hard_limit - 1)
+        assert guard.feed(text + "还有半句。之后的内容") == text + "还有半句。"
+        assert guard.stopped
+
+    def test_rejects_unknown_policy(self):
+        with pytest.raises(vac.ValidationError):
+            vac.LengthGuard(100, policy='off')
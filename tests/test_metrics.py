@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""指标导出：单次运行记录配置加载耗时，批量任务每篇追加一行"""
+
+import json
+
+import pytest
+
+import viral_article_cli as vac
+from conftest import make_config
+
+pytestmark = pytest.mark.filterwarnings('ignore::FutureWarning')
+
+
+def test_single_run_records_config_load(mock_api, tmp_path):
+    base_url, _ = mock_api
+    path = tmp_path / 'metrics.jsonl'
+    result = vac.create_generator(make_config(base_url)).generate()
+    vac.MetricsTarget(str(path), 0.25).export(result, '主题')
+    record = json.loads(path.read_text(encoding='utf-8'))
+    assert record['topic'] == '主题'
+    assert record['timings']['config_load'] == 0.25
+
+
+def test_batch_exports_one_line_per_article(mock_api, tmp_path):
+    base_url, _ = mock_api
+    path = tmp_path / 'metrics.jsonl'
+    configs = [make_config(base_url, topic=f"主题{i}") for i in range(3)]
+    summary = vac.run_batch(configs, output_dir=str(tmp_path), metrics=vac.MetricsTarget(str(path)))
+    assert summary.succeeded == 3
+    records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert sorted(r['topic'] for r in records) == ['主题0', '主题1', '主题2']
+    assert all(r['timings']['config_load'] == 0 for r in records)
+    assert all(r['timings']['save'] > 0 for r in records)
+
+
+def test_without_path_nothing_is_written(mock_api, tmp_path):
+    base_url, _ = mock_api
+    result = vac.create_generator(make_config(base_url)).generate()
+    vac.MetricsTarget(None, 0.5).export(result)
+    assert result.timings.config_load == 0.5
+    assert not list(tmp_path.iterdir())
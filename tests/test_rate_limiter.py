@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+"""跨进程令牌桶限流"""
+
+import viral_article_cli as vac
+
+
+class TestRateLimiter:
+
+    def test_request_bucket_blocks_after_quota(self, tmp_path):
+        limiter = vac.RateLimiter({'openai': vac.RateLimit(rpm=2)}, str(tmp_path / 'rl.sqlite3'))
+        assert limiter.try_acquire('openai', 'key', 100) == 0
+        assert limiter.try_acquire('openai', 'key', 100) == 0
+        wait = limiter.try_acquire('openai', 'key', 100)
+        assert 0 < wait <= 30
+
+    def test_buckets_are_per_platform_and_key(self, tmp_path):
+        limiter = vac.RateLimiter({'openai': vac.RateLimit(rpm=1)}, str(tmp_path / 'rl.sqlite3'))
+        assert limiter.try_acquire('openai', 'a', 1) == 0
+        assert limiter.try_acquire('openai', 'b', 1) == 0
+        assert limiter.try_acquire('openai', 'a', 1) > 0
+        # 未配置限额的平台不限流
+        assert limiter.try_acquire('claude', 'a', 10 ** 9) == 0
+
+    def test_token_bucket_and_refund(self, tmp_path):
+        limiter = vac.RateLimiter({'openai': vac.RateLimit(tpm=1000)}, str(tmp_path / 'rl.sqlite3'))
+        assert limiter.try_acquire('openai', 'key', 800) == 0
+        assert limiter.try_acquire('openai', 'key', 800) > 0
+        limiter.refund('openai', 'key', 700)
+        assert limiter.try_acquire('openai', 'key', 800) == 0
+
+    def test_oversized_request_is_capped_to_full_quota(self, tmp_path):
+        limiter = vac.RateLimiter({'openai': vac.RateLimit(tpm=1000)}, str(tmp_path / 'rl.sqlite3'))
+        assert limiter.try_acquire('openai', 'key', 50000) == 0
+
+    def test_state_is_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / 'rl.sqlite3')
+        first = vac.RateLimiter({'openai': vac.RateLimit(rpm=1)}, path)
+        second = vac.RateLimiter({'openai': vac.RateLimit(rpm=1)}, path)
+        assert first.try_acquire('openai', 'key', 1) == 0
+        assert second.try_acquire('openai', 'key', 1) > 0
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+"""错误分类与熔断器"""
+
+import time
+
+import pytest
+
+import viral_article_cli as vac
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _wrapped(status_code):
+    """APIError 包装SDK原始异常，与生成器中的写法一致"""
+    try:
+        try:
+            raise _StatusError(status_code)
+        except _StatusError as e:
+            raise vac.APIError("调用失败") from e
+    except vac.APIError as e:
+        return e
+
+
+class TestClassifyError:
+
+    @pytest.mark.parametrize('status', [400, 401, 403, 404])
+    def test_client_errors_are_permanent(self, status):
+        classification = vac.classify_error(_wrapped(status))
+        assert not classification.retryable
+        assert classification.status_code == status
+
+    @pytest.mark.parametrize('status', [408, 429, 500, 503])
+    def test_server_errors_and_rate_limits_are_retryable(self, status):
+        assert vac.classify_error(_wrapped(status)).retryable
+
+    def test_local_validation_errors_are_permanent(self):
+        assert not vac.classify_error(vac.ValidationError("参数错误")).retryable
+        assert not vac.classify_error(vac.ConfigError("配置错误")).retryable
+
+    def test_unknown_errors_are_retryable(self):
+        assert vac.classify_error(RuntimeError("未知")).retryable
+
+
+class TestCircuitBreaker:
+
+    def test_opens_after_threshold_and_rejects_calls(self):
+        breaker = vac.CircuitBreaker('test', failure_threshold=3, recovery_timeout=60)
+        for _ in range(3):
+            breaker.before_call()
+            breaker.record_failure()
+        assert breaker.state == breaker.OPEN
+        assert not breaker.available()
+        with pytest.raises(vac.CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_allows_single_probe(self):
+        breaker = vac.CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        assert breaker.available()
+        breaker.before_call()
+        assert breaker.state == breaker.HALF_OPEN
+        with pytest.raises(vac.CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == breaker.CLOSED
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = vac.CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.before_call()
+        breaker.record_failure()
+        assert breaker.state == breaker.OPEN
+        assert not breaker.available()
+
+    def test_release_frees_probe_without_counting_failure(self):
+        breaker = vac.CircuitBreaker('test', failure_threshold=1, recovery_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        breaker.before_call()
+        breaker.release()
+        breaker.before_call()
+        assert breaker.state == breaker.HALF_OPEN
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""自适应路由：EWMA统计、路由得分与候选选择"""
+
+import pytest
+
+import viral_article_cli as vac
+
+
+@pytest.fixture
+def stats(tmp_path):
+    return vac.RouterStats(str(tmp_path / 'router.sqlite3'), alpha=0.5)
+
+
+class TestRouterStats:
+
+    def test_first_sample_is_taken_as_is_then_smoothed(self, stats):
+        stats.record('openai:gpt-4o', ok=True, seconds_per_kword=10.0, ttft=1.0)
+        stats.record('openai:gpt-4o', ok=True, seconds_per_kword=20.0, ttft=3.0)
+        current = stats.snapshot(['openai:gpt-4o'])['openai:gpt-4o']
+        assert current.seconds_per_kword == pytest.approx(15.0)
+        assert current.ttft == pytest.approx(2.0)
+        assert current.samples == 2
+        assert current.error_rate == pytest.approx(0.0)
+
+    def test_failure_only_updates_error_rate(self, stats):
+        stats.record('claude:x', ok=True, seconds_per_kword=10.0)
+        stats.record('claude:x', ok=False)
+        current = stats.snapshot(['claude:x'])['claude:x']
+        assert current.seconds_per_kword == pytest.approx(10.0)
+        assert current.error_rate == pytest.approx(0.5, abs=0.01)
+
+    def test_unknown_keys_have_empty_stats(self, stats):
+        current = stats.snapshot(['gemini:y'])['gemini:y']
+        assert current.seconds_per_kword is None and current.samples == 0
+
+    def test_error_rate_decays_over_time(self, stats, monkeypatch):
+        stats.record('claude:x', ok=False)
+        assert stats.snapshot(['claude:x'])['claude:x'].error_rate == pytest.approx(0.5, abs=0.01)
+        now = vac.time.time()
+        monkeypatch.setattr(vac.time, 'time', lambda: now + vac.ROUTER_ERROR_HALF_LIFE)
+        current = stats.snapshot(['claude:x'])['claude:x']
+        assert current.error_rate == pytest.approx(0.25, abs=0.01)
+
+
+class TestRouteScore:
+
+    def test_no_stats_scores_zero(self):
+        config = vac.GenerationConfig(topic='t', word_count=1000)
+        assert vac.route_score(vac.Backend('openai'), vac.BackendStats(), config) == 0.0
+
+    def test_score_scales_with_cost_errors_and_ttft(self):
+        config = vac.GenerationConfig(topic='t', word_count=2000)
+        healthy = vac.BackendStats(seconds_per_kword=10.0, ttft=2.0)
+        assert vac.route_score(vac.Backend('openai'), healthy, config) == pytest.approx(20.0)
+        assert vac.route_score(vac.Backend('openai', cost=2.0), healthy, config) == pytest.approx(40.0)
+        flaky = vac.BackendStats(seconds_per_kword=10.0, error_rate=0.5)
+        assert vac.route_score(vac.Backend('openai'), flaky, config) == pytest.approx(80.0)
+        streaming = vac.GenerationConfig(topic='t', word_count=2000, stream=True)
+        assert vac.route_score(vac.Backend('openai'), healthy, streaming) == pytest.approx(22.0)
+
+
+class TestAdaptiveRouter:
+
+    def _router(self, stats, **kwargs):
+        backends = [vac.Backend('openai', 'fast'), vac.Backend('claude', 'slow')]
+        return vac.AdaptiveRouter(
+            backends, {'openai': 'k1', 'claude': 'k2'}, stats=stats, explore=0.0, **kwargs
+        )
+
+    def test_prefers_lower_score(self, stats):
+        stats.record('openai:fast', ok=True, seconds_per_kword=5.0)
+        stats.record('claude:slow', ok=True, seconds_per_kword=50.0)
+        router = self._router(stats)
+        config = vac.GenerationConfig(topic='t')
+        backend = router._acquire(config, set())
+        assert backend.key == 'openai:fast'
+        router._release(backend)
+        assert router._acquire(config, {'openai:fast'}).key == 'claude:slow'
+
+    def test_ties_go_to_platform_with_fewer_in_flight(self, stats):
+        router = self._router(stats)
+        config = vac.GenerationConfig(topic='t')
+        first = router._acquire(config, set())
+        second = router._acquire(config, set())
+        assert {first.platform, second.platform} == {'openai', 'claude'}
+
+    def test_capacity_and_open_breakers_exclude_candidates(self, stats):
+        router = self._router(stats, capacity={'openai': 1})
+        config = vac.GenerationConfig(topic='t')
+        assert router._acquire(config, {'claude:slow'}).platform == 'openai'
+        assert router._acquire(config, {'claude:slow'}) is None
+        breaker = vac.get_circuit_breaker('claude')
+        for _ in range(breaker.failure_threshold):
+            breaker.record_failure()
+        assert router._acquire(config, set()) is None
+
+    def test_backends_without_api_key_are_dropped(self, stats):
+        router = vac.AdaptiveRouter(
+            [vac.Backend('openai'), vac.Backend('claude')], {'openai': 'k1'}, stats=stats
+        )
+        assert router.platforms() == ['openai']
+        with pytest.raises(vac.ValidationError):
+            vac.AdaptiveRouter([vac.Backend('claude')], {}, stats=stats)
+
+    def test_parse_route_spec(self):
+        backends = vac.parse_route_spec("openai:gpt-4o=1,claude=1.5,gemini")
+        assert [(b.platform, b.model, b.cost) for b in backends] == [
+            ('openai', 'gpt-4o', 1.0), ('claude', None, 1.5), ('gemini', None, 1.0)
+        ]
+        with pytest.raises(vac.ValidationError):
+            vac.parse_route_spec("openai=0")
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""常驻生成服务与 --server 客户端"""
+
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import viral_article_cli as vac
+
+
+@pytest.fixture
+def generation_server(mock_api):
+    """绑定本机随机端口的常驻生成服务，转发到模拟服务"""
+    base_url, _ = mock_api
+    app = vac.GenerationServer(
+        {'openai_api_key': 'mock'}, concurrency=2, base_url=f"{base_url}/v1", token='secret',
+        use_cache=False
+    )
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), app.make_handler())
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    try:
+        yield f"127.0.0.1:{httpd.server_address[1]}", app
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+class TestGenerationServer:
+
+    def test_generate_remote(self, generation_server):
+        address, app = generation_server
+        config = vac.GenerationConfig(topic='远程主题', word_count=500)
+        result = vac.generate_remote(address, config, token='secret')
+        assert result.content and result.platform == 'openai'
+        assert app.status()['completed'] == 1
+
+    def test_generate_remote_stream(self, generation_server):
+        address, _ = generation_server
+        chunks = []
+        config = vac.GenerationConfig(topic='远程主题', word_count=500, stream=True)
+        result = vac.generate_remote(address, config, on_chunk=chunks.append, token='secret')
+        assert ''.join(chunks) == result.content
+
+    def test_invalid_request_is_rejected(self, generation_server):
+        address, app = generation_server
+        with pytest.raises(vac.ValidationError):
+            vac.generate_remote(
+                address, vac.GenerationConfig(topic='远程主题', platform='unknown'), token='secret'
+            )
+        assert app.status()['completed'] == 0
+
+    def test_missing_or_wrong_token_is_rejected(self, generation_server):
+        address, app = generation_server
+        config = vac.GenerationConfig(topic='远程主题')
+        for token in (None, 'wrong'):
+            with pytest.raises(vac.ValidationError):
+                vac.generate_remote(address, config, token=token)
+        assert app.status()['completed'] == 0
+
+    def test_base_url_without_own_api_key_is_rejected(self, generation_server):
+        address, _ = generation_server
+        config = vac.GenerationConfig(topic='远程主题', base_url='http://example.invalid/v1')
+        with pytest.raises(vac.ValidationError):
+            vac.generate_remote(address, config, token='secret')
+
+
+class TestServerChecks:
+
+    def test_cache_is_decided_by_server(self):
+        request = {'topic': '远程主题', 'use_cache': False, 'refresh_cache': True}
+        config = vac.GenerationServer({'openai_api_key': 'key'}).build_config(request)
+        assert config.use_cache and not config.refresh_cache
+        config = vac.GenerationServer({'openai_api_key': 'key'}, use_cache=False).build_config(request)
+        assert not config.use_cache
+
+    def test_authorized(self):
+        app = vac.GenerationServer(token='secret')
+        assert app.authorized('Bearer secret')
+        assert app.authorized('bearer secret')
+        assert not app.authorized('Bearer other')
+        assert not app.authorized(None)
+        assert vac.GenerationServer().authorized(None)
+
+    @pytest.mark.parametrize('host, expected', [
+        ('127.0.0.1', True), ('localhost', True), ('::1', True), ('[::1]', True),
+        ('0.0.0.0', False), ('192.168.1.10', False), ('example.com', False),
+    ])
+    def test_is_loopback_host(self, host, expected):
+        assert vac.is_loopback_host(host) is expected
+
+
+class TestBuildConfig:
+
+    def test_resolves_server_key_and_base_url(self):
+        app = vac.GenerationServer({'openai_api_key': 'server-key'}, base_url='http://127.0.0.1:1/v1')
+        config = app.build_config({'topic': '主题', 'word_count': 800})
+        assert config.api_key == 'server-key' and config.word_count == 800
+        assert config.base_url == 'http://127.0.0.1:1/v1'
+
+    def test_missing_topic_or_unknown_field_is_rejected(self):
+        app = vac.GenerationServer({'openai_api_key': 'server-key'})
+        with pytest.raises(vac.ValidationError):
+            app.build_config({})
+        with pytest.raises(vac.ValidationError):
+            app.build_config({'topic': '主题', 'platform': 'unknown'})
+        with pytest.raises(vac.ValidationError):
+            app.build_config({'topic': '主题', 'max_tokens': 0})
+
+    def test_base_url_requires_own_api_key(self):
+        app = vac.GenerationServer({'openai_api_key': 'server-key'})
+        with pytest.raises(vac.ValidationError):
+            app.build_config({'topic': '主题', 'base_url': 'http://example.invalid/v1'})
+        config = app.build_config({'topic': '主题', 'base_url': 'http://example.invalid/v1', 'api_key': 'own'})
+        assert config.api_key == 'own'
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""近重复检测：MinHash 签名与 LSH 相似度索引"""
+
+from dataclasses import replace
+
+import viral_article_cli as vac
+
+
+def _topic_signature(text):
+    return vac.minhash_signature(vac.shingles(text, vac.TOPIC_SHINGLE_SIZE))
+
+
+class TestMinHash:
+
+    def test_signature_is_deterministic(self):
+        assert _topic_signature("AI写作技巧") == _topic_signature("AI写作技巧")
+        assert len(_topic_signature("AI写作技巧")) == vac.MINHASH_PERMUTATIONS
+
+    def test_similarity_tracks_jaccard(self):
+        a = vac.shingles("如何用AI工具提高写作效率", vac.TOPIC_SHINGLE_SIZE)
+        b = vac.shingles("如何用AI工具提高写作速度", vac.TOPIC_SHINGLE_SIZE)
+        jaccard = len(a & b) / len(a | b)
+        estimate = vac.estimate_similarity(vac.minhash_signature(a), vac.minhash_signature(b))
+        assert abs(estimate - jaccard) < 0.2
+        unrelated = vac.estimate_similarity(
+            vac.minhash_signature(a), _topic_signature("周末去爬山的装备清单")
+        )
+        assert unrelated < 0.2
+
+    def test_normalization_ignores_case_and_punctuation(self):
+        assert vac.shingles("AI, 写作！", 2) == vac.shingles("ai写作", 2)
+
+
+class TestSimilarityIndex:
+
+    def test_check_and_add_finds_near_duplicate(self, tmp_path):
+        index = vac.SimilarityIndex(str(tmp_path / 'sim.sqlite3'))
+        first = "如何用AI工具提高写作效率"
+        assert index.check_and_add('topic', first, _topic_signature(first), 0.6, ref='a.md') is None
+        match = index.check_and_add(
+            'topic', "如何用AI工具提高写作速度", _topic_signature("如何用AI工具提高写作速度"), 0.6, ref='b.md'
+        )
+        assert match is not None
+        assert match.text == first and match.ref == 'a.md'
+        assert index.count('topic') == 2
+
+    def test_unrelated_and_other_scope_do_not_match(self, tmp_path):
+        index = vac.SimilarityIndex(str(tmp_path / 'sim.sqlite3'))
+        topic = "如何用AI工具提高写作效率"
+        index.check_and_add('topic', topic, _topic_signature(topic), 0.6, scope='老司机风格|', ref='a.md')
+        assert index.nearest('topic', _topic_signature(topic), scope='专业导师风格|') is None
+        other = "周末去爬山的装备清单"
+        assert index.check_and_add('topic', other, _topic_signature(other), 0.6, ref='b.md') is None
+
+    def test_same_ref_is_replaced_not_matched(self, tmp_path):
+        index = vac.SimilarityIndex(str(tmp_path / 'sim.sqlite3'))
+        topic = "如何用AI工具提高写作效率"
+        index.check_and_add('topic', topic, _topic_signature(topic), 0.6, ref='a.md')
+        assert index.check_and_add('topic', topic, _topic_signature(topic), 0.6, ref='a.md') is None
+        assert index.count('topic') == 1
+        index.remove('topic', 'a.md')
+        assert index.count('topic') == 0
+
+    def test_duplicate_checker_skip_mode_does_not_register(self, tmp_path):
+        index = vac.SimilarityIndex(str(tmp_path / 'sim.sqlite3'))
+        checker = vac.DuplicateChecker('skip', index)
+        config = vac.GenerationConfig(topic="如何用AI工具提高写作效率")
+        assert checker.check_topic(config, ref='a.md') is None
+        assert checker.check_topic(replace(config, topic="如何用AI工具提高写作速度"), ref='b.md')
+        assert index.count('topic') == 1
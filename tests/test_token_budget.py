@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""调用前Token预算"""
+
+import pytest
+
+import viral_article_cli as vac
+
+
+class TestTokenBudget:
+
+    def test_auto_max_tokens_scales_with_word_count(self):
+        small = vac.plan_token_budget(
+            vac.GenerationConfig(topic='t', word_count=1000), 'skill', 'prompt', 'gpt-4o'
+        )
+        large = vac.plan_token_budget(
+            vac.GenerationConfig(topic='t', word_count=8000), 'skill', 'prompt', 'gpt-4o'
+        )
+        assert small.max_tokens % 256 == 0
+        assert small.max_tokens >= small.expected_output_tokens
+        assert large.max_tokens > small.max_tokens
+        assert small.requests == 1
+
+    def test_auto_max_tokens_respects_output_limit(self):
+        budget = vac.plan_token_budget(
+            vac.GenerationConfig(topic='t', word_count=20000, max_continuations=5),
+            'skill', 'prompt', 'gpt-4o'
+        )
+        assert budget.max_tokens <= budget.output_limit
+        assert budget.requests > 1
+
+    def test_auto_budget_beyond_continuations_is_rejected(self):
+        with pytest.raises(vac.ValidationError):
+            vac.plan_token_budget(
+                vac.GenerationConfig(topic='t', word_count=20000, max_continuations=0),
+                'skill', 'prompt', 'gpt-4o'
+            )
+
+    def test_explicit_max_tokens_too_small_only_warns(self, caplog):
+        budget = vac.plan_token_budget(
+            vac.GenerationConfig(topic='t', word_count=6000, max_tokens=256, max_continuations=0),
+            'skill', 'prompt', 'gpt-4o'
+        )
+        assert budget.max_tokens == 256
+        assert '内容会被截断' in caplog.text
+
+    def test_input_exceeding_context_window_is_rejected(self):
+        with pytest.raises(vac.ValidationError):
+            vac.plan_token_budget(
+                vac.GenerationConfig(topic='t', word_count=1000), '字' * 400000, 'prompt', 'gpt-4o'
+            )
+
+    @pytest.mark.parametrize('max_tokens', [0, -1])
+    def test_non_positive_max_tokens_is_rejected(self, max_tokens):
+        with pytest.raises(vac.ValidationError):
+            vac.validate_parameters('主题', '老司机风格', 1000, 'openai', max_tokens)
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""启动预热：SDK导入立即开始，连接等连接池配置完成后再建立"""
+
+from concurrent.futures import Future
+
+import viral_article_cli as vac
+
+
+def test_connection_waits_for_pool_configuration(mock_api):
+    base_url, _ = mock_api
+    pool = vac.ClientPool()
+    connect = Future()
+    thread = vac.start_warm_up('openai', pool=pool, connect=connect)
+    thread.join(timeout=0.2)
+    assert thread.is_alive()
+    assert pool._http_clients == {}
+
+    pool.configure(max_connections=3)
+    connect.set_result(base_url)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert pool._http_clients['openai']._transport._pool._max_connections == 3
+    pool.close()
+
+
+def test_cancelled_connect_only_imports_sdk():
+    pool = vac.ClientPool()
+    connect = Future()
+    thread = vac.start_warm_up('openai', pool=pool, connect=connect)
+    connect.cancel()
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+    assert pool._http_clients == {}
@@ -11,29 +11,50 @@ GitHub: https://github.com/Sunnyeung369/viral-content-generator
 """
 
 import os
+import random
+import re
 import sys
 import argparse
+import hashlib
 import logging
 import time
+import csv
+import json
+import sqlite3
+from collections import deque
 from pathlib import Path
-from typing import Optional, Dict, Any, Callable, Protocol
+from typing import Optional, Dict, Any, Callable, Protocol, List, Iterator, AsyncIterator
 from datetime import datetime
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
-from functools import lru_cache
+from dataclasses import dataclass, field, asdict, fields, replace
+from functools import lru_cache, partial
 import threading
+import weakref
 
-# 配置日志
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('viral_content_generator.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger(__name__)
 
+# 命令行模式的日志文件
+LOG_FILE = 'viral_content_generator.log'
+
+
+def setup_logging(log_file: Optional[str] = LOG_FILE, level: int = logging.INFO) -> None:
+    """
+    配置日志输出（由命令行入口调用；作为库导入时不修改全局日志配置、不创建文件）
+
+    Args:
+        log_file: 日志文件路径，None 表示只输出到终端
+        level: 日志级别
+    """
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        handlers.insert(0, logging.FileHandler(log_file, encoding='utf-8'))
+    logging.basicConfig(
+        level=level,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=handlers
+    )
+
+
 # 常量定义
 SKILL_PATH = Path(__file__).parent / "skill_v3.0.md"
 FALLBACK_SKILL_PATH = Path(__file__).parent / "skill.md"
@@ -44,11 +65,74 @@ SUPPORTED_STYLES = [
     '反常识风格', '清单工具风格', '对话问答风格', '诗意哲思风格',
     '自定义风格'
 ]
+# 内容发布平台（对应Skill中"平台差异化策略"的小节）
+TARGET_PLATFORMS = ['抖音', '快手', '视频号', 'B站', 'YouTube', '小红书', '知乎', '公众号']
+# 精简模式下始终发送的Skill核心章节（按标题前缀匹配，忽略"（新增）"等后缀）
+CORE_SKILL_SECTIONS = (
+    '核心理念', '核心方法论', '用户注意力管理系统', '信任建立系统', '创作流程', '爆款要素检查表'
+)
 MIN_WORD_COUNT = 500
 MAX_WORD_COUNT = 20000
 DEFAULT_MAX_TOKENS = 16384
+DEFAULT_MAX_CONTINUATIONS = 2
+
+# 输出被 max_tokens 截断后发送的续写指令
+CONTINUE_PROMPT = "请从上文中断处直接继续写完，不要重复已写内容，不要添加任何说明。"
+
+# 流式生成的字数截止策略：off 不截止；paragraph / section 超过目标字数（含容差）后
+# 在下一个段落 / 章节边界结束
+STOP_POLICIES = ('off', 'paragraph', 'section')
+DEFAULT_STOP_POLICY = 'paragraph'
+DEFAULT_LENGTH_TOLERANCE = 0.1
 MAX_RETRIES = 3
 RETRY_DELAY = 1.0
+GEMINI_CACHE_TTL_SECONDS = 3600
+MAX_RETRY_DELAY = 60.0
+MAX_RETRY_AFTER = 120.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_SECONDS = 30.0
+DEFAULT_HTTP_MAX_CONNECTIONS = 64
+DEFAULT_HTTP_MAX_KEEPALIVE = 32
+DEFAULT_HTTP_KEEPALIVE_EXPIRY = 120.0
+DEFAULT_HTTP_TIMEOUT = 600.0
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "viral-content-generator" / "responses.sqlite3"
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_CACHE_MAX_AGE_SECONDS = 30 * 24 * 3600
+DEFAULT_RATE_LIMIT_PATH = Path.home() / ".cache" / "viral-content-generator" / "ratelimit.sqlite3"
+DEFAULT_SIMILARITY_PATH = Path.home() / ".cache" / "viral-content-generator" / "similarity.sqlite3"
+DEFAULT_ARTICLE_STORE_PATH = Path.home() / ".cache" / "viral-content-generator" / "articles.sqlite3"
+
+# 近重复检测：off 关闭；flag 只提示；skip 跳过与历史主题相似的生成
+DEDUP_MODES = ('off', 'flag', 'skip')
+DEFAULT_DEDUP_MODE = 'flag'
+DEFAULT_TOPIC_SIMILARITY = 0.6
+DEFAULT_ARTICLE_SIMILARITY = 0.8
+DEFAULT_BATCH_WORKERS = 8
+DEFAULT_SECTION_WORKERS = 8
+DEFAULT_HEDGE_DELAY = 20.0
+
+# 自适应路由：EWMA 平滑系数、随机探索概率、错误率衰减半衰期（秒）
+DEFAULT_ROUTER_STATS_PATH = Path.home() / ".cache" / "viral-content-generator" / "router.sqlite3"
+DEFAULT_ROUTER_ALPHA = 0.2
+DEFAULT_ROUTER_EXPLORE = 0.05
+ROUTER_ERROR_HALF_LIFE = 600.0
+
+# 持久化任务队列
+DEFAULT_JOB_DB_NAME = 'batch_jobs.sqlite3'
+DEFAULT_JOB_LEASE_SECONDS = 900.0
+DEFAULT_JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 30.0
+
+# 服务模式
+DEFAULT_SERVER_ADDRESS = '127.0.0.1:8766'
+DEFAULT_SERVER_CONCURRENCY = 16
+SERVER_TOKEN_ENV_VAR = 'VIRAL_SERVER_TOKEN'
+OUTLINE_MAX_TOKENS = 4096
+API_KEY_ENV_VARS = {
+    'openai': 'OPENAI_API_KEY',
+    'claude': 'ANTHROPIC_API_KEY',
+    'gemini': 'GOOGLE_API_KEY'
+}
 
 
 # ============================================================================
@@ -80,6 +164,11 @@ class ConfigError(ViralContentError):
     pass
 
 
+class CircuitOpenError(APIError):
+    """平台熔断中，快速失败"""
+    pass
+
+
 # ============================================================================
 # 数据类
 # ============================================================================
@@ -94,9 +183,42 @@ class GenerationConfig:
     api_key: Optional[str] = None
     model: Optional[str] = None
     temperature: float = 0.7
-    max_tokens: int = DEFAULT_MAX_TOKENS
+    max_tokens: Optional[int] = None
     stream: bool = False
     output_path: Optional[str] = None
+    prompt_cache: bool = True
+    target_platform: Optional[str] = None
+    full_skill: bool = False
+    use_cache: bool = True
+    refresh_cache: bool = False
+    cache_path: Optional[str] = None
+    max_continuations: int = DEFAULT_MAX_CONTINUATIONS
+    base_url: Optional[str] = None
+    # 改编模式：系统提示词只包含 target_platform 的平台指南
+    adaptation: bool = False
+    stop_policy: str = DEFAULT_STOP_POLICY
+    length_tolerance: float = DEFAULT_LENGTH_TOLERANCE
+
+
+@dataclass
+class PhaseTimings:
+    """单次生成各阶段耗时（秒）"""
+    config_load: float = 0.0
+    skill_load: float = 0.0
+    client_setup: float = 0.0
+    rate_limit_wait: float = 0.0
+    ttft: Optional[float] = None
+    api: float = 0.0
+    tokens_per_second: Optional[float] = None
+    retries: int = 0
+    save: float = 0.0
+
+    def finish_api(self, api_seconds: float, output_tokens: int) -> None:
+        """记录API总耗时并计算输出速度（流式时只计首个token之后的时间）"""
+        self.api = api_seconds
+        generating = api_seconds - (self.ttft or 0.0)
+        if output_tokens and generating > 0:
+            self.tokens_per_second = output_tokens / generating
 
 
 @dataclass
@@ -108,6 +230,200 @@ class GenerationResult:
     tokens_used: int = 0
     duration_seconds: float = 0.0
     truncated: bool = False
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    cached: bool = False
+    continuations: int = 0
+    timings: PhaseTimings = field(default_factory=PhaseTimings)
+    # 实际字数与相对目标字数的偏差（比例）
+    word_count: int = 0
+    word_deviation: float = 0.0
+    # 流式生成达到目标字数后在边界处提前结束
+    stopped_early: bool = False
+    # 本地结构指标评分（HKR、4次判断，见 score_features）
+    quality: Dict[str, float] = field(default_factory=dict)
+
+
+@dataclass
+class StreamState:
+    """流式生成过程中随块更新的状态（用量、截断标记）"""
+    tokens_used: int = 0
+    truncated: bool = False
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_write_tokens: int = 0
+    continuations: int = 0
+    stopped_early: bool = False
+    started_at: float = field(default_factory=time.monotonic)
+    first_chunk_at: Optional[float] = None
+
+    def mark_chunk(self) -> None:
+        """记录首个文本块到达时间"""
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+
+    def update_from(self, result: GenerationResult) -> None:
+        """从完整结果复制用量信息"""
+        self.tokens_used = result.tokens_used
+        self.truncated = result.truncated
+        self.input_tokens = result.input_tokens
+        self.output_tokens = result.output_tokens
+        self.cache_read_tokens = result.cache_read_tokens
+        self.cache_write_tokens = result.cache_write_tokens
+
+    def add_continuation(self, other: 'StreamState') -> None:
+        """累加一次续写请求的用量，截断标记以续写结果为准"""
+        self.tokens_used += other.tokens_used
+        self.truncated = other.truncated
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.cache_write_tokens += other.cache_write_tokens
+        self.continuations += 1
+
+    def to_result(self, content: str, platform: str, model: str) -> GenerationResult:
+        """汇总为生成结果"""
+        return GenerationResult(
+            content=content,
+            platform=platform,
+            model=model,
+            tokens_used=self.tokens_used,
+            truncated=self.truncated,
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            cache_read_tokens=self.cache_read_tokens,
+            cache_write_tokens=self.cache_write_tokens,
+            continuations=self.continuations,
+            stopped_early=self.stopped_early,
+            timings=PhaseTimings(
+                ttft=None if self.first_chunk_at is None else self.first_chunk_at - self.started_at
+            )
+        )
+
+
+# ============================================================================
+# Skill 章节索引
+# ============================================================================
+
+_HEADING_RE = re.compile(r'^(#{1,6})\s+(.+?)\s*$')
+_TITLE_DECORATION_RE = re.compile(r'（[^）]*）|\([^)]*\)|[^\w/【】]')
+
+
+@dataclass
+class SkillSection:
+    """Skill文件中的一个标题章节"""
+    title: str
+    level: int
+    text: str = ""
+    children: List["SkillSection"] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        """去掉emoji、括号注释后的标题，用于匹配"""
+        return _TITLE_DECORATION_RE.sub('', self.title)
+
+    def render(self) -> str:
+        """渲染本章节及全部子章节"""
+        return self.text + "".join(child.render() for child in self.children)
+
+    def walk(self) -> Iterator["SkillSection"]:
+        """深度优先遍历全部子孙章节"""
+        for child in self.children:
+            yield child
+            yield from child.walk()
+
+
+def parse_skill_sections(content: str) -> SkillSection:
+    """
+    将Skill markdown解析为标题章节树
+
+    代码块（```）中的 # 行不视为标题；文件开头的YAML front-matter
+    与第一个标题之前的内容保存在根节点的 text 中。
+
+    Returns:
+        SkillSection: level 为0的根节点
+    """
+    root = SkillSection(title="", level=0)
+    stack = [root]
+    in_fence = False
+    lines: List[str] = []
+
+    def flush() -> None:
+        stack[-1].text = "".join(lines)
+        lines.clear()
+
+    for line in content.splitlines(keepends=True):
+        if line.lstrip().startswith('```'):
+            in_fence = not in_fence
+        match = None if in_fence else _HEADING_RE.match(line)
+        if match is None:
+            lines.append(line)
+            continue
+
+        flush()
+        section = SkillSection(title=match.group(2), level=len(match.group(1)))
+        while stack[-1].level >= section.level:
+            stack.pop()
+        stack[-1].children.append(section)
+        stack.append(section)
+        lines.append(line)
+
+    flush()
+    return root
+
+
+def _select_sections(
+    root: SkillSection,
+    style: Optional[str],
+    target_platform: Optional[str]
+) -> List[SkillSection]:
+    """挑选核心章节、所选风格章节和目标平台章节"""
+    selected: List[SkillSection] = []
+    for section in root.walk():
+        key = section.key
+        if section.level <= 2 and key.startswith(CORE_SKILL_SECTIONS):
+            selected.append(section)
+        elif key.startswith('风格系统') and style:
+            style_key = '自定义风格' if style == '自定义风格' else f'【{style}】'
+            selected.extend(s for s in section.walk() if style_key in s.title)
+        elif key.startswith('平台推荐适配系统') and target_platform:
+            selected.extend(_platform_sections(section, target_platform))
+    return selected
+
+
+def _platform_sections(section: SkillSection, target_platform: str) -> List[SkillSection]:
+    """章节下标题包含目标平台的小节（如"抖音/快手"匹配 抖音 与 快手）"""
+    wanted = target_platform.lower()
+    return [
+        s for s in section.walk()
+        if s.level >= 4 and wanted in (name.lower() for name in s.key.split('/'))
+    ]
+
+
+def _select_adaptation_sections(root: SkillSection, target_platform: str) -> List[SkillSection]:
+    """挑选改编所需的章节：目标平台的差异化策略与平台内容适配表"""
+    selected: List[SkillSection] = []
+    for section in root.walk():
+        if section.key.startswith('平台推荐适配系统'):
+            selected.extend(_platform_sections(section, target_platform))
+        elif section.key.startswith('平台内容适配表'):
+            selected.append(section)
+    return selected
+
+
+def _render_selected(section: SkillSection, selected: List[SkillSection]) -> str:
+    """按文档顺序渲染选中的章节，未选中的祖先章节只保留标题行"""
+    if any(section is s for s in selected):
+        return section.render()
+    parts = [_render_selected(child, selected) for child in section.children]
+    body = "".join(parts)
+    if not body or section.level == 0:
+        return body
+    heading = section.text.splitlines(keepends=True)[0]
+    return heading + "\n" + body
 
 
 # ============================================================================
@@ -121,6 +437,8 @@ class SkillLoader:
     _lock = threading.Lock()
     _cached_content: Optional[str] = None
     _cached_mtime: Optional[float] = None
+    _cached_sections: Optional[SkillSection] = None
+    _prompt_cache: Dict[tuple, str] = {}
 
     def __new__(cls):
         if cls._instance is None:
@@ -177,6 +495,9 @@ class SkillLoader:
 
     def _update_cache(self, content: str, path: Path) -> None:
         """更新缓存"""
+        if content != self._cached_content:
+            self._cached_sections = None
+            self._prompt_cache = {}
         self._cached_content = content
         self._cached_mtime = path.stat().st_mtime
 
@@ -184,6 +505,81 @@ class SkillLoader:
         """清除缓存"""
         self._cached_content = None
         self._cached_mtime = None
+        self._cached_sections = None
+        self._prompt_cache = {}
+
+    def sections(self) -> SkillSection:
+        """获取Skill章节树（解析一次，随文件变化失效）"""
+        content = self.load()
+        if self._cached_sections is None:
+            self._cached_sections = parse_skill_sections(content)
+        return self._cached_sections
+
+    def build_system_prompt(
+        self,
+        style: Optional[str] = None,
+        target_platform: Optional[str] = None
+    ) -> str:
+        """
+        组装精简的系统提示词
+
+        只包含核心方法论章节、所选风格章节和目标平台章节；
+        若Skill文件中找不到核心章节，则回退为完整内容。
+
+        Args:
+            style: 写作风格
+            target_platform: 内容发布平台（如 抖音、小红书）
+
+        Returns:
+            str: 系统提示词
+        """
+        content = self.load()
+        key = (style, target_platform)
+        prompt = self._prompt_cache.get(key)
+        if prompt is not None:
+            return prompt
+
+        root = self.sections()
+        selected = _select_sections(root, style, target_platform)
+        if not any(s.key.startswith(CORE_SKILL_SECTIONS) for s in selected):
+            logger.warning("Skill文件中未找到核心章节，使用完整内容")
+            prompt = content
+        else:
+            prompt = _render_selected(root, selected).strip() + "\n"
+            logger.debug(f"精简Skill提示词: {len(content)} -> {len(prompt)} 字符")
+
+        self._prompt_cache[key] = prompt
+        return prompt
+
+    def build_adaptation_prompt(self, target_platform: str) -> str:
+        """
+        组装改编用的系统提示词
+
+        只包含目标平台的差异化策略与平台内容适配表，不含完整方法论，
+        用于把已完成的母版文章改写为各平台版本。
+
+        Args:
+            target_platform: 内容发布平台（如 抖音、小红书）
+
+        Returns:
+            str: 系统提示词
+        """
+        self.load()
+        key = ('adaptation', target_platform)
+        prompt = self._prompt_cache.get(key)
+        if prompt is not None:
+            return prompt
+
+        root = self.sections()
+        guide = _render_selected(root, _select_adaptation_sections(root, target_platform)).strip()
+        if not guide:
+            logger.warning(f"Skill文件中未找到 {target_platform} 的平台指南")
+        prompt = (
+            f"你是多平台内容改编专家，负责把已完成的母版文章改编为适合{target_platform}发布的内容。\n\n"
+            f"{guide}\n"
+        )
+        self._prompt_cache[key] = prompt
+        return prompt
 
 
 # 全局Skill加载器实例
@@ -195,462 +591,6213 @@ def load_skill(force_reload: bool = False) -> str:
     return skill_loader.load(force_reload)
 
 
+def load_skill_prompt(config: GenerationConfig) -> str:
+    """便捷函数：按生成配置获取系统提示词（完整、精简或改编用）"""
+    if config.adaptation and config.target_platform:
+        return skill_loader.build_adaptation_prompt(config.target_platform)
+    if config.full_skill:
+        return skill_loader.load()
+    return skill_loader.build_system_prompt(config.style, config.target_platform)
+
+
 # ============================================================================
-# 抽象生成器基类
+# 响应缓存（内容寻址，SQLite持久化）
 # ============================================================================
 
-class ContentGenerator(ABC):
-    """内容生成器抽象基类"""
+class ResponseCache:
+    """
+    基于SQLite的响应缓存
 
-    # 平台默认模型
-    DEFAULT_MODEL: str = ""
-    # 平台名称
-    PLATFORM_NAME: str = ""
+    以 (Skill内容, 提示词, 平台, 模型, 温度, max_tokens) 的哈希为键，
+    按最近访问时间做LRU淘汰，并淘汰超过最大存活时间的条目。
+    可被多个线程和进程同时使用。
+    """
 
-    def __init__(self, config: GenerationConfig):
-        self.config = config
-        self.skill_content = load_skill()
-        self._client = None
-        self._setup_client()
+    # 每写入多少条执行一次淘汰
+    EVICT_EVERY = 32
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        max_age_seconds: float = DEFAULT_CACHE_MAX_AGE_SECONDS
+    ):
+        self.path = Path(path) if path else DEFAULT_CACHE_PATH
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self._local = threading.local()
+        self._puts = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    platform TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)
+            """)
+        self.evict()
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(
+        skill_content: str,
+        prompt: str,
+        platform: str,
+        model: str,
+        temperature: float,
+        max_tokens: int
+    ) -> str:
+        """计算缓存键"""
+        digest = hashlib.sha256()
+        for part in (skill_content, prompt, platform, model, repr(temperature), str(max_tokens)):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _bump(self, conn: sqlite3.Connection, name: str) -> None:
+        conn.execute(
+            "INSERT INTO stats(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
 
-    @abstractmethod
-    def _setup_client(self) -> None:
-        """设置API客户端"""
-        pass
+    def get(self, key: str) -> Optional[GenerationResult]:
+        """读取缓存，命中时刷新访问时间"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.max_age_seconds:
+                self._bump(conn, 'misses')
+                return None
+            conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._bump(conn, 'hits')
+
+        data = json.loads(row[0])
+        known = {f.name for f in fields(GenerationResult)}
+        # 耗时属于当次调用，不随缓存还原
+        known.discard('timings')
+        result = GenerationResult(**{k: v for k, v in data.items() if k in known})
+        result.cached = True
+        return result
+
+    def put(self, key: str, result: GenerationResult) -> None:
+        """写入缓存"""
+        payload = json.dumps(asdict(result), ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses"
+                "(key, platform, model, result, size, created, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, result.platform, result.model, payload, len(payload.encode('utf-8')), now, now)
+            )
+        self._puts += 1
+        if self._puts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def evict(self) -> int:
+        """淘汰过期条目，并按LRU淘汰超出容量的条目，返回淘汰数量"""
+        with self._connect() as conn:
+            removed = conn.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (time.time() - self.max_age_seconds,)
+            ).rowcount
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale = []
+                for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+                    stale.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+                removed += len(stale)
+            if removed:
+                conn.execute(
+                    "INSERT INTO stats(name, value) VALUES ('evictions', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                    (removed,)
+                )
+        if removed:
+            logger.debug(f"响应缓存淘汰 {removed} 条")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计：条目数、占用字节、命中/未命中/淘汰次数"""
+        conn = self._connect()
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+        hits, misses = counters.get('hits', 0), counters.get('misses', 0)
+        return {
+            'path': str(self.path),
+            'entries': entries,
+            'bytes': size,
+            'hits': hits,
+            'misses': misses,
+            'evictions': counters.get('evictions', 0),
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        }
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM stats")
+
+
+_response_caches: Dict[str, ResponseCache] = {}
+_response_caches_lock = threading.Lock()
+
+
+def get_response_cache(path: Optional[str] = None) -> ResponseCache:
+    """获取（进程内共享的）响应缓存实例"""
+    key = str(Path(path) if path else DEFAULT_CACHE_PATH)
+    with _response_caches_lock:
+        if key not in _response_caches:
+            _response_caches[key] = ResponseCache(key)
+        return _response_caches[key]
 
-    @abstractmethod
-    def _generate_internal(self, prompt: str) -> GenerationResult:
-        """内部生成方法"""
-        pass
 
-    @property
-    def model(self) -> str:
-        """获取使用的模型名称"""
-        return self.config.model or self.DEFAULT_MODEL
+# ============================================================================
+# 流式输出 Sink
+# ============================================================================
 
-    def build_prompt(self) -> str:
-        """构建提示词"""
-        return f"""请用{self.config.style}风格，写一篇关于"{self.config.topic}"的文章，目标字数：{self.config.word_count}字。
+class StreamSink(Protocol):
+    """流式输出目标：每次生成尝试依次调用 open → write* → close"""
 
-要求：
-1. 严格按照Skill中的方法论创作
-2. 应用用户决策4次判断模型
-3. 确保内容质量达到HKR评分标准
-4. 字数控制在{self.config.word_count}字左右（误差±10%）
-5. 前句建立相关性，前20行建立信任
-6. 完整内容提供真价值，结尾展示利用价值
+    def open(self) -> None:
+        ...
 
-请直接输出文章内容，不需要额外的解释或说明。"""
+    def write(self, text: str) -> None:
+        ...
 
-    def generate(self) -> GenerationResult:
-        """
-        生成内容（带重试机制）
+    def close(self) -> None:
+        ...
 
-        Returns:
-            GenerationResult: 生成结果
 
-        Raises:
-            APIError: 当API调用失败时
-        """
-        last_error = None
-        prompt = self.build_prompt()
+class StdoutSink:
+    """输出到终端"""
 
-        for attempt in range(MAX_RETRIES):
-            try:
-                logger.info(f"调用 {self.PLATFORM_NAME} API (尝试 {attempt + 1}/{MAX_RETRIES})...")
+    def open(self) -> None:
+        print("\n[流式生成中...]\n")
 
-                start_time = time.time()
-                result = self._generate_internal(prompt)
-                result.duration_seconds = time.time() - start_time
+    def write(self, text: str) -> None:
+        print(text, end='', flush=True)
 
-                logger.info(
-                    f"{self.PLATFORM_NAME} API调用成功，"
-                    f"生成内容长度: {len(result.content)}字，"
-                    f"耗时: {result.duration_seconds:.2f}秒"
-                )
+    def close(self) -> None:
+        print()  # 换行
 
-                return result
 
-            except Exception as e:
-                last_error = e
-                if attempt < MAX_RETRIES - 1:
-                    wait_time = RETRY_DELAY * (2 ** attempt)  # 指数退避
-                    logger.warning(f"API调用失败，{wait_time}秒后重试: {e}")
-                    time.sleep(wait_time)
-                else:
-                    logger.error(f"API调用失败，已达最大重试次数: {e}")
+class FileSink:
+    """
+    增量写入文件
 
-        raise APIError(f"{self.PLATFORM_NAME} API调用失败: {last_error}")
+    生成过程中文件持续增长，按 flush_interval 秒定期刷盘，
+    进程中途崩溃时磁盘上仍保留已生成的部分内容。每次 open 会重写文件。
+    """
 
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self._file = None
+        self._last_flush = 0.0
 
-# ============================================================================
-# 具体平台生成器
-# ============================================================================
+    def open(self) -> None:
+        # 重复 open 时先关闭旧句柄，避免其缓冲的内容在回收时写回重写后的文件
+        self.close()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'w', encoding='utf-8')
+        self._last_flush = time.time()
 
-class OpenAIGenerator(ContentGenerator):
-    """OpenAI GPT生成器"""
+    def write(self, text: str) -> None:
+        self._file.write(text)
+        now = time.time()
+        if now - self._last_flush >= self.flush_interval:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_flush = now
 
-    PLATFORM_NAME = "OpenAI"
-    DEFAULT_MODEL = "gpt-4o"
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
-    def _setup_client(self) -> None:
-        try:
-            from openai import OpenAI
-            self._client = OpenAI(api_key=self.config.api_key)
-        except ImportError:
-            raise APIError("未安装openai库，请运行: pip install openai")
 
-    def _generate_internal(self, prompt: str) -> GenerationResult:
-        try:
-            if self.config.stream:
-                return self._generate_stream(prompt)
-
-            response = self._client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.skill_content},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=self.config.temperature,
-                max_tokens=self.config.max_tokens
-            )
+class CallbackSink:
+    """每个文本块调用一次回调"""
 
-            content = response.choices[0].message.content or ""
-            tokens_used = response.usage.total_tokens if response.usage else 0
+    def __init__(self, callback: Callable[[str], None]):
+        self.callback = callback
 
-            return GenerationResult(
-                content=content,
-                platform="openai",
-                model=self.model,
-                tokens_used=tokens_used,
-                truncated=not response.choices[0].finish_reason == "stop"
-            )
+    def open(self) -> None:
+        pass
 
-        except Exception as e:
-            raise APIError(f"OpenAI API调用失败: {e}")
+    def write(self, text: str) -> None:
+        self.callback(text)
 
-    def _generate_stream(self, prompt: str) -> GenerationResult:
-        """流式生成"""
-        print("\n[流式生成中...]\n")
+    def close(self) -> None:
+        pass
 
-        response = self._client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": self.skill_content},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=self.config.temperature,
-            max_tokens=self.config.max_tokens,
-            stream=True
-        )
 
-        content = ""
-        tokens_used = 0
+class RacerSink:
+    """
+    对冲请求的sink
 
-        for chunk in response:
-            if chunk.choices[0].delta.content:
-                text = chunk.choices[0].delta.content
-                content += text
-                print(text, end='', flush=True)
+    记录首token延迟；同一组对冲请求共享 claim，先输出文本的请求占用下游 sinks
+    并实时转发，另一个请求的文本被丢弃。
+    """
 
-            if chunk.usage:
-                tokens_used = chunk.usage.total_tokens
+    def __init__(self, label: str, platform: str, sinks: List[StreamSink], claim: Dict[str, Optional[str]]):
+        import asyncio
+        self.label = label
+        self.platform = platform
+        self.sinks = sinks
+        self.claim = claim
+        self.first_token = asyncio.Event()
+        self.started = time.time()
+        self.opened = False
+
+    def open(self) -> None:
+        pass
 
-        print()  # 换行
+    def write(self, text: str) -> None:
+        if not self.first_token.is_set():
+            ttft_tracker.record(self.platform, time.time() - self.started)
+            self.first_token.set()
+        if self.claim.setdefault('owner', self.label) != self.label:
+            return
+        if not self.opened:
+            for sink in self.sinks:
+                sink.open()
+            self.opened = True
+        for sink in self.sinks:
+            sink.write(text)
+
+    def close(self) -> None:
+        # 每次生成尝试结束时关闭；重试时下一次写入会重新打开（FileSink 重写文件）
+        if self.opened:
+            for sink in self.sinks:
+                sink.close()
+            self.opened = False
 
-        return GenerationResult(
-            content=content,
-            platform="openai",
-            model=self.model,
-            tokens_used=tokens_used
+
+# ============================================================================
+# 客户端池
+# ============================================================================
+
+class ClientPool:
+    """
+    长期存活的SDK客户端池
+
+    按 (平台, API Key, 模型, ...) 复用已配置的SDK客户端，同一平台的客户端
+    共享一个带连接数上限与keep-alive的HTTP连接池，避免每篇文章都重新
+    创建客户端和TLS握手。异步客户端绑定到各自的事件循环。
+    """
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = DEFAULT_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = DEFAULT_HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_HTTP_TIMEOUT
+    ):
+        self._lock = threading.Lock()
+        self._clients: Dict[tuple, Any] = {}
+        self._http_clients: Dict[str, Any] = {}
+        self._async_clients: "weakref.WeakKeyDictionary[Any, Dict[tuple, Any]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.configure(max_connections, max_keepalive, keepalive_expiry, timeout)
+
+    def configure(
+        self,
+        max_connections: int = DEFAULT_HTTP_MAX_CONNECTIONS,
+        max_keepalive: int = DEFAULT_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry: float = DEFAULT_HTTP_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_HTTP_TIMEOUT
+    ) -> None:
+        """设置HTTP连接池参数（只影响之后新建的连接池）"""
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+
+    def _limits(self) -> Any:
+        import httpx
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry
         )
 
+    def http_client(self, platform: str) -> Any:
+        """获取平台共享的同步HTTP客户端（httpx.Client）"""
+        with self._lock:
+            client = self._http_clients.get(platform)
+            if client is None:
+                import httpx
+                client = httpx.Client(limits=self._limits(), timeout=self.timeout)
+                self._http_clients[platform] = client
+            return client
+
+    def async_http_client(self) -> Any:
+        """创建绑定当前事件循环的异步HTTP客户端（httpx.AsyncClient）"""
+        import httpx
+        return httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+
+    def get(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """获取或创建同步SDK客户端"""
+        with self._lock:
+            client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        client = factory()
+        with self._lock:
+            # 并发创建时保留先写入的实例
+            return self._clients.setdefault(key, client)
+
+    def get_async(self, key: tuple, factory: Callable[[], Any]) -> Any:
+        """获取或创建当前事件循环的异步SDK客户端"""
+        import asyncio
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = clients[key] = factory()
+            return client
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def close(self) -> None:
+        """关闭所有HTTP连接并清空池"""
+        with self._lock:
+            http_clients = list(self._http_clients.values())
+            self._http_clients.clear()
+            self._clients.clear()
+            self._async_clients = weakref.WeakKeyDictionary()
+        for client in http_clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug(f"关闭HTTP客户端失败: {e}")
 
-class ClaudeGenerator(ContentGenerator):
-    """Claude生成器"""
 
-    PLATFORM_NAME = "Claude"
-    DEFAULT_MODEL = "claude-sonnet-4-20250514"
+# 全局客户端池
+client_pool = ClientPool()
 
-    def _setup_client(self) -> None:
-        try:
-            import anthropic
-            self._client = anthropic.Anthropic(api_key=self.config.api_key)
-        except ImportError:
-            raise APIError("未安装anthropic库，请运行: pip install anthropic")
 
-    def _generate_internal(self, prompt: str) -> GenerationResult:
-        try:
-            if self.config.stream:
-                return self._generate_stream(prompt)
-
-            message = self._client.messages.create(
-                model=self.model,
-                max_tokens=self.config.max_tokens,
-                system=self.skill_content,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
+# ============================================================================
+# 重试策略与熔断
+# ============================================================================
 
-            content = message.content[0].text
-            tokens_used = message.usage.input_tokens + message.usage.output_tokens
+# 可重试的HTTP状态码（其余4xx视为不可重试）
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+# SDK异常类名 -> 是否可重试（无状态码时使用）
+ERROR_NAME_RETRYABLE = {
+    'APIConnectionError': True,
+    'APITimeoutError': True,
+    'RateLimitError': True,
+    'InternalServerError': True,
+    'OverloadedError': True,
+    'ServiceUnavailable': True,
+    'DeadlineExceeded': True,
+    'ResourceExhausted': True,
+    'TooManyRequests': True,
+    'ConnectionError': True,
+    'TimeoutError': True,
+    'AuthenticationError': False,
+    'PermissionDeniedError': False,
+    'BadRequestError': False,
+    'NotFoundError': False,
+    'UnprocessableEntityError': False,
+    'InvalidArgument': False,
+    'PermissionDenied': False,
+    'Unauthenticated': False,
+}
 
-            return GenerationResult(
-                content=content,
-                platform="claude",
-                model=self.model,
-                tokens_used=tokens_used
-            )
 
-        except Exception as e:
-            raise APIError(f"Claude API调用失败: {e}")
+@dataclass
+class ErrorClassification:
+    """错误分类结果"""
+    retryable: bool
+    retry_after: Optional[float] = None
+    status_code: Optional[int] = None
+
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    """沿 __cause__ 遍历异常链（APIError 包装了SDK原始异常）"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__
+
+
+def _parse_retry_after(headers: Any) -> Optional[float]:
+    """解析 Retry-After / retry-after-ms 响应头"""
+    if not headers:
+        return None
+    try:
+        value = headers.get('retry-after-ms')
+        if value:
+            return float(value) / 1000
+        value = headers.get('retry-after')
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            from email.utils import parsedate_to_datetime
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, AttributeError):
+        return None
 
-    def _generate_stream(self, prompt: str) -> GenerationResult:
-        """流式生成"""
-        print("\n[流式生成中...]\n")
 
-        with self._client.messages.stream(
-            model=self.model,
-            max_tokens=self.config.max_tokens,
-            system=self.skill_content,
-            messages=[{"role": "user", "content": prompt}]
-        ) as stream:
-            content = ""
-            for text in stream.text_stream:
-                content += text
-                print(text, end='', flush=True)
+def classify_error(error: BaseException) -> ErrorClassification:
+    """
+    将异常分类为可重试或不可重试
 
-        print()  # 换行
+    依据（按优先级）：HTTP状态码（429/408/409/425/5xx可重试，其余4xx不可重试）、
+    SDK异常类名；参数/配置错误不可重试；未知错误按可重试处理。
+    """
+    for item in _error_chain(error):
+        if isinstance(item, (ValidationError, ConfigError, SkillLoadError, CircuitOpenError)):
+            return ErrorClassification(retryable=False)
 
-        message = stream.get_final_message()
-        tokens_used = message.usage.input_tokens + message.usage.output_tokens
+        status = getattr(item, 'status_code', None)
+        if status is None and isinstance(getattr(item, 'code', None), int):
+            status = item.code  # google.api_core 异常
+        response = getattr(item, 'response', None)
+        retry_after = _parse_retry_after(getattr(response, 'headers', None))
+        if isinstance(status, int) and status >= 400:
+            retryable = status >= 500 or status in RETRYABLE_STATUS_CODES
+            return ErrorClassification(retryable, retry_after, status)
 
-        return GenerationResult(
-            content=content,
-            platform="claude",
-            model=self.model,
-            tokens_used=tokens_used
-        )
+        for cls in type(item).__mro__:
+            if cls.__name__ in ERROR_NAME_RETRYABLE:
+                return ErrorClassification(ERROR_NAME_RETRYABLE[cls.__name__], retry_after)
 
+    return ErrorClassification(retryable=True)
 
-class GeminiGenerator(ContentGenerator):
-    """Gemini生成器"""
 
-    PLATFORM_NAME = "Gemini"
-    DEFAULT_MODEL = "gemini-2.0-flash-exp"
+@dataclass
+class RetryPolicy:
+    """
+    重试策略：full jitter 指数退避，遵守服务端 Retry-After
 
-    def _setup_client(self) -> None:
-        try:
-            import google.generativeai as genai
-            genai.configure(api_key=self.config.api_key)
-            self._genai = genai
-            self._model_client = genai.GenerativeModel(
-                model_name=self.model,
-                system_instruction=self.skill_content
-            )
-        except ImportError:
-            raise APIError("未安装google-generativeai库，请运行: pip install google-generativeai")
+    等待时间在 [0, min(max_delay, base_delay * 2^attempt)] 内均匀随机，
+    避免大量并发worker同步重试；服务端给出 Retry-After 时以其为准（不超过 max_retry_after）。
+    """
+    max_attempts: int = MAX_RETRIES
+    base_delay: float = RETRY_DELAY
+    max_delay: float = MAX_RETRY_DELAY
+    max_retry_after: float = MAX_RETRY_AFTER
 
-    def _generate_internal(self, prompt: str) -> GenerationResult:
-        try:
-            response = self._model_client.generate_content(prompt)
-            content = response.text
+    def compute_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """计算第 attempt 次（从0开始）失败后的等待秒数"""
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
 
-            # Gemini 不返回token使用情况，估算
-            tokens_used = len(content) // 2  # 粗略估算
 
-            return GenerationResult(
-                content=content,
-                platform="gemini",
-                model=self.model,
-                tokens_used=tokens_used
-            )
+class CircuitBreaker:
+    """
+    平台熔断器
 
-        except Exception as e:
-            raise APIError(f"Gemini API调用失败: {e}")
+    连续 failure_threshold 次可重试错误（服务端故障、限流、超时）后熔断，
+    recovery_timeout 秒内的调用直接失败；之后放行一个探测请求，成功则恢复。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        recovery_timeout: float = CIRCUIT_RECOVERY_SECONDS
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """
+        调用前检查
+
+        Raises:
+            CircuitOpenError: 熔断中或已有探测请求进行中
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN:
+                remaining = self._opened_at + self.recovery_timeout - time.time()
+                if remaining > 0:
+                    raise CircuitOpenError(f"{self.name} 熔断中，{remaining:.0f}秒后重试")
+                self.state = self.HALF_OPEN
+            if self._probing:
+                raise CircuitOpenError(f"{self.name} 熔断探测中")
+            self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"{self.name} 熔断恢复")
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"{self.name} 连续失败 {self._failures} 次，熔断 {self.recovery_timeout:.0f}秒")
+                self.state = self.OPEN
+                self._opened_at = time.time()
+
+    def release(self) -> None:
+        """不可重试错误：不计入失败，但释放探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def available(self) -> bool:
+        """当前是否可以调用（不改变状态）：未熔断，或熔断已到恢复时间且没有探测请求进行中"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() < self._opened_at + self.recovery_timeout:
+                return False
+            return not self._probing
+
+
+# 全局默认重试策略（main 中可按 config.yaml 调整）
+default_retry_policy = RetryPolicy()
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(platform: str) -> CircuitBreaker:
+    """获取平台的熔断器（进程内共享）"""
+    with _circuit_breakers_lock:
+        if platform not in _circuit_breakers:
+            _circuit_breakers[platform] = CircuitBreaker(platform)
+        return _circuit_breakers[platform]
 
 
 # ============================================================================
-# 生成器工厂
+# Token预算（本地估算，调用前确定 max_tokens）
 # ============================================================================
 
-GENERATOR_MAP: Dict[str, type[ContentGenerator]] = {
-    'openai': OpenAIGenerator,
-    'claude': ClaudeGenerator,
-    'gemini': GeminiGenerator,
+_CJK_RE = re.compile(r'[\u3000-\u303f\u4e00-\u9fff\uff00-\uffef]')
+
+# 各分词器的token密度: (每个中文字符的token数, 每个token对应的其他字符数)
+TOKEN_DENSITY: Dict[str, tuple] = {
+    'default': (1.0, 4.0),
+    'cl100k': (1.2, 4.0),   # gpt-4 / gpt-3.5
+    'o200k': (0.8, 4.0),    # gpt-4o / gpt-4.1 / o系列
+    'claude': (1.3, 3.5),
+    'gemini': (0.8, 4.0),
 }
 
+# 使用 o200k 分词器的 OpenAI 模型前缀
+_O200K_PREFIXES = ('gpt-4o', 'chatgpt-4o', 'gpt-4.1', 'gpt-4.5', 'gpt-5', 'o1', 'o3', 'o4')
+
+# 模型单次输出上限与上下文窗口（按模型名前缀匹配，取最长前缀）
+MODEL_TOKEN_LIMITS: Dict[str, tuple] = {
+    'gpt-4o': (16384, 128000),
+    'chatgpt-4o': (16384, 128000),
+    'gpt-4.1': (32768, 1047576),
+    'gpt-4-turbo': (4096, 128000),
+    'gpt-4': (8192, 8192),
+    'gpt-3.5': (4096, 16385),
+    'o1': (100000, 200000),
+    'o3': (100000, 200000),
+    'o4': (100000, 200000),
+    'claude-3-haiku': (4096, 200000),
+    'claude-3-opus': (4096, 200000),
+    'claude-3-5': (8192, 200000),
+    'claude-3-7-sonnet': (64000, 200000),
+    'claude-sonnet-4': (64000, 200000),
+    'claude-opus-4': (32000, 200000),
+    'gemini-1.5': (8192, 1048576),
+    'gemini-2.0': (8192, 1048576),
+    'gemini-2.5': (65536, 1048576),
+}
 
-def create_generator(config: GenerationConfig) -> ContentGenerator:
-    """
-    创建生成器实例
+# 正文之外的标题、列表等Markdown格式开销
+ARTICLE_FORMAT_OVERHEAD = 1.1
+# 自动计算 max_tokens 时在预计输出之上的余量（覆盖±10%的字数偏差与估算误差）
+OUTPUT_TOKEN_HEADROOM = 1.3
+MIN_AUTO_MAX_TOKENS = 1024
 
-    Args:
-        config: 生成配置
 
-    Returns:
-        ContentGenerator: 生成器实例
+def estimate_tokens(text: str, family: str = 'default') -> int:
+    """按分词器族估算token数：中文按每字token密度，其他字符按每token字符数"""
+    per_cjk, chars_per_token = TOKEN_DENSITY.get(family, TOKEN_DENSITY['default'])
+    cjk = len(_CJK_RE.findall(text))
+    return int(cjk * per_cjk + (len(text) - cjk) / chars_per_token + 0.999)
 
-    Raises:
-        ValidationError: 当平台不支持时
-    """
-    generator_class = GENERATOR_MAP.get(config.platform)
-    if generator_class is None:
-        raise ValidationError(
-            f"不支持的平台: {config.platform}，"
-            f"支持的平台: {list(GENERATOR_MAP.keys())}"
-        )
-    return generator_class(config)
+
+@lru_cache(maxsize=16)
+def _skill_tokens(skill_content: str, family: str) -> int:
+    """Skill内容的token估算（同一Skill在进程内只计算一次）"""
+    return estimate_tokens(skill_content, family)
+
+
+def token_family(platform: str, model: str) -> str:
+    """平台与模型对应的分词器族"""
+    if platform == 'openai':
+        return 'o200k' if model.startswith(_O200K_PREFIXES) else 'cl100k'
+    return platform if platform in TOKEN_DENSITY else 'default'
+
+
+def model_token_limits(model: str) -> tuple:
+    """
+    模型的 (单次输出上限, 上下文窗口)
+
+    未知模型按 DEFAULT_MAX_TOKENS 作为输出上限，上下文窗口为None（不检查）。
+    """
+    matches = [prefix for prefix in MODEL_TOKEN_LIMITS if model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_MAX_TOKENS, None
+    return MODEL_TOKEN_LIMITS[max(matches, key=len)]
+
+
+def expected_output_tokens(word_count: int, family: str) -> int:
+    """目标字数对应的预计输出token数"""
+    per_cjk = TOKEN_DENSITY.get(family, TOKEN_DENSITY['default'])[0]
+    return int(word_count * per_cjk * ARTICLE_FORMAT_OVERHEAD + 0.999)
+
+
+@dataclass
+class TokenBudget:
+    """单次生成的token预算（本地估算）"""
+    family: str
+    skill_tokens: int
+    prompt_tokens: int
+    expected_output_tokens: int
+    max_tokens: int
+    output_limit: int
+    context_window: Optional[int] = None
+    requests: int = 1
+
+    @property
+    def input_tokens(self) -> int:
+        return self.skill_tokens + self.prompt_tokens
+
+
+def plan_token_budget(
+    config: GenerationConfig,
+    skill_content: str,
+    prompt: str,
+    model: str
+) -> TokenBudget:
+    """
+    调用前估算输入/输出token，并确定 max_tokens
+
+    config.max_tokens 为None时按目标字数加余量自动计算，不超过模型单次输出上限
+    与上下文窗口的剩余空间；超出单次上限的部分由自动续写完成。
+
+    Args:
+        config: 生成配置
+        skill_content: Skill内容
+        prompt: 提示词
+        model: 模型名称
+
+    Returns:
+        TokenBudget: token预算
+
+    Raises:
+        ValidationError: 输入超出上下文窗口，或自动计算时目标字数在续写次数内无法完成
+    """
+    family = token_family(config.platform, model)
+    skill_tokens = _skill_tokens(skill_content, family)
+    prompt_tokens = estimate_tokens(prompt, family)
+    input_tokens = skill_tokens + prompt_tokens
+    expected = expected_output_tokens(config.word_count, family)
+    output_limit, context_window = model_token_limits(model)
+
+    room = output_limit
+    if context_window:
+        if input_tokens >= context_window:
+            raise ValidationError(
+                f"输入约 {input_tokens} tokens，超过 {model} 的上下文窗口 {context_window}，"
+                f"请去掉 --full-skill 或缩短提示词"
+            )
+        room = min(output_limit, context_window - input_tokens)
+
+    if config.max_tokens is None:
+        wanted = max(MIN_AUTO_MAX_TOKENS, int(expected * OUTPUT_TOKEN_HEADROOM))
+        max_tokens = min(-(-wanted // 256) * 256, room)
+    else:
+        max_tokens = config.max_tokens
+        if max_tokens > room:
+            logger.warning(f"max_tokens={max_tokens} 超过 {model} 的单次输出上限 {room}，请求可能被拒绝")
+
+    budget = TokenBudget(
+        family=family,
+        skill_tokens=skill_tokens,
+        prompt_tokens=prompt_tokens,
+        expected_output_tokens=expected,
+        max_tokens=max_tokens,
+        output_limit=output_limit,
+        context_window=context_window,
+        requests=-(-expected // max_tokens),
+    )
+    capacity = max_tokens * (1 + config.max_continuations)
+    if expected > capacity:
+        message = (
+            f"目标 {config.word_count} 字预计需要约 {expected} 输出tokens，超过 "
+            f"max_tokens {max_tokens} ×（1 + 续写 {config.max_continuations} 次）= {capacity}，"
+            f"内容会被截断；请减少字数、提高 --max-continuations 或使用 --long-form"
+        )
+        if config.max_tokens is None:
+            raise ValidationError(message)
+        logger.warning(message)
+    elif budget.requests > 1:
+        logger.warning(
+            f"目标 {config.word_count} 字超过 {model} 单次输出上限，预计需要续写 {budget.requests - 1} 次"
+        )
+    logger.info(
+        f"Token预算: 输入约 {input_tokens}（Skill {skill_tokens} + 提示词 {prompt_tokens}），"
+        f"预计输出约 {expected}，max_tokens={max_tokens}"
+    )
+    return budget
+
+
+# ============================================================================
+# 客户端限流（令牌桶，跨进程共享）
+# ============================================================================
+
+@dataclass
+class RateLimit:
+    """每分钟请求数与token数上限（None表示不限制）"""
+    rpm: Optional[float] = None
+    tpm: Optional[float] = None
+
+
+class RateLimiter:
+    """
+    令牌桶限流器
+
+    按 (平台, API Key) 分别维护请求数与token数两个桶，容量为每分钟额度，
+    按秒匀速补充。桶状态保存在SQLite中，同一主机上的多个进程共享额度，
+    请求在发出前等待，而不是一起触发429后一起退避。
+    """
+
+    # 单次等待的最长睡眠时间，之后重新检查
+    MAX_SLEEP = 5.0
+
+    def __init__(self, limits: Dict[str, RateLimit], path: Optional[str] = None):
+        self.limits = limits
+        self.path = Path(path) if path else DEFAULT_RATE_LIMIT_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS buckets (
+                    key TEXT PRIMARY KEY,
+                    level REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _bucket_prefix(platform: str, api_key: Optional[str]) -> str:
+        key_digest = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()[:12]
+        return f"{platform}:{key_digest}"
+
+    def _buckets(self, platform: str, api_key: Optional[str], tokens: int) -> List[tuple]:
+        """返回 [(桶键, 每分钟额度, 本次消耗)]"""
+        limit = self.limits.get(platform)
+        if limit is None:
+            return []
+        prefix = self._bucket_prefix(platform, api_key)
+        buckets = []
+        if limit.rpm:
+            buckets.append((f"{prefix}:req", float(limit.rpm), 1.0))
+        if limit.tpm:
+            # 超过一分钟额度的单次请求按满额计，避免永远等待
+            buckets.append((f"{prefix}:tok", float(limit.tpm), float(min(tokens, limit.tpm))))
+        return buckets
+
+    def _update(self, buckets: List[tuple], consume: bool) -> float:
+        """
+        原子地补充并尝试扣减各桶
+
+        Returns:
+            float: 0 表示已扣减；否则为还需等待的秒数
+        """
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = {}
+            wait = 0.0
+            for key, per_minute, cost in buckets:
+                row = conn.execute("SELECT level, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+                level = per_minute if row is None else min(
+                    per_minute, row[0] + (now - row[1]) * per_minute / 60
+                )
+                levels[key] = level
+                if consume and level < cost:
+                    wait = max(wait, (cost - level) * 60 / per_minute)
+            for key, per_minute, cost in buckets:
+                level = levels[key] - cost if consume and wait == 0 else levels[key]
+                if not consume:
+                    level = min(per_minute, level + cost)
+                conn.execute(
+                    "INSERT OR REPLACE INTO buckets(key, level, updated) VALUES (?, ?, ?)",
+                    (key, level, now)
+                )
+            conn.execute("COMMIT")
+            return wait
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def try_acquire(self, platform: str, api_key: Optional[str], tokens: int) -> float:
+        """尝试获取额度，返回0表示成功，否则为建议等待秒数"""
+        buckets = self._buckets(platform, api_key, tokens)
+        return self._update(buckets, consume=True) if buckets else 0.0
+
+    def acquire(self, platform: str, api_key: Optional[str], tokens: int) -> float:
+        """阻塞直到获得额度，返回等待的总秒数"""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(platform, api_key, tokens)
+            if wait <= 0:
+                return waited
+            wait = min(wait, self.MAX_SLEEP)
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, platform: str, api_key: Optional[str], tokens: int) -> float:
+        """异步版本的 acquire"""
+        import asyncio
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(platform, api_key, tokens)
+            if wait <= 0:
+                return waited
+            wait = min(wait, self.MAX_SLEEP)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def refund(self, platform: str, api_key: Optional[str], tokens: int) -> None:
+        """实际用量低于预估时归还多扣的token额度"""
+        if tokens <= 0:
+            return
+        buckets = [b for b in self._buckets(platform, api_key, tokens) if b[0].endswith(':tok')]
+        if buckets:
+            self._update(buckets, consume=False)
+
+
+# 全局限流器（main 中按 config.yaml 的 rate_limits 或 --rpm/--tpm 创建）
+rate_limiter: Optional[RateLimiter] = None
+
+
+def configure_rate_limits(
+    limits: Dict[str, Any],
+    path: Optional[str] = None
+) -> Optional[RateLimiter]:
+    """
+    设置全局限流器
+
+    Args:
+        limits: {平台: {"rpm": ..., "tpm": ...}}
+        path: 共享状态的SQLite路径
+
+    Returns:
+        Optional[RateLimiter]: 限流器；limits为空时返回None并关闭限流
+    """
+    global rate_limiter
+    parsed = {
+        platform: RateLimit(rpm=value.get('rpm'), tpm=value.get('tpm'))
+        for platform, value in (limits or {}).items()
+        if isinstance(value, dict) and (value.get('rpm') or value.get('tpm'))
+    }
+    rate_limiter = RateLimiter(parsed, path) if parsed else None
+    return rate_limiter
+
+
+# ============================================================================
+# 字数统计与提前截止
+# ============================================================================
+
+# 中文按字、英文与数字按词计数（不计标点与Markdown符号）
+_WORD_RE = re.compile(r"[\u4e00-\u9fff]|[A-Za-z0-9]+(?:['’.-][A-Za-z0-9]+)*")
+
+
+def count_words(text: str) -> int:
+    """统计字数：中文按字，英文与数字按词，不计标点与Markdown符号"""
+    return len(_WORD_RE.findall(text))
+
+
+def record_word_count(result: GenerationResult, target: int) -> None:
+    """记录结果的实际字数及其与目标字数的偏差（比例，正数表示超出）"""
+    result.word_count = count_words(result.content)
+    if target > 0:
+        result.word_deviation = round((result.word_count - target) / target, 4)
+
+
+class LengthGuard:
+    """
+    流式生成的字数守卫
+
+    实时累计已输出的字数，超过 目标 ×（1 + 容差）后在下一个段落边界截止
+    （policy='section' 时在下一个章节标题之前）；迟迟等不到边界时，
+    再超出宽限字数后在下一个句末截止。调用方在 stopped 后停止读取并关闭流。
+    """
+
+    # 超过截止字数后的宽限字数：目标的5%，至少200字
+    GRACE_RATIO = 0.05
+    MIN_GRACE_WORDS = 200
+    # 保留已输出文本的末尾，用于识别跨块的边界
+    TAIL_CHARS = 16
+
+    _BOUNDARIES = {
+        'paragraph': re.compile(r'\n\s*\n'),
+        'section': re.compile(r'\n(?=#{1,6}\s)'),
+    }
+    _SENTENCE_END_RE = re.compile(r'[。！？!?…]+[”」』"]?|\n')
+
+    def __init__(
+        self,
+        target: int,
+        tolerance: float = DEFAULT_LENGTH_TOLERANCE,
+        policy: str = DEFAULT_STOP_POLICY
+    ):
+        if policy not in self._BOUNDARIES:
+            raise ValidationError(f"无效的截止策略: {policy}，可选: {list(STOP_POLICIES)}")
+        self.limit = int(target * (1 + tolerance))
+        self.hard_limit = self.limit + max(self.MIN_GRACE_WORDS, int(target * self.GRACE_RATIO))
+        self.boundary = self._BOUNDARIES[policy]
+        self.count = 0
+        self.stopped = False
+        self._tail = ""
+
+    def feed(self, text: str) -> str:
+        """
+        输入一个文本块
+
+        一个文本块可能跨过截止字数（部分传输按段落甚至整篇返回），边界从块内
+        到达截止字数的位置开始查找，而不是等到下一个块。
+
+        Returns:
+            str: 应输出的部分；到达截止点时只返回截止点之前的部分，并设置 stopped
+        """
+        if self.stopped:
+            return ""
+        reached = self._reach(text, self.limit)
+        if reached is not None:
+            window = self._tail + text
+            cut = self._cut_point(window, text, reached)
+            if cut is not None:
+                self.stopped = True
+                text = window[len(self._tail):max(cut, len(self._tail))]
+        self.count += count_words(text)
+        self._tail = (self._tail + text)[-self.TAIL_CHARS:]
+        return text
+
+    def _reach(self, text: str, limit: int) -> Optional[int]:
+        """累计字数在 text 内到达 limit 的字符位置（此前已到达时为0，到达不了时为None）"""
+        count = self.count
+        if count >= limit:
+            return 0
+        for match in _WORD_RE.finditer(text):
+            count += 1
+            if count >= limit:
+                return match.end()
+        return None
+
+    def _cut_point(self, window: str, text: str, reached: int) -> Optional[int]:
+        # 此前已超出时，边界可能跨越上一个块的末尾
+        offset = len(self._tail) + reached if reached else 0
+        match = self.boundary.search(window, offset)
+        if match is not None:
+            return match.start()
+        hard_reached = self._reach(text, self.hard_limit)
+        if hard_reached is not None:
+            match = self._SENTENCE_END_RE.search(window, len(self._tail) + hard_reached)
+            if match is not None:
+                return match.end()
+        return None
+
+
+# ============================================================================
+# 抽象生成器基类
+# ============================================================================
+
+class ContentGenerator(ABC):
+    """内容生成器抽象基类"""
+
+    # 平台默认模型
+    DEFAULT_MODEL: str = ""
+    # 平台名称
+    PLATFORM_NAME: str = ""
+    # 平台标识（与 GENERATOR_MAP 的键一致）
+    PLATFORM: str = ""
+
+    def __init__(self, config: GenerationConfig, pool: Optional[ClientPool] = None):
+        self.config = config
+        self.pool = pool if pool is not None else client_pool
+        self.retry_policy = default_retry_policy
+        self.timings = PhaseTimings()
+        start = time.perf_counter()
+        self.skill_content = load_skill_prompt(config)
+        self.timings.skill_load = time.perf_counter() - start
+        self.budget = plan_token_budget(config, self.skill_content, self.build_prompt(), self.model)
+        if config.max_tokens is None:
+            self.config = replace(config, max_tokens=self.budget.max_tokens)
+        self._client = None
+        self._async_client = None
+        self.sinks: List[StreamSink] = []
+        start = time.perf_counter()
+        self._setup_client()
+        self.timings.client_setup = time.perf_counter() - start
+
+    @abstractmethod
+    def _setup_client(self) -> None:
+        """设置API客户端"""
+        pass
+
+    @abstractmethod
+    def _complete(self, prompt: str, partial: str = "") -> GenerationResult:
+        """
+        非流式生成
+
+        Args:
+            prompt: 提示词
+            partial: 已生成的部分内容（非空时为续写请求）
+        """
+        pass
+
+    def _stream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> Iterator[str]:
+        """
+        流式生成，逐块产出文本，并把token用量等写入 state
+
+        默认实现退化为一次性返回完整内容，支持流式的平台应覆盖此方法。
+        """
+        result = self._complete(prompt, partial)
+        state.update_from(result)
+        yield result.content
+
+    def _generate_internal(self, prompt: str) -> GenerationResult:
+        """内部生成方法"""
+        if self.config.stream:
+            return self._generate_stream(prompt)
+        state = StreamState()
+        content = ""
+        for text in self._chunks_with_continuation(prompt, state, self._complete_chunks):
+            content += text
+        return state.to_result(content, self.PLATFORM, self.model)
+
+    async def _agenerate_internal(self, prompt: str) -> GenerationResult:
+        """异步内部生成方法"""
+        if self.config.stream:
+            return await self._agenerate_stream(prompt)
+        state = StreamState()
+        content = ""
+        async for text in self._achunks_with_continuation(prompt, state, self._acomplete_chunks):
+            content += text
+        return state.to_result(content, self.PLATFORM, self.model)
+
+    def _complete_chunks(self, prompt: str, state: StreamState, partial: str) -> Iterator[str]:
+        """把非流式结果包装为单块，供续写循环统一处理"""
+        result = self._complete(prompt, partial)
+        state.update_from(result)
+        yield result.content
+
+    async def _acomplete_chunks(self, prompt: str, state: StreamState, partial: str) -> AsyncIterator[str]:
+        """_complete_chunks 的异步版本"""
+        result = await self._acomplete(prompt, partial)
+        state.update_from(result)
+        yield result.content
+
+    def _continuation_context(self, partial: str) -> str:
+        """续写请求中作为上文发送的已生成内容（默认原样发送）"""
+        return partial
+
+    @staticmethod
+    def _skip_rejoined_whitespace(text: str, skip: int) -> tuple:
+        """
+        去掉续写开头重复输出的空白
+
+        上文末尾有 skip 个空白字符已经输出、但未随续写请求发送，模型常在续写开头
+        重新输出它们；最多去掉 skip 个前导空白，避免拼接处空白重复。
+
+        Returns:
+            tuple: (保留的文本, 后续块还可去掉的空白数)
+        """
+        if skip <= 0:
+            return text, 0
+        leading = len(text) - len(text.lstrip())
+        text = text[min(skip, leading):]
+        return text, (skip - leading if not text else 0)
+
+    def _should_continue(self, state: StreamState, content: str) -> bool:
+        """输出被截断且未达到续写上限时继续生成"""
+        if not state.truncated or not content.strip():
+            return False
+        if state.continuations >= self.config.max_continuations:
+            return False
+        logger.info(
+            f"{self.PLATFORM_NAME} 输出被截断，续写 "
+            f"({state.continuations + 1}/{self.config.max_continuations})..."
+        )
+        return True
+
+    def _chunks_with_continuation(
+        self,
+        prompt: str,
+        state: StreamState,
+        chunks: Callable[[str, StreamState, str], Iterator[str]]
+    ) -> Iterator[str]:
+        """
+        逐块产出文本，截断时把已生成内容作为上下文发送续写请求并接着产出
+
+        Args:
+            prompt: 提示词
+            state: 汇总用量与截断标记
+            chunks: 单次请求的块生成函数 (prompt, state, partial)
+        """
+        parts: List[str] = []
+        for text in chunks(prompt, state, ""):
+            parts.append(text)
+            yield text
+        while self._should_continue(state, "".join(parts)):
+            step = StreamState()
+            partial = "".join(parts)
+            context = self._continuation_context(partial)
+            skip = len(partial) - len(context)
+            for text in chunks(prompt, step, context):
+                text, skip = self._skip_rejoined_whitespace(text, skip)
+                if text:
+                    parts.append(text)
+                    yield text
+            state.add_continuation(step)
+
+    async def _achunks_with_continuation(
+        self,
+        prompt: str,
+        state: StreamState,
+        chunks: Callable[[str, StreamState, str], AsyncIterator[str]]
+    ) -> AsyncIterator[str]:
+        """
+        _chunks_with_continuation 的异步版本
+
+        异步生成器不会随引用释放而关闭，提前结束时需显式 aclose 每次请求的块生成器，
+        底层流式响应才会被关闭。
+        """
+        parts: List[str] = []
+        stream = chunks(prompt, state, "")
+        try:
+            async for text in stream:
+                parts.append(text)
+                yield text
+        finally:
+            await stream.aclose()
+        while self._should_continue(state, "".join(parts)):
+            step = StreamState()
+            partial = "".join(parts)
+            context = self._continuation_context(partial)
+            skip = len(partial) - len(context)
+            stream = chunks(prompt, step, context)
+            try:
+                async for text in stream:
+                    text, skip = self._skip_rejoined_whitespace(text, skip)
+                    if text:
+                        parts.append(text)
+                        yield text
+            finally:
+                await stream.aclose()
+            state.add_continuation(step)
+
+    def _setup_async_client(self) -> None:
+        """设置异步API客户端（首次调用异步接口时执行）"""
+        raise APIError(f"{self.PLATFORM_NAME} 不支持异步生成")
+
+    @abstractmethod
+    async def _acomplete(self, prompt: str, partial: str = "") -> GenerationResult:
+        """异步非流式生成"""
+        pass
+
+    async def _astream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> AsyncIterator[str]:
+        """
+        异步流式生成，逐块产出文本，并把token用量等写入 state
+
+        默认实现退化为一次性返回完整内容，支持流式的平台应覆盖此方法。
+        """
+        result = await self._acomplete(prompt, partial)
+        state.update_from(result)
+        yield result.content
+
+    @property
+    def model(self) -> str:
+        """获取使用的模型名称"""
+        return self.config.model or self.DEFAULT_MODEL
+
+    def build_prompt(self) -> str:
+        """构建提示词"""
+        platform_hint = (
+            f"\n7. 按照{self.config.target_platform}平台的特点进行适配"
+            if self.config.target_platform else ""
+        )
+        return f"""请用{self.config.style}风格，写一篇关于"{self.config.topic}"的文章，目标字数：{self.config.word_count}字。
+
+要求：
+1. 严格按照Skill中的方法论创作
+2. 应用用户决策4次判断模型
+3. 确保内容质量达到HKR评分标准
+4. 字数控制在{self.config.word_count}字左右（误差±10%）
+5. 前句建立相关性，前20行建立信任
+6. 完整内容提供真价值，结尾展示利用价值{platform_hint}
+
+请直接输出文章内容，不需要额外的解释或说明。"""
+
+    def generate(self, prompt: Optional[str] = None) -> GenerationResult:
+        """
+        生成内容（带重试机制）
+
+        Args:
+            prompt: 自定义提示词（默认使用 build_prompt()）
+
+        Returns:
+            GenerationResult: 生成结果
+
+        Raises:
+            APIError: 当API调用失败时
+        """
+        last_error = None
+        prompt = prompt or self.build_prompt()
+
+        cache_key, cached = self._cache_lookup(prompt)
+        if cached is not None:
+            return cached
+
+        breaker = get_circuit_breaker(self.PLATFORM)
+        max_attempts = self.retry_policy.max_attempts
+        waited = 0.0
+        for attempt in range(max_attempts):
+            breaker.before_call()
+            try:
+                reserved = self._estimate_request_tokens(prompt)
+                if rate_limiter is not None:
+                    waited += rate_limiter.acquire(self.PLATFORM, self.config.api_key, reserved)
+
+                logger.info(f"调用 {self.PLATFORM_NAME} API (尝试 {attempt + 1}/{max_attempts})...")
+
+                start_time = time.time()
+                result = self._generate_internal(prompt)
+                result.duration_seconds = time.time() - start_time
+                self._record_timings(result, attempt, waited)
+                record_word_count(result, self.config.word_count)
+
+                self._settle_rate_limit(reserved, result)
+                breaker.record_success()
+                self._log_success(result)
+                self._cache_store(cache_key, result)
+                return result
+
+            except Exception as e:
+                last_error = e
+                wait_time = self._retry_delay(attempt, e, breaker)
+                if wait_time is None:
+                    break
+                time.sleep(wait_time)
+            except BaseException:
+                # 中断/取消：释放熔断探测名额后继续抛出
+                breaker.release()
+                raise
+
+        raise self._final_error(last_error)
+
+    async def agenerate(self, prompt: Optional[str] = None) -> GenerationResult:
+        """
+        异步生成内容（带重试机制）
+
+        与 generate() 行为一致，但使用SDK的异步客户端和 asyncio.sleep 退避，
+        不占用线程；所在任务被取消时，进行中的请求和退避等待会一并取消。
+
+        Args:
+            prompt: 自定义提示词（默认使用 build_prompt()）
+
+        Returns:
+            GenerationResult: 生成结果
+
+        Raises:
+            APIError: 当API调用失败时
+        """
+        import asyncio
+        last_error = None
+        prompt = prompt or self.build_prompt()
+
+        cache_key, cached = self._cache_lookup(prompt)
+        if cached is not None:
+            return cached
+
+        self._ensure_async_client()
+        breaker = get_circuit_breaker(self.PLATFORM)
+        max_attempts = self.retry_policy.max_attempts
+        waited = 0.0
+        for attempt in range(max_attempts):
+            breaker.before_call()
+            try:
+                reserved = self._estimate_request_tokens(prompt)
+                if rate_limiter is not None:
+                    waited += await rate_limiter.aacquire(self.PLATFORM, self.config.api_key, reserved)
+
+                logger.info(f"异步调用 {self.PLATFORM_NAME} API (尝试 {attempt + 1}/{max_attempts})...")
+
+                start_time = time.time()
+                result = await self._agenerate_internal(prompt)
+                result.duration_seconds = time.time() - start_time
+                self._record_timings(result, attempt, waited)
+                record_word_count(result, self.config.word_count)
+
+                self._settle_rate_limit(reserved, result)
+                breaker.record_success()
+                self._log_success(result)
+                self._cache_store(cache_key, result)
+                return result
+
+            except Exception as e:
+                last_error = e
+                wait_time = self._retry_delay(attempt, e, breaker)
+                if wait_time is None:
+                    break
+                await asyncio.sleep(wait_time)
+            except BaseException:
+                breaker.release()
+                raise
+
+        raise self._final_error(last_error)
+
+    async def astream(self, prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        异步流式生成，逐块产出文本（不重试）
+
+        Args:
+            prompt: 自定义提示词（默认使用 build_prompt()）
+        """
+        import asyncio
+        self._ensure_async_client()
+        state = StreamState()
+        try:
+            async for text in self._astop_at_length(
+                self._achunks_with_continuation(prompt or self.build_prompt(), state, self._astream_chunks),
+                state
+            ):
+                yield text
+        except (APIError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            raise APIError(f"{self.PLATFORM_NAME} API调用失败: {e}") from e
+
+    async def aclose(self) -> None:
+        """释放异步客户端引用（连接由客户端池管理，随事件循环回收）"""
+        self._async_client = None
+
+    def _pool_key(self, *extra: Any) -> tuple:
+        """客户端池键：(平台, API Key, API地址, 模型, ...)"""
+        return (self.PLATFORM, self.config.api_key, self.config.base_url, self.model) + extra
+
+    def stream(self, prompt: Optional[str] = None) -> Iterator[str]:
+        """
+        流式生成，逐块产出文本（不重试、不经过sink）
+
+        Args:
+            prompt: 自定义提示词（默认使用 build_prompt()）
+        """
+        state = StreamState()
+        try:
+            yield from self._stop_at_length(
+                self._chunks_with_continuation(prompt or self.build_prompt(), state, self._stream_chunks),
+                state
+            )
+        except APIError:
+            raise
+        except Exception as e:
+            raise APIError(f"{self.PLATFORM_NAME} API调用失败: {e}") from e
+
+    def add_sink(self, sink: StreamSink) -> None:
+        """添加流式输出目标"""
+        self.sinks.append(sink)
+
+    def _length_guard(self) -> Optional[LengthGuard]:
+        """按配置创建字数守卫（截止策略为 off 时返回None）"""
+        if self.config.stop_policy == 'off' or self.config.word_count <= 0:
+            return None
+        return LengthGuard(self.config.word_count, self.config.length_tolerance, self.config.stop_policy)
+
+    def _finish_early_stop(self, state: StreamState, guard: LengthGuard, content: str) -> None:
+        """提前截止：被关闭的请求收不到用量，按已输出内容估算"""
+        state.stopped_early = True
+        state.truncated = False
+        output_tokens = estimate_tokens(content, self.budget.family)
+        state.output_tokens = max(state.output_tokens, output_tokens)
+        state.input_tokens = max(state.input_tokens, self.budget.input_tokens)
+        state.tokens_used = max(state.tokens_used, state.input_tokens + state.output_tokens)
+        logger.info(
+            f"已达到目标字数（{guard.count}字 / 截止 {guard.limit}字），在边界处提前结束生成"
+        )
+
+    def _stop_at_length(self, chunks: Iterator[str], state: StreamState) -> Iterator[str]:
+        """按字数守卫截取文本块；截止时关闭底层流，不再为多余的输出付费"""
+        guard = self._length_guard()
+        if guard is None:
+            yield from chunks
+            return
+        parts: List[str] = []
+        try:
+            for text in chunks:
+                text = guard.feed(text)
+                if text:
+                    parts.append(text)
+                    yield text
+                if guard.stopped:
+                    self._finish_early_stop(state, guard, "".join(parts))
+                    break
+        finally:
+            chunks.close()
+
+    async def _astop_at_length(self, chunks: AsyncIterator[str], state: StreamState) -> AsyncIterator[str]:
+        """_stop_at_length 的异步版本"""
+        guard = self._length_guard()
+        if guard is None:
+            async for text in chunks:
+                yield text
+            return
+        parts: List[str] = []
+        try:
+            async for text in chunks:
+                text = guard.feed(text)
+                if text:
+                    parts.append(text)
+                    yield text
+                if guard.stopped:
+                    self._finish_early_stop(state, guard, "".join(parts))
+                    break
+        finally:
+            await chunks.aclose()
+
+    def _active_sinks(self) -> List[StreamSink]:
+        """本次流式生成使用的sink（未配置时输出到终端）"""
+        return self.sinks or [StdoutSink()]
+
+    def _generate_stream(self, prompt: str) -> GenerationResult:
+        """流式生成：逐块分发到各sink，结束后汇总结果"""
+        state = StreamState()
+        parts: List[str] = []
+        sinks = self._active_sinks()
+        for sink in sinks:
+            sink.open()
+        try:
+            for text in self._stop_at_length(
+                self._chunks_with_continuation(prompt, state, self._stream_chunks), state
+            ):
+                state.mark_chunk()
+                parts.append(text)
+                for sink in sinks:
+                    sink.write(text)
+        except APIError:
+            raise
+        except Exception as e:
+            raise APIError(f"{self.PLATFORM_NAME} API调用失败: {e}") from e
+        finally:
+            for sink in sinks:
+                sink.close()
+
+        return state.to_result("".join(parts), self.PLATFORM, self.model)
+
+    async def _agenerate_stream(self, prompt: str) -> GenerationResult:
+        """异步流式生成：逐块分发到各sink，结束后汇总结果"""
+        import asyncio
+        state = StreamState()
+        parts: List[str] = []
+        sinks = self._active_sinks()
+        for sink in sinks:
+            sink.open()
+        try:
+            async for text in self._astop_at_length(
+                self._achunks_with_continuation(prompt, state, self._astream_chunks), state
+            ):
+                state.mark_chunk()
+                parts.append(text)
+                for sink in sinks:
+                    sink.write(text)
+        except (APIError, asyncio.CancelledError):
+            raise
+        except Exception as e:
+            raise APIError(f"{self.PLATFORM_NAME} API调用失败: {e}") from e
+        finally:
+            for sink in sinks:
+                sink.close()
+
+        return state.to_result("".join(parts), self.PLATFORM, self.model)
+
+    @property
+    def skill_digest(self) -> str:
+        """Skill内容摘要，用于提示词缓存的路由键"""
+        return hashlib.sha256(self.skill_content.encode('utf-8')).hexdigest()[:16]
+
+    def _cache_lookup(self, prompt: str) -> tuple:
+        """
+        查询响应缓存
+
+        Returns:
+            tuple: (缓存键, 命中的结果)；未启用缓存时缓存键为None
+        """
+        if not self.config.use_cache:
+            return None, None
+        start_time = time.time()
+        try:
+            cache = get_response_cache(self.config.cache_path)
+            key = cache.make_key(
+                self.skill_content, prompt, self.PLATFORM, self.model,
+                self.config.temperature, self.config.max_tokens
+            )
+            if self.config.refresh_cache:
+                return key, None
+            result = cache.get(key)
+        except sqlite3.Error as e:
+            logger.warning(f"响应缓存不可用: {e}")
+            return None, None
+
+        if result is not None:
+            result.duration_seconds = time.time() - start_time
+            result.timings = replace(self.timings)
+            record_word_count(result, self.config.word_count)
+            logger.info(f"命中响应缓存，跳过 {self.PLATFORM_NAME} API调用")
+            if self.config.stream:
+                for sink in self._active_sinks():
+                    sink.open()
+                    sink.write(result.content)
+                    sink.close()
+        return key, result
+
+    def _cache_store(self, key: Optional[str], result: GenerationResult) -> None:
+        """写入响应缓存（截断的结果不缓存）"""
+        if key is None or result.truncated:
+            return
+        try:
+            get_response_cache(self.config.cache_path).put(key, result)
+        except sqlite3.Error as e:
+            logger.warning(f"写入响应缓存失败: {e}")
+
+    def _ensure_async_client(self) -> None:
+        """按需创建异步客户端"""
+        if self._async_client is None:
+            self._setup_async_client()
+
+    def _record_timings(self, result: GenerationResult, retries: int, waited: float) -> None:
+        """合并初始化耗时与本次调用的API耗时、重试次数"""
+        timings = replace(self.timings, ttft=result.timings.ttft, rate_limit_wait=waited, retries=retries)
+        timings.finish_api(result.duration_seconds, result.output_tokens)
+        result.timings = timings
+
+    def _estimate_request_tokens(self, prompt: str) -> int:
+        """预估单次请求的token消耗：输入（Skill+提示词）+ 最大输出"""
+        return (
+            self.budget.skill_tokens
+            + estimate_tokens(prompt, self.budget.family)
+            + self.config.max_tokens
+        )
+
+    def _settle_rate_limit(self, reserved: int, result: GenerationResult) -> None:
+        """按实际用量归还多预留的token额度"""
+        if rate_limiter is not None and result.tokens_used:
+            rate_limiter.refund(self.PLATFORM, self.config.api_key, reserved - result.tokens_used)
+
+    def _retry_delay(self, attempt: int, error: Exception, breaker: CircuitBreaker) -> Optional[float]:
+        """
+        处理一次失败：更新熔断器并决定是否重试
+
+        Returns:
+            Optional[float]: 重试前的等待秒数；None 表示不再重试
+        """
+        classification = classify_error(error)
+        if not classification.retryable:
+            breaker.release()
+            logger.error(f"API调用失败（不可重试）: {error}")
+            return None
+
+        breaker.record_failure()
+        if attempt >= self.retry_policy.max_attempts - 1:
+            logger.error(f"API调用失败，已达最大重试次数: {error}")
+            return None
+
+        wait_time = self.retry_policy.compute_delay(attempt, classification.retry_after)
+        logger.warning(f"API调用失败，{wait_time:.1f}秒后重试: {error}")
+        return wait_time
+
+    def _final_error(self, error: Optional[Exception]) -> APIError:
+        """重试结束后抛出的异常（保留原始异常链）"""
+        if isinstance(error, APIError):
+            return error
+        wrapped = APIError(f"{self.PLATFORM_NAME} API调用失败: {error}")
+        wrapped.__cause__ = error
+        return wrapped
+
+    def _log_success(self, result: GenerationResult) -> None:
+        logger.info(
+            f"{self.PLATFORM_NAME} API调用成功，"
+            f"生成内容长度: {len(result.content)}字，"
+            f"耗时: {result.duration_seconds:.2f}秒"
+        )
+
+
+# ============================================================================
+# 具体平台生成器
+# ============================================================================
+
+class OpenAIGenerator(ContentGenerator):
+    """OpenAI GPT生成器"""
+
+    PLATFORM_NAME = "OpenAI"
+    PLATFORM = "openai"
+    DEFAULT_MODEL = "gpt-4o"
+
+    def _setup_client(self) -> None:
+        try:
+            from openai import OpenAI
+            self._client = self.pool.get(self._pool_key(), lambda: OpenAI(
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                http_client=self.pool.http_client(self.PLATFORM)
+            ))
+        except ImportError:
+            raise APIError("未安装openai库，请运行: pip install openai")
+
+    def _setup_async_client(self) -> None:
+        try:
+            from openai import AsyncOpenAI
+            self._async_client = self.pool.get_async(self._pool_key(), lambda: AsyncOpenAI(
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                http_client=self.pool.async_http_client()
+            ))
+        except ImportError:
+            raise APIError("未安装openai库，请运行: pip install openai")
+
+    def _build_messages(self, prompt: str, partial: str = "") -> list:
+        # Skill 作为固定前缀放在最前面，命中 OpenAI 的自动前缀缓存
+        messages = [
+            {"role": "system", "content": self.skill_content},
+            {"role": "user", "content": prompt}
+        ]
+        if partial:
+            # 续写：已生成内容作为助手回复，再要求从中断处继续
+            messages += [
+                {"role": "assistant", "content": partial},
+                {"role": "user", "content": CONTINUE_PROMPT}
+            ]
+        return messages
+
+    def _request_kwargs(self, prompt: str, partial: str = "") -> Dict[str, Any]:
+        kwargs: Dict[str, Any] = {
+            "model": self.model,
+            "messages": self._build_messages(prompt, partial),
+            "temperature": self.config.temperature,
+            "max_tokens": self.config.max_tokens,
+        }
+        if self.config.prompt_cache:
+            # 相同Skill前缀的请求路由到同一缓存分片，提高命中率
+            kwargs["extra_body"] = {"prompt_cache_key": f"skill-{self.skill_digest}"}
+        return kwargs
+
+    @staticmethod
+    def _apply_usage(usage: Any, state: StreamState) -> None:
+        state.tokens_used = usage.total_tokens
+        state.input_tokens = usage.prompt_tokens
+        state.output_tokens = usage.completion_tokens
+        details = getattr(usage, 'prompt_tokens_details', None)
+        state.cache_read_tokens = getattr(details, 'cached_tokens', 0) or 0
+
+    def _parse_response(self, response: Any) -> GenerationResult:
+        state = StreamState(truncated=not response.choices[0].finish_reason == "stop")
+        if response.usage:
+            self._apply_usage(response.usage, state)
+        return state.to_result(response.choices[0].message.content or "", self.PLATFORM, self.model)
+
+    def _complete(self, prompt: str, partial: str = "") -> GenerationResult:
+        try:
+            response = self._client.chat.completions.create(**self._request_kwargs(prompt, partial))
+            return self._parse_response(response)
+
+        except Exception as e:
+            raise APIError(f"OpenAI API调用失败: {e}") from e
+
+    def _stream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> Iterator[str]:
+        response = self._client.chat.completions.create(
+            **self._request_kwargs(prompt, partial),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        try:
+            for chunk in response:
+                if chunk.choices:
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if chunk.choices[0].finish_reason:
+                        state.truncated = chunk.choices[0].finish_reason != "stop"
+                if chunk.usage:
+                    self._apply_usage(chunk.usage, state)
+        finally:
+            close = getattr(response, 'close', None)
+            if close is not None:
+                close()
+
+    async def _acomplete(self, prompt: str, partial: str = "") -> GenerationResult:
+        try:
+            response = await self._async_client.chat.completions.create(
+                **self._request_kwargs(prompt, partial)
+            )
+            return self._parse_response(response)
+
+        except Exception as e:
+            raise APIError(f"OpenAI API调用失败: {e}") from e
+
+    async def _astream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> AsyncIterator[str]:
+        response = await self._async_client.chat.completions.create(
+            **self._request_kwargs(prompt, partial),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        try:
+            async for chunk in response:
+                if chunk.choices:
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if chunk.choices[0].finish_reason:
+                        state.truncated = chunk.choices[0].finish_reason != "stop"
+                if chunk.usage:
+                    self._apply_usage(chunk.usage, state)
+        finally:
+            await response.close()
+
+
+class ClaudeGenerator(ContentGenerator):
+    """Claude生成器"""
+
+    PLATFORM_NAME = "Claude"
+    PLATFORM = "claude"
+    DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+    def _setup_client(self) -> None:
+        try:
+            import anthropic
+            self._client = self.pool.get(self._pool_key(), lambda: anthropic.Anthropic(
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                http_client=self.pool.http_client(self.PLATFORM)
+            ))
+        except ImportError:
+            raise APIError("未安装anthropic库，请运行: pip install anthropic")
+
+    def _setup_async_client(self) -> None:
+        try:
+            import anthropic
+            self._async_client = self.pool.get_async(self._pool_key(), lambda: anthropic.AsyncAnthropic(
+                api_key=self.config.api_key,
+                base_url=self.config.base_url,
+                http_client=self.pool.async_http_client()
+            ))
+        except ImportError:
+            raise APIError("未安装anthropic库，请运行: pip install anthropic")
+
+    def _system_blocks(self) -> Any:
+        """Skill系统提示词，启用缓存时在Skill块末尾设置 cache_control 断点"""
+        if not self.config.prompt_cache:
+            return self.skill_content
+        return [{
+            "type": "text",
+            "text": self.skill_content,
+            "cache_control": {"type": "ephemeral"}
+        }]
+
+    @staticmethod
+    def _apply_usage(usage: Any, state: StreamState) -> None:
+        state.input_tokens = usage.input_tokens
+        state.output_tokens = usage.output_tokens
+        state.cache_read_tokens = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        state.cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        state.tokens_used = (
+            state.input_tokens + state.output_tokens
+            + state.cache_read_tokens + state.cache_write_tokens
+        )
+
+    def _continuation_context(self, partial: str) -> str:
+        # 预填充内容不能以空白结尾；去掉的空白已输出，续写开头重复的部分由续写循环去掉
+        return partial.rstrip()
+
+    @staticmethod
+    def _build_messages(prompt: str, partial: str = "") -> list:
+        messages = [{"role": "user", "content": prompt}]
+        if partial:
+            # 续写：已生成内容（见 _continuation_context）作为助手预填充，模型直接接着写
+            messages.append({"role": "assistant", "content": partial})
+        return messages
+
+    def _request_kwargs(self, prompt: str, partial: str = "") -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "max_tokens": self.config.max_tokens,
+            "system": self._system_blocks(),
+            "messages": self._build_messages(prompt, partial),
+        }
+
+    def _apply_message(self, message: Any, state: StreamState) -> None:
+        self._apply_usage(message.usage, state)
+        state.truncated = message.stop_reason == "max_tokens"
+
+    def _parse_message(self, message: Any) -> GenerationResult:
+        state = StreamState()
+        self._apply_message(message, state)
+        return state.to_result(message.content[0].text, self.PLATFORM, self.model)
+
+    def _complete(self, prompt: str, partial: str = "") -> GenerationResult:
+        try:
+            message = self._client.messages.create(**self._request_kwargs(prompt, partial))
+            return self._parse_message(message)
+
+        except Exception as e:
+            raise APIError(f"Claude API调用失败: {e}") from e
+
+    async def _acomplete(self, prompt: str, partial: str = "") -> GenerationResult:
+        try:
+            message = await self._async_client.messages.create(**self._request_kwargs(prompt, partial))
+            return self._parse_message(message)
+
+        except Exception as e:
+            raise APIError(f"Claude API调用失败: {e}") from e
+
+    async def _astream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> AsyncIterator[str]:
+        async with self._async_client.messages.stream(**self._request_kwargs(prompt, partial)) as stream:
+            async for text in stream.text_stream:
+                yield text
+            message = await stream.get_final_message()
+
+        self._apply_message(message, state)
+
+    def _stream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> Iterator[str]:
+        with self._client.messages.stream(**self._request_kwargs(prompt, partial)) as stream:
+            for text in stream.text_stream:
+                yield text
+            message = stream.get_final_message()
+
+        self._apply_message(message, state)
+
+
+class GeminiGenerator(ContentGenerator):
+    """Gemini生成器"""
+
+    PLATFORM_NAME = "Gemini"
+    PLATFORM = "gemini"
+    DEFAULT_MODEL = "gemini-2.0-flash-exp"
+
+    # (模型, Skill摘要) -> CachedContent，进程内复用显式上下文缓存
+    _context_caches: Dict[tuple, Any] = {}
+    _context_cache_lock = threading.Lock()
+    _configured_client: Optional[tuple] = None
+
+    def _setup_client(self) -> None:
+        try:
+            import google.generativeai as genai
+            self._genai = genai
+            self._configure_api_key()
+            cached_content = self._get_context_cache() if self.config.prompt_cache else None
+            # GenerativeModel 绑定系统提示词（或上下文缓存），池键需包含二者
+            self._model_client = self.pool.get(
+                self._pool_key(self.skill_digest, getattr(cached_content, 'name', None)),
+                lambda: self._create_model_client(cached_content)
+            )
+        except ImportError:
+            raise APIError("未安装google-generativeai库，请运行: pip install google-generativeai")
+
+    def _configure_api_key(self) -> None:
+        # genai.configure 为进程级设置并会重建底层客户端，仅在API Key或地址变化时调用；
+        # 同一进程内交替使用多个API Key时以最后一次配置为准
+        with self._context_cache_lock:
+            configured = (self.config.api_key, self.config.base_url)
+            if GeminiGenerator._configured_client != configured:
+                if self.config.base_url:
+                    # 自定义地址（代理或本地mock服务）只支持REST传输
+                    self._genai.configure(
+                        api_key=self.config.api_key,
+                        transport='rest',
+                        client_options={'api_endpoint': self.config.base_url}
+                    )
+                else:
+                    self._genai.configure(api_key=self.config.api_key)
+                GeminiGenerator._configured_client = configured
+
+    def _create_model_client(self, cached_content: Any) -> Any:
+        if cached_content is not None:
+            return self._genai.GenerativeModel.from_cached_content(cached_content=cached_content)
+        return self._genai.GenerativeModel(
+            model_name=self.model,
+            system_instruction=self.skill_content
+        )
+
+    def _get_context_cache(self) -> Any:
+        """
+        获取或创建Skill的显式上下文缓存
+
+        模型不支持缓存或内容低于最小缓存长度时返回None，回退为普通 system_instruction。
+        """
+        key = (self.model, self.skill_digest)
+        with self._context_cache_lock:
+            cached = self._context_caches.get(key)
+            if cached is not None and cached[1] > time.time():
+                return cached[0]
+            try:
+                from datetime import timedelta
+                cached_content = self._genai.caching.CachedContent.create(
+                    model=self.model,
+                    display_name=f"viral-skill-{self.skill_digest}",
+                    system_instruction=self.skill_content,
+                    ttl=timedelta(seconds=GEMINI_CACHE_TTL_SECONDS)
+                )
+            except Exception as e:
+                logger.debug(f"Gemini上下文缓存不可用，使用普通系统提示词: {e}")
+                return None
+            # 提前一分钟视为过期，避免使用即将失效的缓存
+            self._context_caches[key] = (cached_content, time.time() + GEMINI_CACHE_TTL_SECONDS - 60)
+            logger.info(f"已创建Gemini上下文缓存: {self.model}")
+            return cached_content
+
+    def _setup_async_client(self) -> None:
+        # GenerativeModel 同时提供同步与异步接口
+        self._async_client = self._model_client
+
+    def _parse_response(self, response: Any) -> GenerationResult:
+        content = response.text
+        state = StreamState(truncated=self._is_truncated(response))
+        self._apply_usage(response, state, content)
+        return state.to_result(content, self.PLATFORM, self.model)
+
+    @staticmethod
+    def _is_truncated(response: Any) -> bool:
+        """候选结果的 finish_reason 为 MAX_TOKENS 时视为截断"""
+        candidates = getattr(response, 'candidates', None) or []
+        if not candidates:
+            return False
+        reason = getattr(candidates[0], 'finish_reason', None)
+        return getattr(reason, 'name', reason) in ('MAX_TOKENS', 2)
+
+    @staticmethod
+    def _build_contents(prompt: str, partial: str = "") -> Any:
+        if not partial:
+            return prompt
+        # 续写：已生成内容作为模型回复，再要求从中断处继续
+        return [
+            {"role": "user", "parts": [prompt]},
+            {"role": "model", "parts": [partial]},
+            {"role": "user", "parts": [CONTINUE_PROMPT]},
+        ]
+
+    @staticmethod
+    def _apply_usage(response: Any, state: StreamState, content: str) -> None:
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is None or not getattr(usage, 'total_token_count', 0):
+            # 响应未携带用量时粗略估算
+            state.output_tokens = estimate_tokens(content, 'gemini')
+            state.tokens_used = state.output_tokens
+            return
+        state.input_tokens = getattr(usage, 'prompt_token_count', 0) or 0
+        state.output_tokens = getattr(usage, 'candidates_token_count', 0) or 0
+        state.cache_read_tokens = getattr(usage, 'cached_content_token_count', 0) or 0
+        state.tokens_used = usage.total_token_count
+
+    @staticmethod
+    def _chunk_text(chunk: Any) -> str:
+        # 只含安全评级或用量的块没有文本，访问 .text 会抛出 ValueError
+        try:
+            return chunk.text
+        except ValueError:
+            return ""
+
+    def _generation_config(self) -> Dict[str, Any]:
+        return {
+            "temperature": self.config.temperature,
+            "max_output_tokens": self.config.max_tokens,
+        }
+
+    def _complete(self, prompt: str, partial: str = "") -> GenerationResult:
+        try:
+            response = self._model_client.generate_content(
+                self._build_contents(prompt, partial), generation_config=self._generation_config()
+            )
+            return self._parse_response(response)
+
+        except Exception as e:
+            raise APIError(f"Gemini API调用失败: {e}") from e
+
+    @staticmethod
+    def _close_stream(response: Any) -> None:
+        """取消尚未读完的流式响应（SDK未提供 close，底层为 gRPC 流）"""
+        cancel = getattr(getattr(response, '_iterator', None), 'cancel', None)
+        if callable(cancel):
+            cancel()
+
+    @staticmethod
+    async def _aclose_stream(response: Any) -> None:
+        """_close_stream 的异步版本"""
+        iterator = getattr(response, '_iterator', None)
+        if hasattr(iterator, 'aclose'):
+            await iterator.aclose()
+        elif callable(getattr(iterator, 'cancel', None)):
+            iterator.cancel()
+
+    def _stream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> Iterator[str]:
+        response = self._model_client.generate_content(
+            self._build_contents(prompt, partial), generation_config=self._generation_config(), stream=True
+        )
+
+        parts: List[str] = []
+        last_chunk = None
+        try:
+            for chunk in response:
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+                last_chunk = chunk
+        finally:
+            self._close_stream(response)
+
+        # 用量与结束原因在最后一个块中最完整
+        self._apply_usage(last_chunk, state, "".join(parts))
+        state.truncated = self._is_truncated(last_chunk)
+
+    async def _acomplete(self, prompt: str, partial: str = "") -> GenerationResult:
+        if self.config.base_url:
+            # REST 传输没有异步实现，放到线程池中执行同步调用
+            import asyncio
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, self._complete, prompt, partial)
+        try:
+            response = await self._async_client.generate_content_async(
+                self._build_contents(prompt, partial), generation_config=self._generation_config()
+            )
+            return self._parse_response(response)
+
+        except Exception as e:
+            raise APIError(f"Gemini API调用失败: {e}") from e
+
+    async def _astream_chunks(self, prompt: str, state: StreamState, partial: str = "") -> AsyncIterator[str]:
+        if self.config.base_url:
+            # REST 传输：退化为一次性返回完整内容
+            async for text in super()._astream_chunks(prompt, state, partial):
+                yield text
+            return
+
+        response = await self._async_client.generate_content_async(
+            self._build_contents(prompt, partial), generation_config=self._generation_config(), stream=True
+        )
+
+        parts: List[str] = []
+        last_chunk = None
+        try:
+            async for chunk in response:
+                text = self._chunk_text(chunk)
+                if text:
+                    parts.append(text)
+                    yield text
+                last_chunk = chunk
+        finally:
+            await self._aclose_stream(response)
+
+        self._apply_usage(last_chunk, state, "".join(parts))
+        state.truncated = self._is_truncated(last_chunk)
+
+
+
+# ============================================================================
+# 生成器工厂
+# ============================================================================
+
+GENERATOR_MAP: Dict[str, type[ContentGenerator]] = {
+    'openai': OpenAIGenerator,
+    'claude': ClaudeGenerator,
+    'gemini': GeminiGenerator,
+}
+
+
+def create_generator(config: GenerationConfig, pool: Optional[ClientPool] = None) -> ContentGenerator:
+    """
+    创建生成器实例
+
+    Args:
+        config: 生成配置
+        pool: 客户端池（默认使用全局 client_pool，复用SDK客户端与HTTP连接）
+
+    Returns:
+        ContentGenerator: 生成器实例
+
+    Raises:
+        ValidationError: 当平台不支持时
+    """
+    generator_class = GENERATOR_MAP.get(config.platform)
+    if generator_class is None:
+        raise ValidationError(
+            f"不支持的平台: {config.platform}，"
+            f"支持的平台: {list(GENERATOR_MAP.keys())}"
+        )
+    return generator_class(config, pool)
+
+
+# ============================================================================
+# 启动预热
+# ============================================================================
+
+# 平台 -> (SDK模块, 默认API地址)；Gemini 使用SDK自带传输，只预先导入
+WARM_UP_TARGETS: Dict[str, tuple] = {
+    'openai': ('openai', 'https://api.openai.com/v1'),
+    'claude': ('anthropic', 'https://api.anthropic.com'),
+    'gemini': ('google.generativeai', None),
+}
+
+
+def start_warm_up(
+    platform: str,
+    base_url: Optional[str] = None,
+    pool: Optional[ClientPool] = None,
+    connect: Optional[Any] = None
+) -> threading.Thread:
+    """
+    后台预热平台连接
+
+    在后台线程中导入SDK，并通过客户端池的共享HTTP客户端提前完成
+    DNS解析与TLS握手，与配置加载、Skill加载并行进行；之后创建的SDK
+    客户端直接复用这条keep-alive连接。预热失败不影响正常生成。
+
+    连接池参数来自配置文件时，可在加载配置前启动预热并传入 connect：
+    SDK导入立即开始，建立连接则等到 connect 完成——其结果为API地址
+    （None 表示使用 base_url 或平台默认地址），取消则不建立连接。
+
+    Args:
+        platform: 平台标识
+        base_url: 自定义API地址
+        pool: 客户端池（默认全局池；未传入 connect 时需在 configure 之后调用）
+        connect: 连接池配置完成的信号（concurrent.futures.Future）
+
+    Returns:
+        threading.Thread: 预热线程（守护线程，无需等待）
+    """
+    module_name, default_url = WARM_UP_TARGETS.get(platform, (None, None))
+    pool = pool if pool is not None else client_pool
+
+    def run() -> None:
+        start = time.perf_counter()
+        try:
+            if module_name:
+                import importlib
+                importlib.import_module(module_name)
+            url = base_url
+            if connect is not None:
+                from concurrent.futures import CancelledError
+                try:
+                    url = connect.result() or base_url
+                except CancelledError:
+                    logger.debug(f"{platform} 预热只导入SDK，耗时 {time.perf_counter() - start:.3f}秒")
+                    return
+            url = url or default_url
+            if url:
+                pool.http_client(platform).head(url, timeout=10)
+        except Exception as e:
+            logger.debug(f"{platform} 预热失败（不影响生成）: {e}")
+            return
+        logger.debug(f"{platform} 预热完成，耗时 {time.perf_counter() - start:.3f}秒")
+
+    thread = threading.Thread(target=run, name=f"warm-up-{platform}", daemon=True)
+    thread.start()
+    return thread
+
+
+# ============================================================================
+# 长文分段生成
+# ============================================================================
+
+@dataclass
+class OutlineSection:
+    """大纲中的一个部分"""
+    title: str
+    summary: str = ""
+    word_count: int = 0
+
+
+_OUTLINE_WORDS_RE = re.compile(r'(?:字数|篇幅)\s*[:：]\s*(\d+)')
+
+
+def parse_outline(text: str) -> tuple:
+    """
+    解析大纲文本
+
+    约定格式：一行 "# 文章标题"，每个部分以 "## 小标题" 开头，
+    其后为要点描述，可含一行 "字数：N"。
+
+    Returns:
+        tuple: (文章标题, List[OutlineSection])
+    """
+    title = ""
+    sections: List[OutlineSection] = []
+    summary_lines: List[str] = []
+
+    def flush() -> None:
+        if sections:
+            sections[-1].summary = "\n".join(summary_lines).strip()
+        summary_lines.clear()
+
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith('## '):
+            flush()
+            sections.append(OutlineSection(title=stripped[3:].strip()))
+        elif stripped.startswith('# ') and not sections:
+            title = stripped[2:].strip()
+        elif sections:
+            match = _OUTLINE_WORDS_RE.search(stripped)
+            if match:
+                sections[-1].word_count = int(match.group(1))
+            elif stripped:
+                summary_lines.append(stripped)
+    flush()
+    return title, sections
+
+
+def allocate_word_budget(sections: List[OutlineSection], total: int) -> None:
+    """按大纲建议的字数比例分配各部分字数，使合计等于目标字数"""
+    if not sections:
+        return
+    suggested = [max(section.word_count, 0) for section in sections]
+    weights = suggested if all(suggested) else [1] * len(sections)
+    weight_sum = sum(weights)
+    remaining = total
+    for index, section in enumerate(sections):
+        if index == len(sections) - 1:
+            section.word_count = remaining
+        else:
+            section.word_count = round(total * weights[index] / weight_sum)
+            remaining -= section.word_count
+
+
+class LongFormGenerator:
+    """
+    长文生成器：先生成大纲，再并发生成各部分，最后拼接成文
+
+    对应Skill创作流程的"阶段2：大纲生成"与"阶段3：内容创作"。
+    每个部分按字数预算生成，并带上完整大纲与相邻部分要点作为上下文，
+    总耗时约等于最慢一个部分的耗时。配置了 sinks 时，各部分按顺序在
+    前面的部分都完成后整段写入。
+    """
+
+    def __init__(
+        self,
+        config: GenerationConfig,
+        pool: Optional[ClientPool] = None,
+        max_workers: int = DEFAULT_SECTION_WORKERS,
+        sinks: Optional[List[StreamSink]] = None
+    ):
+        self.config = config
+        self.pool = pool
+        self.max_workers = max_workers
+        self.sinks: List[StreamSink] = sinks or []
+
+    def build_outline_prompt(self) -> str:
+        """构建大纲提示词"""
+        return f"""请按照Skill创作流程的"阶段2：大纲生成"，为一篇{self.config.style}、主题为"{self.config.topic}"的文章设计大纲，目标总字数：{self.config.word_count}字。
+
+输出格式要求（严格遵守，不要输出其他内容）：
+# 文章标题
+## 第一部分小标题
+要点：本部分的核心内容、论据与案例（2-3句）
+字数：本部分建议字数
+## 第二部分小标题
+...
+
+要求：
+1. 第一部分负责开头（前3句建立相关性，前20行建立信任），最后一部分负责结尾（展示利用价值）
+2. 共{self._suggested_section_count()}个左右部分，各部分建议字数合计约{self.config.word_count}字
+3. 各部分内容不重复，层层递进"""
+
+    def _suggested_section_count(self) -> int:
+        return max(3, min(12, round(self.config.word_count / 1500)))
+
+    def build_section_prompt(
+        self,
+        title: str,
+        sections: List[OutlineSection],
+        index: int
+    ) -> str:
+        """构建单个部分的提示词（含完整大纲与相邻部分要点）"""
+        section = sections[index]
+        outline = "\n".join(f"{i + 1}. {s.title}（约{s.word_count}字）" for i, s in enumerate(sections))
+        context = []
+        if index > 0:
+            prev = sections[index - 1]
+            context.append(f"上一部分《{prev.title}》要点：{prev.summary or '无'}")
+        if index < len(sections) - 1:
+            nxt = sections[index + 1]
+            context.append(f"下一部分《{nxt.title}》要点：{nxt.summary or '无'}")
+        if index == 0:
+            position = "这是文章的开头部分：前3句建立相关性，前20行建立信任。"
+        elif index == len(sections) - 1:
+            position = "这是文章的结尾部分：总结全文并展示利用价值。"
+        else:
+            position = "这是文章的中间部分：承接上文，不要重复开头和结尾的内容。"
+        context_text = "\n".join(context)
+
+        return f"""你正在用{self.config.style}撰写文章《{title or self.config.topic}》（主题："{self.config.topic}"）的其中一个部分。
+
+完整大纲：
+{outline}
+
+{context_text}
+
+现在请撰写第{index + 1}部分《{section.title}》。
+本部分要点：{section.summary or '按大纲展开'}
+{position}
+
+要求：
+1. 严格按照Skill中的方法论创作
+2. 字数控制在{section.word_count}字左右（误差±10%）
+3. 以"## {section.title}"作为本部分标题开头，只输出本部分正文，不要输出其他部分或额外说明"""
+
+    def _create(self, **overrides: Any) -> ContentGenerator:
+        return create_generator(replace(self.config, stream=False, **overrides), self.pool)
+
+    def generate_outline(self) -> tuple:
+        """
+        生成并解析大纲
+
+        Returns:
+            tuple: (文章标题, List[OutlineSection], GenerationResult)
+
+        Raises:
+            APIError: 当大纲无法解析时
+        """
+        # 大纲篇幅短，按最小字数做预算检查
+        generator = self._create(
+            max_tokens=min(self.config.max_tokens or OUTLINE_MAX_TOKENS, OUTLINE_MAX_TOKENS),
+            word_count=MIN_WORD_COUNT
+        )
+        result = generator.generate(self.build_outline_prompt())
+        title, sections = parse_outline(result.content)
+        if not sections:
+            raise APIError("大纲解析失败：未找到以 '## ' 开头的部分")
+        allocate_word_budget(sections, self.config.word_count)
+        logger.info(f"大纲生成完成: {len(sections)} 个部分")
+        return title, sections, result
+
+    def _section_max_tokens(self, word_count: int) -> Optional[int]:
+        # 未设置 max_tokens 时由各部分的生成器按部分字数自动计算
+        if self.config.max_tokens is None:
+            return None
+        return min(self.config.max_tokens, max(2048, word_count * 2))
+
+    def generate(self, on_section: Optional[Callable[[int, OutlineSection], None]] = None) -> GenerationResult:
+        """
+        生成长文
+
+        Args:
+            on_section: 每个部分完成时的回调 (序号, 部分)
+
+        Returns:
+            GenerationResult: 拼接后的完整结果（token为各次调用之和）
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        start_time = time.time()
+        title, sections, outline_result = self.generate_outline()
+
+        def run(index: int) -> GenerationResult:
+            section = sections[index]
+            generator = self._create(
+                word_count=section.word_count,
+                max_tokens=self._section_max_tokens(section.word_count)
+            )
+            result = generator.generate(self.build_section_prompt(title, sections, index))
+            if on_section:
+                on_section(index, section)
+            return result
+
+        workers = max(1, min(self.max_workers, len(sections)))
+        parts = [f"# {title}"] if title else []
+        results: List[GenerationResult] = []
+        written = 0
+        for sink in self.sinks:
+            sink.open()
+        try:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="section") as executor:
+                # map 按部分顺序返回结果：前面的部分完成后才写出后面的部分
+                for result in executor.map(run, range(len(sections))):
+                    results.append(result)
+                    parts.append(result.content.strip())
+                    text = ("\n\n" if written else "") + "\n\n".join(parts[written:])
+                    written = len(parts)
+                    for sink in self.sinks:
+                        sink.write(text)
+            for sink in self.sinks:
+                sink.write("\n")
+        finally:
+            for sink in self.sinks:
+                sink.close()
+        content = "\n\n".join(parts) + "\n"
+
+        all_results = [outline_result] + results
+        combined = GenerationResult(
+            content=content,
+            platform=outline_result.platform,
+            model=outline_result.model,
+            tokens_used=sum(r.tokens_used for r in all_results if not r.cached),
+            duration_seconds=time.time() - start_time,
+            truncated=any(r.truncated for r in results),
+            input_tokens=sum(r.input_tokens for r in all_results if not r.cached),
+            output_tokens=sum(r.output_tokens for r in all_results if not r.cached),
+            cache_read_tokens=sum(r.cache_read_tokens for r in all_results if not r.cached),
+            cache_write_tokens=sum(r.cache_write_tokens for r in all_results if not r.cached),
+            cached=all(r.cached for r in all_results),
+            continuations=sum(r.continuations for r in all_results)
+        )
+        record_word_count(combined, self.config.word_count)
+        combined.timings = replace(
+            outline_result.timings,
+            ttft=None,
+            rate_limit_wait=sum(r.timings.rate_limit_wait for r in all_results),
+            retries=sum(r.timings.retries for r in all_results)
+        )
+        combined.timings.finish_api(combined.duration_seconds, combined.output_tokens)
+        logger.info(
+            f"长文生成完成: {len(sections)} 个部分，{len(content)}字，"
+            f"耗时 {combined.duration_seconds:.2f}秒"
+        )
+        return combined
+
+
+# ============================================================================
+# 内容矩阵（一鱼多吃：一篇母版，多平台改编）
+# ============================================================================
+
+# 平台 -> (改编形式, 默认字数)，参考Skill中的"平台内容适配表"
+MATRIX_FORMATS: Dict[str, tuple] = {
+    '抖音': ('短视频口播脚本', 300),
+    '快手': ('短视频口播脚本', 300),
+    '视频号': ('短视频口播脚本', 600),
+    'B站': ('长视频脚本（按章节组织）', 2500),
+    'YouTube': ('长视频脚本（按章节组织）', 2500),
+    '小红书': ('图文笔记', 800),
+    '知乎': ('长文回答', 3000),
+    '公众号': ('公众号长文', 3000),
+}
+
+DEFAULT_MATRIX_PLATFORMS = ('抖音', '小红书', 'B站', '知乎')
+
+
+def parse_matrix_spec(spec: Optional[str]) -> Dict[str, int]:
+    """
+    解析内容矩阵的目标平台
+
+    "抖音,小红书" 使用各平台默认字数；"抖音,小红书=1200" 可单独指定字数。
+    为空时使用 DEFAULT_MATRIX_PLATFORMS。
+
+    Raises:
+        ValidationError: 当平台不支持或字数无效时
+    """
+    if not spec:
+        return {platform: MATRIX_FORMATS[platform][1] for platform in DEFAULT_MATRIX_PLATFORMS}
+    targets: Dict[str, int] = {}
+    for part in spec.split(','):
+        name, _, words = part.partition('=')
+        name = name.strip()
+        if name not in MATRIX_FORMATS:
+            raise ValidationError(f"不支持的矩阵平台: {name}，支持的平台: {list(MATRIX_FORMATS.keys())}")
+        try:
+            targets[name] = int(words) if words.strip() else MATRIX_FORMATS[name][1]
+        except ValueError:
+            raise ValidationError(f"无效的矩阵字数: {part}")
+        if targets[name] < 1:
+            raise ValidationError(f"矩阵字数必须大于0: {part}")
+    return targets
+
+
+def matrix_output_path(master_path: str, target: str) -> str:
+    """平台版本的输出路径：与母版同目录，文件名加平台后缀"""
+    path = Path(master_path)
+    return str(path.with_name(f"{path.stem}_{target}{path.suffix or '.md'}"))
+
+
+@dataclass
+class MatrixResult:
+    """内容矩阵生成结果"""
+    master: GenerationResult
+    variants: Dict[str, GenerationResult] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+    duration_seconds: float = 0.0
+
+    @property
+    def tokens_used(self) -> int:
+        """母版与各平台版本的总token用量（不含缓存命中）"""
+        results = [self.master, *self.variants.values()]
+        return sum(r.tokens_used for r in results if not r.cached)
+
+
+class MatrixGenerator:
+    """
+    内容矩阵生成器：生成一篇母版文章，再并发改编为各平台版本
+
+    对应Skill中"多平台内容矩阵"的一鱼多吃策略。改编请求的系统提示词只包含
+    目标平台的指南（不含完整Skill），输入为母版正文、输出较短，
+    总成本与耗时约等于一次完整生成加一轮并发的短调用。
+    """
+
+    def __init__(
+        self,
+        config: GenerationConfig,
+        targets: Dict[str, int],
+        pool: Optional[ClientPool] = None,
+        max_workers: int = DEFAULT_SECTION_WORKERS,
+        long_form: bool = False
+    ):
+        self.config = config
+        self.targets = targets
+        self.pool = pool
+        self.max_workers = max_workers
+        self.long_form = long_form
+
+    def generate_master(self) -> GenerationResult:
+        """生成母版文章（long_form 时先大纲后分段）"""
+        if self.long_form:
+            return LongFormGenerator(self.config, self.pool, self.max_workers).generate()
+        return create_generator(replace(self.config, stream=False), self.pool).generate()
+
+    def build_adaptation_prompt(self, master: str, target: str) -> str:
+        """构建改编提示词"""
+        form = MATRIX_FORMATS[target][0]
+        word_count = self.targets[target]
+        return f"""请把下面的母版文章改编为适合{target}发布的{form}，目标字数：{word_count}字。
+
+要求：
+1. 保留母版的核心观点与关键论据，不要编造母版中没有的事实或数据
+2. 按照{target}平台的特点重新设计标题、开头钩子与结构
+3. 字数控制在{word_count}字左右
+4. 只输出改编后的内容，不要解释改编过程
+
+【母版】
+{master.strip()}"""
+
+    def adapt(self, master: str, target: str) -> GenerationResult:
+        """把母版改编为一个平台的版本"""
+        generator = create_generator(
+            replace(
+                self.config,
+                stream=False,
+                target_platform=target,
+                adaptation=True,
+                full_skill=False,
+                word_count=self.targets[target],
+                max_tokens=None
+            ),
+            self.pool
+        )
+        return generator.generate(self.build_adaptation_prompt(master, target))
+
+    def generate(
+        self,
+        on_master: Optional[Callable[[GenerationResult], None]] = None,
+        on_variant: Optional[Callable[[str, Optional[GenerationResult], Optional[str]], None]] = None
+    ) -> MatrixResult:
+        """
+        生成内容矩阵
+
+        某个平台改编失败不影响母版和其他平台，错误记录在 MatrixResult.errors 中。
+
+        Args:
+            on_master: 母版完成时的回调
+            on_variant: 每个平台完成时的回调 (平台, 结果, 错误信息)
+
+        Returns:
+            MatrixResult: 母版与各平台版本
+        """
+        from concurrent.futures import ThreadPoolExecutor
+        start_time = time.time()
+        master = self.generate_master()
+        if on_master:
+            on_master(master)
+        matrix = MatrixResult(master=master)
+
+        def run(target: str) -> None:
+            try:
+                variant = self.adapt(master.content, target)
+            except ViralContentError as e:
+                matrix.errors[target] = str(e)
+                logger.warning(f"{target} 改编失败: {e}")
+                if on_variant:
+                    on_variant(target, None, str(e))
+                return
+            matrix.variants[target] = variant
+            if on_variant:
+                on_variant(target, variant, None)
+
+        workers = max(1, min(self.max_workers, len(self.targets)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="matrix") as executor:
+            list(executor.map(run, self.targets))
+
+        matrix.duration_seconds = time.time() - start_time
+        logger.info(
+            f"内容矩阵完成: 母版 {len(master.content)}字，{len(matrix.variants)}/{len(self.targets)} 个平台，"
+            f"耗时 {matrix.duration_seconds:.2f}秒"
+        )
+        return matrix
+
+
+# ============================================================================
+# 对冲请求（跨平台降低尾延迟）
+# ============================================================================
+
+class LatencyTracker:
+    """记录各平台最近的首token延迟，用于推算对冲等待时间"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, "deque[float]"] = {}
+        self._lock = threading.Lock()
+
+    def record(self, platform: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(platform, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, platform: str, q: float) -> Optional[float]:
+        """返回第 q 百分位延迟，样本不足时返回None"""
+        with self._lock:
+            samples = sorted(self._samples.get(platform, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * q / 100))]
+
+
+# 全局首token延迟记录
+ttft_tracker = LatencyTracker()
+
+
+def parse_platform_spec(spec: str) -> tuple:
+    """
+    解析 "平台[:模型]" 形式的参数
+
+    Raises:
+        ValidationError: 当平台不支持时
+    """
+    platform, _, model = spec.partition(':')
+    platform = platform.strip()
+    if platform not in SUPPORTED_PLATFORMS:
+        raise ValidationError(f"不支持的平台: {platform}，支持的平台: {SUPPORTED_PLATFORMS}")
+    return platform, model.strip() or None
+
+
+async def agenerate_hedged(
+    primary: GenerationConfig,
+    backup: GenerationConfig,
+    hedge_delay: Optional[float] = None,
+    pool: Optional[ClientPool] = None,
+    sinks: Optional[List[StreamSink]] = None
+) -> GenerationResult:
+    """
+    对冲生成
+
+    先向主平台发起请求；若 hedge_delay 秒内没有收到首个token（或主请求已失败），
+    再向备用平台发起同样的请求，取先完成的结果并取消另一个。
+
+    两个请求都以流式执行（用于判断首token）。sinks 由先输出文本的请求占用并实时写入；
+    若最终胜出的是另一个请求，则用胜出结果重写一遍 sinks。
+
+    Args:
+        primary: 主平台配置
+        backup: 备用平台配置
+        hedge_delay: 对冲等待秒数（默认取主平台首token延迟的p95，样本不足时用 DEFAULT_HEDGE_DELAY）
+        pool: 客户端池
+        sinks: 流式输出目标（为None时不输出）
+
+    Returns:
+        GenerationResult: 先完成的结果
+
+    Raises:
+        APIError: 当两个平台都失败时
+    """
+    import asyncio
+    if hedge_delay is None:
+        hedge_delay = ttft_tracker.percentile(primary.platform, 95) or DEFAULT_HEDGE_DELAY
+
+    sinks = sinks or []
+    # 占用 sinks 的请求（先输出文本者）；所有回调都在事件循环线程中执行，无需加锁
+    claim: Dict[str, Optional[str]] = {}
+    labels: Dict[Any, str] = {}
+
+    def start(label: str, config: GenerationConfig) -> tuple:
+        """发起请求，返回 (任务, 首token事件)"""
+        racer = RacerSink(label, config.platform, sinks, claim)
+        generator = create_generator(replace(config, stream=True), pool)
+        generator.add_sink(racer)
+        task = asyncio.ensure_future(generator.agenerate())
+        labels[task] = label
+        return task, racer.first_token
+
+    async def finish(task: Any, others: set) -> GenerationResult:
+        """
+        取消其余请求并等待其结束（其 RacerSink 随之关闭占用的 sinks），
+        胜出的请求未占用 sinks 时再用其完整结果重写 sinks
+        """
+        for other in others:
+            other.cancel()
+        if others:
+            await asyncio.gather(*others, return_exceptions=True)
+        result = task.result()
+        if sinks and claim.get('owner') != labels[task]:
+            if claim.get('owner') is not None:
+                logger.info("已输出的部分来自被取消的请求，改为输出胜出结果")
+            for sink in sinks:
+                sink.open()
+                sink.write(result.content)
+                sink.close()
+        return result
+
+    def failure(task: Any) -> Optional[BaseException]:
+        """已结束任务的异常；被取消的任务调用 exception() 会抛出 CancelledError"""
+        if task.cancelled():
+            return APIError(f"{labels[task]} 请求已取消")
+        return task.exception()
+
+    primary_task, primary_first_token = start('primary', primary)
+    token_wait = asyncio.ensure_future(primary_first_token.wait())
+    await asyncio.wait({primary_task, token_wait}, timeout=hedge_delay,
+                       return_when=asyncio.FIRST_COMPLETED)
+    token_wait.cancel()
+
+    primary_ok = primary_task.done() and failure(primary_task) is None
+    if primary_ok or (not primary_task.done() and primary_first_token.is_set()):
+        await asyncio.wait({primary_task})
+        return await finish(primary_task, set())
+
+    logger.warning(
+        f"{primary.platform} 在 {hedge_delay:.1f}秒内无响应，"
+        f"启动对冲请求: {backup.platform}"
+    )
+    backup_task, _ = start('backup', backup)
+    pending = {primary_task, backup_task} if not primary_task.done() else {backup_task}
+    errors: List[BaseException] = [failure(primary_task)] if primary_task.done() else []
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = failure(task)
+                if error is None:
+                    result = await finish(task, pending)
+                    logger.info(f"对冲请求由 {result.platform} 胜出")
+                    return result
+                errors.append(error)
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    raise APIError(f"主平台与备用平台均失败: {'; '.join(str(e) for e in errors)}")
+
+
+def generate_hedged(
+    primary: GenerationConfig,
+    backup: GenerationConfig,
+    hedge_delay: Optional[float] = None,
+    pool: Optional[ClientPool] = None,
+    sinks: Optional[List[StreamSink]] = None
+) -> GenerationResult:
+    """同步版本的 agenerate_hedged"""
+    import asyncio
+    return asyncio.run(agenerate_hedged(primary, backup, hedge_delay, pool, sinks))
+
+
+# ============================================================================
+# 自适应路由（按延迟、错误率与成本权重选择平台/模型）
+# ============================================================================
+
+@dataclass
+class Backend:
+    """路由候选：平台、模型与成本权重（权重越大越少被选中）"""
+    platform: str
+    model: Optional[str] = None
+    cost: float = 1.0
+
+    @property
+    def key(self) -> str:
+        return f"{self.platform}:{self.model or GENERATOR_MAP[self.platform].DEFAULT_MODEL}"
+
+
+@dataclass
+class BackendStats:
+    """候选的滚动统计（EWMA）"""
+    seconds_per_kword: Optional[float] = None
+    ttft: Optional[float] = None
+    error_rate: float = 0.0
+    samples: int = 0
+    updated: float = 0.0
+
+
+def parse_route_spec(spec: str) -> List[Backend]:
+    """
+    解析 "openai:gpt-4o=1,claude=1.5,gemini" 形式的路由候选（=后为成本权重，默认1）
+
+    Raises:
+        ValidationError: 当平台不支持或权重无效时
+    """
+    backends = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        target, _, cost = item.partition('=')
+        platform, model = parse_platform_spec(target)
+        try:
+            weight = float(cost) if cost.strip() else 1.0
+        except ValueError:
+            raise ValidationError(f"无效的成本权重: {item}")
+        if weight <= 0:
+            raise ValidationError(f"成本权重必须大于0: {item}")
+        backends.append(Backend(platform, model, weight))
+    if not backends:
+        raise ValidationError("路由候选为空，格式如: openai,claude=1.5,gemini:gemini-2.0-flash")
+    return backends
+
+
+class RouterStats:
+    """
+    各候选的滚动统计（SQLite持久化，跨进程共享）
+
+    每次调用后按 EWMA 更新每千字耗时、首token延迟与错误率；
+    错误率按距上次更新的时间以 ROUTER_ERROR_HALF_LIFE 为半衰期衰减，
+    故障平台在一段时间后会被重新尝试。
+    """
+
+    def __init__(self, path: Optional[str] = None, alpha: float = DEFAULT_ROUTER_ALPHA):
+        self.path = Path(path) if path else DEFAULT_ROUTER_STATS_PATH
+        self.alpha = alpha
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS backends (
+                key TEXT PRIMARY KEY,
+                seconds_per_kword REAL,
+                ttft REAL,
+                error_rate REAL NOT NULL DEFAULT 0,
+                samples INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL DEFAULT 0
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _ewma(self, old: Optional[float], value: Optional[float]) -> Optional[float]:
+        if value is None:
+            return old
+        if old is None:
+            return value
+        return self.alpha * value + (1 - self.alpha) * old
+
+    def snapshot(self, keys: List[str]) -> Dict[str, BackendStats]:
+        """读取各候选的统计（错误率已按时间衰减），没有记录的候选为空统计"""
+        now = time.time()
+        stats = {key: BackendStats() for key in keys}
+        rows = self._connect().execute(
+            f"SELECT key, seconds_per_kword, ttft, error_rate, samples, updated FROM backends "
+            f"WHERE key IN ({', '.join('?' * len(keys))})",
+            keys
+        ).fetchall()
+        for key, seconds_per_kword, ttft, error_rate, samples, updated in rows:
+            decay = 0.5 ** (max(now - updated, 0.0) / ROUTER_ERROR_HALF_LIFE)
+            stats[key] = BackendStats(seconds_per_kword, ttft, error_rate * decay, samples, updated)
+        return stats
+
+    def record(
+        self,
+        key: str,
+        ok: bool,
+        seconds_per_kword: Optional[float] = None,
+        ttft: Optional[float] = None
+    ) -> None:
+        """记录一次调用结果（失败时只更新错误率）"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT seconds_per_kword, ttft, error_rate, samples, updated FROM backends WHERE key = ?",
+                (key,)
+            ).fetchone()
+            old = BackendStats(*row) if row else BackendStats(updated=now)
+            decay = 0.5 ** (max(now - old.updated, 0.0) / ROUTER_ERROR_HALF_LIFE)
+            conn.execute(
+                "INSERT OR REPLACE INTO backends(key, seconds_per_kword, ttft, error_rate, samples, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    self._ewma(old.seconds_per_kword, seconds_per_kword if ok else None),
+                    self._ewma(old.ttft, ttft if ok else None),
+                    self._ewma(old.error_rate * decay, 0.0 if ok else 1.0),
+                    old.samples + 1,
+                    now,
+                )
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def route_score(backend: Backend, stats: BackendStats, config: GenerationConfig) -> float:
+    """
+    候选的路由得分（越小越好），没有统计时为0
+
+    预计耗时 = 每千字耗时 × 目标千字数（流式时加上首token延迟），再乘以成本权重并除以成功率的平方
+    （失败既浪费一次调用，也往往预示平台正在变差）。
+    """
+    if stats.seconds_per_kword is None:
+        return 0.0
+    seconds = stats.seconds_per_kword * max(config.word_count, MIN_WORD_COUNT) / 1000
+    if config.stream and stats.ttft is not None:
+        seconds += stats.ttft
+    return seconds * backend.cost / max(1.0 - stats.error_rate, 0.05) ** 2
+
+
+def route_report(backends: List[Backend], stats: RouterStats) -> List[Dict[str, Any]]:
+    """各候选的当前统计（按以默认目标字数估算的路由得分排序）"""
+    snapshot = stats.snapshot([backend.key for backend in backends])
+    probe = GenerationConfig(topic='')
+    rows = []
+    for backend in backends:
+        current = snapshot[backend.key]
+        rows.append({
+            'backend': backend.key,
+            'cost': backend.cost,
+            'samples': current.samples,
+            'seconds_per_kword': current.seconds_per_kword,
+            'ttft': current.ttft,
+            'error_rate': current.error_rate,
+            'available': get_circuit_breaker(backend.platform).available(),
+            'score': route_score(backend, current, probe),
+        })
+    return sorted(rows, key=lambda row: row['score'])
+
+
+class AdaptiveRouter:
+    """
+    自适应路由
+
+    每个任务发往路由得分（见 route_score）最小的候选，得分相同时选择进行中任务较少的平台；
+    没有统计的候选优先尝试；以 explore 的概率随机选择，使统计保持更新。
+    熔断中的平台与已达到并发上限的平台不参与选择。
+    调用失败（且尚未输出内容）时记录错误并自动切换到下一个候选。
+    """
+
+    def __init__(
+        self,
+        backends: List[Backend],
+        api_keys: Dict[str, Optional[str]],
+        stats: Optional[RouterStats] = None,
+        capacity: Optional[Dict[str, int]] = None,
+        explore: float = DEFAULT_ROUTER_EXPLORE,
+        pool: Optional[ClientPool] = None
+    ):
+        self.backends = [backend for backend in backends if api_keys.get(backend.platform)]
+        missing = sorted({b.platform for b in backends} - {b.platform for b in self.backends})
+        if missing:
+            logger.warning(f"路由候选缺少API Key，已忽略: {', '.join(missing)}")
+        if not self.backends:
+            raise ValidationError("路由候选均缺少API Key")
+        self.api_keys = api_keys
+        self.stats = stats or RouterStats()
+        self.capacity = capacity or {}
+        self.explore = explore
+        self.pool = pool
+        self._in_flight: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def platforms(self) -> List[str]:
+        """候选涉及的平台"""
+        return sorted({backend.platform for backend in self.backends})
+
+    def _acquire(self, config: GenerationConfig, exclude: set) -> Optional[Backend]:
+        """选择候选并占用一个并发名额，没有可用候选时返回None"""
+        snapshot = self.stats.snapshot([backend.key for backend in self.backends])
+        with self._lock:
+            candidates = [
+                backend for backend in self.backends
+                if backend.key not in exclude
+                and get_circuit_breaker(backend.platform).available()
+                and self._in_flight.get(backend.platform, 0) < self.capacity.get(backend.platform, 1 << 30)
+            ]
+            if not candidates:
+                return None
+            if len(candidates) > 1 and random.random() < self.explore:
+                backend = random.choice(candidates)
+            else:
+                backend = min(candidates, key=lambda b: (
+                    route_score(b, snapshot[b.key], config), self._in_flight.get(b.platform, 0)
+                ))
+            self._in_flight[backend.platform] = self._in_flight.get(backend.platform, 0) + 1
+            return backend
+
+    def _release(self, backend: Backend) -> None:
+        with self._lock:
+            self._in_flight[backend.platform] -= 1
+
+    def generate(self, config: GenerationConfig, sinks: Optional[List[StreamSink]] = None) -> GenerationResult:
+        """
+        按路由选择候选生成
+
+        Args:
+            config: 生成配置（platform、model、api_key 由路由决定）
+            sinks: 流式输出目标
+
+        Returns:
+            GenerationResult: 生成结果
+
+        Raises:
+            APIError: 所有可用候选均失败时
+            ValidationError: 参数错误（不会切换候选）
+        """
+        tried: set = set()
+        errors: List[str] = []
+        while True:
+            backend = self._acquire(config, tried)
+            if backend is None:
+                if not errors:
+                    raise CircuitOpenError("所有路由候选均在熔断中或已达到并发上限")
+                raise APIError(f"所有路由候选均失败: {'; '.join(errors)}")
+            tried.add(backend.key)
+            routed = replace(
+                config, platform=backend.platform, model=backend.model,
+                api_key=self.api_keys[backend.platform]
+            )
+            output_started = threading.Event()
+            try:
+                generator = create_generator(routed, self.pool)
+                generator.add_sink(CallbackSink(lambda _: output_started.set()))
+                for sink in sinks or ():
+                    generator.add_sink(sink)
+                logger.info(f"路由到 {backend.key}")
+                result = generator.generate()
+            except (ValidationError, ConfigError, SkillLoadError):
+                raise
+            except ViralContentError as e:
+                if not isinstance(e, CircuitOpenError):
+                    self.stats.record(backend.key, ok=False)
+                if output_started.is_set():
+                    raise
+                logger.warning(f"{backend.key} 调用失败，切换候选: {e}")
+                errors.append(f"{backend.key}: {e}")
+                continue
+            finally:
+                self._release(backend)
+            if not result.cached:
+                words = result.word_count or count_words(result.content)
+                self.stats.record(
+                    backend.key, ok=True,
+                    seconds_per_kword=result.duration_seconds * 1000 / max(words, 1),
+                    ttft=result.timings.ttft
+                )
+            return result
+
+
+# ============================================================================
+# 参数验证
+# ============================================================================
+
+def validate_parameters(
+    topic: str,
+    style: str,
+    word_count: int,
+    platform: str,
+    max_tokens: Optional[int] = None
+) -> None:
+    """
+    验证输入参数
+
+    Args:
+        topic: 文章主题
+        style: 写作风格
+        word_count: 目标字数
+        platform: AI平台
+        max_tokens: 单次请求最大输出token数（None 表示自动计算）
+
+    Raises:
+        ValidationError: 当参数无效时
+    """
+    # 验证主题
+    if not topic or len(topic.strip()) == 0:
+        raise ValidationError("主题不能为空")
+    if len(topic) > 200:
+        raise ValidationError("主题长度不能超过200字符")
+
+    # 验证风格
+    if style not in SUPPORTED_STYLES:
+        logger.warning(f"使用自定义风格: {style}")
+
+    # 验证字数
+    if not isinstance(word_count, int):
+        raise ValidationError("字数必须是整数")
+    if word_count < MIN_WORD_COUNT:
+        raise ValidationError(f"字数不能少于{MIN_WORD_COUNT}")
+    if word_count > MAX_WORD_COUNT:
+        raise ValidationError(f"字数不能超过{MAX_WORD_COUNT}")
+
+    # 验证单次输出上限
+    if max_tokens is not None and (not isinstance(max_tokens, int) or max_tokens <= 0):
+        raise ValidationError(f"max_tokens 必须是正整数: {max_tokens}")
+
+    # 验证平台
+    if platform not in SUPPORTED_PLATFORMS:
+        raise ValidationError(f"不支持的平台: {platform}，支持的平台: {SUPPORTED_PLATFORMS}")
+
+    logger.info(
+        f"参数验证通过: topic={topic[:20]}..., "
+        f"style={style}, words={word_count}, platform={platform}"
+    )
+
+
+# ============================================================================
+# 内容保存
+# ============================================================================
+
+def safe_filename(topic: str) -> str:
+    """将主题转换为安全的文件名片段"""
+    return "".join(c for c in topic if c.isalnum() or c in (' ', '-', '_'))[:30]
+
+
+def default_output_path(topic: str) -> Path:
+    """按主题和时间戳自动生成输出文件名"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return Path(f"{safe_filename(topic)}_{timestamp}.md")
+
+
+def save_output(
+    content: str,
+    output_path: Optional[str] = None,
+    topic: str = "article",
+    metadata: Optional[Dict[str, Any]] = None
+) -> str:
+    """
+    保存生成的内容
+
+    Args:
+        content: 生成的内容
+        output_path: 输出文件路径（可选）
+        topic: 文章主题（用于自动命名）
+        metadata: 写入头部的其他元数据（可覆盖生成时间）
+
+    Returns:
+        str: 保存的文件路径
+    """
+    try:
+        file_path = Path(output_path) if output_path else default_output_path(topic)
+
+        # 确保目录存在
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+
+        # 添加元数据头部
+        header = {
+            '生成时间': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            **(metadata or {}),
+            '工具': '爆款内容生成器 v3.1',
+        }
+        lines = ''.join(f"{key}: {value}\n" for key, value in header.items() if value is not None)
+        full_content = f"---\n{lines}---\n\n" + content
+
+        # 先写临时文件再替换，进程中断时不会留下写了一半的文件
+        tmp_path = file_path.with_name(f".{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(full_content)
+        os.replace(tmp_path, file_path)
+
+        logger.info(f"内容已保存到: {file_path.absolute()}")
+        return str(file_path.absolute())
+
+    except Exception as e:
+        logger.error(f"保存文件失败: {e}")
+        raise
+
+
+# ============================================================================
+# 文章库（SQLite + FTS5全文索引，正文压缩存储）
+# ============================================================================
+
+# 文章库中不保存的配置字段
+ARTICLE_SECRET_FIELDS = ('api_key',)
+
+# 导入Markdown时识别的头部字段
+_FRONT_MATTER_FIELDS = {'主题': 'topic', '风格': 'style', '平台': 'platform', '模型': 'model'}
+_FRONT_MATTER_RE = re.compile(r'\A---\n(.*?)\n---\n\n?', re.S)
+_TIMESTAMP_SUFFIX_RE = re.compile(r'_\d{8}_\d{6}$')
+
+
+@dataclass
+class StoredArticle:
+    """文章库中的一篇文章（content 只在按ID读取时加载）"""
+    id: int
+    topic: str
+    style: Optional[str]
+    platform: Optional[str]
+    model: Optional[str]
+    created: float
+    words: int = 0
+    tokens_used: int = 0
+    duration_seconds: float = 0.0
+    source: Optional[str] = None
+    score: Optional[float] = None
+    config: Dict[str, Any] = field(default_factory=dict)
+    result: Dict[str, Any] = field(default_factory=dict)
+    content: Optional[str] = None
+
+    @property
+    def created_text(self) -> str:
+        return datetime.fromtimestamp(self.created).strftime("%Y-%m-%d %H:%M:%S")
+
+    def front_matter(self) -> Dict[str, Any]:
+        """导出Markdown时写入头部的元数据"""
+        return {
+            '生成时间': self.created_text,
+            '主题': self.topic,
+            '风格': self.style,
+            '平台': self.platform,
+            '模型': self.model,
+            '字数': self.words or None,
+            'Token': self.tokens_used or None,
+            '耗时': f"{self.duration_seconds:.2f}秒" if self.duration_seconds else None,
+            '结构评分': f"{self.score:.1f}/30" if self.score is not None else None,
+        }
+
+
+def parse_date(value: str) -> float:
+    """解析 YYYY-MM-DD 或 YYYY-MM-DD HH:MM[:SS]，返回时间戳"""
+    for fmt in ("%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(value.strip(), fmt).timestamp()
+        except ValueError:
+            continue
+    raise ValidationError(f"无效的日期: {value}，格式为 YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS")
+
+
+class ArticleStore:
+    """
+    文章库
+
+    正文以zlib压缩后存入SQLite，同时保存完整的生成配置（不含API Key）与生成结果元数据；
+    主题、风格、平台、时间有索引，正文与主题写入FTS5全文索引（trigram分词，中文可按子串检索）。
+    全文索引为无内容表（content=''），不重复保存未压缩的正文。
+    SQLite未编译FTS5或trigram分词时退化为解压扫描。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else DEFAULT_ARTICLE_STORE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS articles (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                style TEXT,
+                platform TEXT,
+                model TEXT,
+                target_platform TEXT,
+                word_count INTEGER,
+                words INTEGER NOT NULL DEFAULT 0,
+                tokens_used INTEGER NOT NULL DEFAULT 0,
+                duration_seconds REAL NOT NULL DEFAULT 0,
+                created REAL NOT NULL,
+                source TEXT,
+                score REAL,
+                config TEXT NOT NULL,
+                result TEXT NOT NULL,
+                body BLOB NOT NULL
+            )
+        """)
+        # 早期版本的文章库没有评分列
+        if 'score' not in {row[1] for row in conn.execute("PRAGMA table_info(articles)")}:
+            conn.execute("ALTER TABLE articles ADD COLUMN score REAL")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_score ON articles(score)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_created ON articles(created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_topic ON articles(topic)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_platform ON articles(platform, created)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_articles_style ON articles(style, created)")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_source ON articles(source)")
+        try:
+            conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts "
+                "USING fts5(topic, content, content='', tokenize='trigram')"
+            )
+            self.fts = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite不支持FTS5 trigram分词（{e}），全文检索将逐篇扫描")
+            self.fts = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def ref(self, article_id: int) -> str:
+        """文章的引用（文章库路径#ID），用于清单与任务库中的结果路径"""
+        return f"{self.path.absolute()}#{article_id}"
+
+    def _insert(
+        self,
+        topic: str,
+        content: str,
+        config: Dict[str, Any],
+        result: Dict[str, Any],
+        created: float,
+        source: Optional[str] = None
+    ) -> int:
+        import zlib
+        body = zlib.compress(content.encode('utf-8'), 6)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            article_id = conn.execute(
+                "INSERT INTO articles(topic, style, platform, model, target_platform, word_count, words, "
+                "tokens_used, duration_seconds, created, source, score, config, result, body) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    topic, config.get('style'), result.get('platform') or config.get('platform'),
+                    result.get('model') or config.get('model'), config.get('target_platform'),
+                    config.get('word_count'), result.get('word_count') or count_words(content),
+                    result.get('tokens_used', 0), result.get('duration_seconds', 0.0), created, source,
+                    (result.get('quality') or {}).get('total'),
+                    json.dumps(config, ensure_ascii=False), json.dumps(result, ensure_ascii=False), body,
+                )
+            ).lastrowid
+            if self.fts:
+                conn.execute(
+                    "INSERT INTO articles_fts(rowid, topic, content) VALUES (?, ?, ?)",
+                    (article_id, topic, content)
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return article_id
+
+    def add(self, config: GenerationConfig, result: GenerationResult) -> int:
+        """
+        保存一篇生成结果
+
+        Returns:
+            int: 文章ID
+        """
+        config_data = {k: v for k, v in asdict(config).items() if k not in ARTICLE_SECRET_FIELDS}
+        result_data = asdict(result)
+        content = result_data.pop('content')
+        article_id = self._insert(config.topic, content, config_data, result_data, time.time())
+        logger.info(f"内容已保存到文章库: {self.ref(article_id)}")
+        return article_id
+
+    def import_markdown(self, path: str) -> Optional[int]:
+        """
+        导入 save_output 写出的Markdown文件（已导入过的文件跳过）
+
+        头部中的生成时间、主题、风格、平台、模型会被保留；没有主题时由文件名推断。
+
+        Returns:
+            Optional[int]: 文章ID，文件已导入过时返回None
+        """
+        file_path = Path(path).absolute()
+        text = file_path.read_text(encoding='utf-8')
+        header: Dict[str, str] = {}
+        match = _FRONT_MATTER_RE.match(text)
+        if match:
+            for line in match.group(1).splitlines():
+                key, sep, value = line.partition(':')
+                if sep:
+                    header[key.strip()] = value.strip()
+            text = text[match.end():]
+        meta = {name: header[key] for key, name in _FRONT_MATTER_FIELDS.items() if header.get(key)}
+        topic = meta.pop('topic', None) or _TIMESTAMP_SUFFIX_RE.sub('', file_path.stem)
+        try:
+            created = parse_date(header['生成时间']) if '生成时间' in header else file_path.stat().st_mtime
+        except ValidationError:
+            created = file_path.stat().st_mtime
+        config = {'topic': topic, **{k: v for k, v in meta.items() if k != 'model'}}
+        if 'model' in meta:
+            config['model'] = meta['model']
+        result = {k: v for k, v in meta.items() if k in ('platform', 'model')}
+        result['quality'] = score_articles([(text, topic, 0)])[0]
+        try:
+            return self._insert(topic, text, config, result, created, source=str(file_path))
+        except sqlite3.IntegrityError:
+            return None
+
+    @staticmethod
+    def _row_to_article(row: tuple) -> StoredArticle:
+        (article_id, topic, style, platform, model, created, words, tokens_used,
+         duration_seconds, source, score, config, result) = row
+        return StoredArticle(
+            id=article_id, topic=topic, style=style, platform=platform, model=model,
+            created=created, words=words, tokens_used=tokens_used,
+            duration_seconds=duration_seconds, source=source, score=score,
+            config=json.loads(config), result=json.loads(result),
+        )
+
+    _COLUMNS = (
+        "id, topic, style, platform, model, created, words, tokens_used, "
+        "duration_seconds, source, score, config, result"
+    )
+
+    def get(self, article_id: int) -> StoredArticle:
+        """按ID读取文章（含正文）"""
+        import zlib
+        row = self._connect().execute(
+            f"SELECT {self._COLUMNS}, body FROM articles WHERE id = ?", (article_id,)
+        ).fetchone()
+        if row is None:
+            raise ValidationError(f"文章库中没有ID为 {article_id} 的文章: {self.path}")
+        article = self._row_to_article(row[:-1])
+        article.content = zlib.decompress(row[-1]).decode('utf-8')
+        return article
+
+    def query(
+        self,
+        text: Optional[str] = None,
+        topic: Optional[str] = None,
+        style: Optional[str] = None,
+        platform: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        min_score: Optional[float] = None,
+        sort: str = 'created',
+        limit: int = 20
+    ) -> List[StoredArticle]:
+        """
+        查询文章（不含正文）
+
+        Args:
+            text: 全文检索词（空格分隔的多个词需同时出现，匹配主题或正文）
+            topic: 主题包含的文字
+            style: 写作风格
+            platform: AI平台
+            since: 起始时间戳（含）
+            until: 结束时间戳（不含）
+            min_score: 最低结构评分（0-30）
+            sort: 排序方式，created 按生成时间倒序，score 按结构评分倒序
+            limit: 最多返回条数
+
+        Returns:
+            List[StoredArticle]: 匹配的文章
+        """
+        import zlib
+        conditions: List[str] = []
+        params: List[Any] = []
+        for column, value in (('style', style), ('platform', platform)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        if topic:
+            conditions.append("topic LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', topic) + '%')
+        if since is not None:
+            conditions.append("created >= ?")
+            params.append(since)
+        if until is not None:
+            conditions.append("created < ?")
+            params.append(until)
+        if min_score is not None:
+            conditions.append("score >= ?")
+            params.append(min_score)
+        if sort not in ('created', 'score'):
+            raise ValidationError(f"无效的排序方式: {sort}，可选: created, score")
+
+        # trigram 索引只能检索3个字符以上的词，更短的词在候选结果上逐篇检查
+        terms = text.split() if text else []
+        indexed = [term for term in terms if self.fts and len(term) >= 3]
+        scanned = [term.lower() for term in terms if term not in indexed]
+        if indexed:
+            conditions.append("id IN (SELECT rowid FROM articles_fts WHERE articles_fts MATCH ?)")
+            params.append(' AND '.join('"' + term.replace('"', '""') + '"' for term in indexed))
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = "score IS NULL, score DESC, created DESC" if sort == 'score' else "created DESC"
+        sql = f"SELECT {self._COLUMNS}{', body' if scanned else ''} FROM articles {where} ORDER BY {order}"
+        if not scanned:
+            sql += " LIMIT ?"
+            params.append(limit)
+
+        articles = []
+        for row in self._connect().execute(sql, params):
+            if scanned:
+                haystack = (row[1] + '\n' + zlib.decompress(row[-1]).decode('utf-8')).lower()
+                if not all(term in haystack for term in scanned):
+                    continue
+                row = row[:-1]
+            articles.append(self._row_to_article(row))
+            if len(articles) >= limit:
+                break
+        return articles
+
+    def rescore(self, batch_size: int = 1000, on_batch: Optional[Callable[[int], None]] = None) -> int:
+        """
+        重新计算全部文章的结构评分（每批解压后用 score_articles 批量计算，一个事务写回）
+
+        Args:
+            batch_size: 每批文章数
+            on_batch: 每批完成后的回调，参数为累计篇数
+
+        Returns:
+            int: 评分的文章数
+        """
+        import zlib
+        conn = self._connect()
+        done = 0
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                "SELECT id, topic, word_count, body FROM articles WHERE id > ? ORDER BY id LIMIT ?",
+                (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return done
+            scores = score_articles([
+                (zlib.decompress(body).decode('utf-8'), topic, word_count or 0)
+                for _, topic, word_count, body in rows
+            ])
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE articles SET score = ?, result = json_set(result, '$.quality', json(?)) WHERE id = ?",
+                    [(score['total'], json.dumps(score), row[0]) for row, score in zip(rows, scores)]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            done += len(rows)
+            last_id = rows[-1][0]
+            if on_batch:
+                on_batch(done)
+
+    def export(self, article_id: int, output_path: Optional[str] = None) -> str:
+        """
+        导出为Markdown（头部包含主题、平台、模型、用量等元数据）
+
+        Returns:
+            str: 导出的文件路径
+        """
+        article = self.get(article_id)
+        path = output_path or str(
+            Path(f"{safe_filename(article.topic)}_{datetime.fromtimestamp(article.created):%Y%m%d_%H%M%S}.md")
+        )
+        return save_output(article.content, path, article.topic, metadata=article.front_matter())
+
+    def stats(self) -> Dict[str, Any]:
+        """文章数、压缩前后的正文大小与各平台文章数"""
+        conn = self._connect()
+        count, stored = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM articles"
+        ).fetchone()
+        platforms = dict(conn.execute(
+            "SELECT COALESCE(platform, '-'), COUNT(*) FROM articles GROUP BY platform ORDER BY COUNT(*) DESC"
+        ).fetchall())
+        return {
+            'path': str(self.path),
+            'articles': count,
+            'body_bytes': stored,
+            'file_bytes': self.path.stat().st_size if self.path.exists() else 0,
+            'platforms': platforms,
+        }
+
+
+_article_stores: Dict[str, ArticleStore] = {}
+_article_stores_lock = threading.Lock()
+
+
+def get_article_store(path: Optional[str] = None) -> ArticleStore:
+    """获取（进程内共享的）文章库实例"""
+    key = str(Path(path) if path else DEFAULT_ARTICLE_STORE_PATH)
+    with _article_stores_lock:
+        if key not in _article_stores:
+            _article_stores[key] = ArticleStore(key)
+        return _article_stores[key]
+
+
+# ============================================================================
+# 配置文件支持
+# ============================================================================
+
+def load_config() -> Dict[str, Any]:
+    """
+    加载配置文件
+
+    Returns:
+        Dict: 配置字典
+    """
+    if not CONFIG_PATH.exists():
+        return {}
+
+    try:
+        import yaml
+        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+        logger.info(f"已加载配置文件: {CONFIG_PATH}")
+        return config
+    except ImportError:
+        logger.warning("未安装pyyaml，跳过配置文件加载")
+        return {}
+    except Exception as e:
+        logger.warning(f"加载配置文件失败: {e}")
+        return {}
+
+
+def resolve_api_key(
+    platform: str,
+    api_key: Optional[str] = None,
+    config_file: Optional[Dict[str, Any]] = None
+) -> Optional[str]:
+    """
+    按优先级获取API Key：显式参数 > 配置文件 > 环境变量
+
+    Args:
+        platform: AI平台
+        api_key: 显式传入的API Key
+        config_file: 已加载的配置字典
+
+    Returns:
+        Optional[str]: API Key，找不到时返回None
+    """
+    if api_key:
+        return api_key
+    if config_file and config_file.get(f'{platform}_api_key'):
+        return config_file[f'{platform}_api_key']
+    env_var = API_KEY_ENV_VARS.get(platform)
+    return os.getenv(env_var) if env_var else None
+
+
+# ============================================================================
+# 耗时指标导出
+# ============================================================================
+
+def _prometheus_escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_prometheus_metrics(result: GenerationResult) -> str:
+    """把生成结果格式化为 Prometheus 文本格式"""
+    labels = (
+        f'platform="{_prometheus_escape(result.platform)}",'
+        f'model="{_prometheus_escape(result.model)}"'
+    )
+    timings = asdict(result.timings)
+    lines = [
+        "# HELP viral_generation_phase_seconds Duration of each phase of the last generation.",
+        "# TYPE viral_generation_phase_seconds gauge",
+    ]
+    for phase in ('config_load', 'skill_load', 'client_setup', 'rate_limit_wait', 'ttft', 'api', 'save'):
+        if timings[phase] is not None:
+            lines.append(f'viral_generation_phase_seconds{{{labels},phase="{phase}"}} {timings[phase]:.6f}')
+    gauges = [
+        ('viral_generation_tokens_per_second', 'Output tokens per second after the first token.',
+         timings['tokens_per_second']),
+        ('viral_generation_retries', 'Retries before the last generation succeeded.', timings['retries']),
+        ('viral_generation_output_tokens', 'Output tokens of the last generation.', result.output_tokens),
+        ('viral_generation_tokens', 'Total tokens of the last generation.', result.tokens_used),
+        ('viral_generation_words', 'Word count of the last generated article.', result.word_count),
+        ('viral_generation_word_deviation', 'Relative deviation of the word count from the target.',
+         result.word_deviation),
+        ('viral_generation_quality_score', 'Local HKR structure score of the last article (0-30).',
+         result.quality.get('total')),
+    ]
+    for name, help_text, value in gauges:
+        if value is None:
+            continue
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name}{{{labels}}} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def export_metrics(result: GenerationResult, path: str, topic: Optional[str] = None) -> None:
+    """
+    导出单次生成的耗时指标
+
+    以 .prom 结尾时写入 Prometheus textfile（每次写入唯一的临时文件后原子替换，
+    供 node_exporter 采集），否则以 O_APPEND 单次写入向文件追加一行 JSON，
+    多个进程同时导出时各行不会交错。
+
+    Args:
+        result: 生成结果
+        path: 指标文件路径
+        topic: 文章主题（仅写入JSON行）
+    """
+    metrics_path = Path(path)
+    metrics_path.parent.mkdir(parents=True, exist_ok=True)
+    if metrics_path.suffix == '.prom':
+        import tempfile
+        with tempfile.NamedTemporaryFile(
+            'w', encoding='utf-8', dir=metrics_path.parent,
+            prefix=f".{metrics_path.name}.", suffix='.tmp', delete=False
+        ) as f:
+            f.write(format_prometheus_metrics(result))
+        try:
+            # NamedTemporaryFile 创建的文件仅属主可读，node_exporter 需要读取权限
+            os.chmod(f.name, 0o644)
+            os.replace(f.name, metrics_path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+        return
+
+    record = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'topic': topic,
+        'platform': result.platform,
+        'model': result.model,
+        'tokens_used': result.tokens_used,
+        'output_tokens': result.output_tokens,
+        'cached': result.cached,
+        'continuations': result.continuations,
+        'word_count': result.word_count,
+        'word_deviation': result.word_deviation,
+        'stopped_early': result.stopped_early,
+        'quality': quality_summary(result.quality),
+        'timings': asdict(result.timings),
+    }
+    line = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+    fd = os.open(metrics_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class MetricsTarget:
+    """
+    各运行模式共用的指标导出目标
+
+    config_load 为本进程加载配置的耗时，只计入单次运行的结果；批量任务与常驻服务
+    在配置加载后处理多篇文章，各篇记为0。
+    """
+    path: Optional[str] = None
+    config_load: float = 0.0
+
+    def export(self, result: GenerationResult, topic: Optional[str] = None) -> None:
+        """记录配置加载耗时；设置了指标文件时导出"""
+        result.timings.config_load = self.config_load
+        if self.path:
+            export_metrics(result, self.path, topic)
+
+
+# ============================================================================
+# 相似度索引（近重复主题与文章检测）
+# ============================================================================
+
+# MinHash签名长度与LSH分段：16段 × 每段4个值，Jaccard相似度0.6时约89%的概率成为候选
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = MINHASH_PERMUTATIONS // LSH_BANDS
+# 主题按2字片段、文章按4字片段计算相似度
+TOPIC_SHINGLE_SIZE = 2
+ARTICLE_SHINGLE_SIZE = 4
+
+_NON_WORD_RE = re.compile(r'[\W_]+')
+
+
+def normalize_text(text: str) -> str:
+    """相似度比较前的归一化：转小写，去掉空白与标点"""
+    return _NON_WORD_RE.sub('', text.lower())
+
+
+def shingles(text: str, size: int) -> set:
+    """归一化后的字符n-gram集合（短于n的文本整体作为一个片段）"""
+    text = normalize_text(text)
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+# MinHash置换参数：h_i(x) = (a_i * x + b_i) mod p，p 为梅森素数 2^61-1，参数由固定种子生成以保证签名可持久化比较
+_MERSENNE_PRIME = (1 << 61) - 1
+_MINHASH_PERMUTATIONS = tuple(
+    (int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), 'little') % (_MERSENNE_PRIME - 1) + 1,
+     int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), 'little') % _MERSENNE_PRIME)
+    for i in range(MINHASH_PERMUTATIONS)
+)
+
+
+def minhash_signature(items: set) -> List[int]:
+    """
+    计算MinHash签名
+
+    每个片段先哈希为一个61位整数，再用 MINHASH_PERMUTATIONS 个线性置换分别取最小值；
+    两个签名中相同位置取值相等的比例即为Jaccard相似度的估计。
+
+    Returns:
+        List[int]: 签名；items 为空时返回空列表
+    """
+    if not items:
+        return []
+    hashes = [
+        int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'little') & _MERSENNE_PRIME
+        for item in items
+    ]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _MINHASH_PERMUTATIONS]
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """由两个签名估计Jaccard相似度"""
+    if not a or len(a) != len(b):
+        return 0.0
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+@dataclass
+class SimilarMatch:
+    """索引中最相似的条目"""
+    text: str
+    similarity: float
+    ref: Optional[str] = None
+
+
+class SimilarityIndex:
+    """
+    近重复检测索引（MinHash + LSH，SQLite持久化）
+
+    每个条目保存MinHash签名，并按LSH分段写入 (分段哈希 -> 条目) 表；
+    查询时只比较至少有一段完全相同的候选条目，耗时与已存条目总数基本无关。
+    条目按 kind（topic / article）与 scope 分开，不同类别互不匹配。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = Path(path) if path else DEFAULT_SIMILARITY_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS items (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                text TEXT NOT NULL,
+                ref TEXT,
+                signature BLOB NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_items_ref ON items(kind, ref)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS lsh (
+                key INTEGER NOT NULL,
+                item INTEGER NOT NULL,
+                PRIMARY KEY (key, item)
+            ) WITHOUT ROWID
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _band_keys(kind: str, scope: str, signature: List[int]) -> List[int]:
+        keys = []
+        for band in range(LSH_BANDS):
+            rows = signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+            digest = hashlib.blake2b(f"{kind}|{scope}|{band}|{rows}".encode('utf-8'), digest_size=7).digest()
+            keys.append(int.from_bytes(digest, 'little'))
+        return keys
+
+    @staticmethod
+    def _pack(signature: List[int]) -> bytes:
+        return b''.join(value.to_bytes(8, 'little') for value in signature)
+
+    @staticmethod
+    def _unpack(blob: bytes) -> List[int]:
+        return [int.from_bytes(blob[i:i + 8], 'little') for i in range(0, len(blob), 8)]
+
+    def _nearest(
+        self,
+        conn: sqlite3.Connection,
+        keys: List[int],
+        signature: List[int],
+        exclude_ref: Optional[str]
+    ) -> Optional[SimilarMatch]:
+        rows = conn.execute(
+            f"SELECT text, ref, signature FROM items WHERE id IN "
+            f"(SELECT item FROM lsh WHERE key IN ({', '.join('?' * len(keys))}))",
+            keys
+        ).fetchall()
+        best = None
+        for text, ref, blob in rows:
+            if exclude_ref is not None and ref == exclude_ref:
+                continue
+            similarity = estimate_similarity(signature, self._unpack(blob))
+            if best is None or similarity > best.similarity:
+                best = SimilarMatch(text=text, similarity=similarity, ref=ref)
+        return best
+
+    def _insert(
+        self,
+        conn: sqlite3.Connection,
+        kind: str,
+        scope: str,
+        text: str,
+        ref: Optional[str],
+        signature: List[int],
+        keys: List[int]
+    ) -> None:
+        if ref is not None:
+            self._delete(conn, kind, ref)
+        item = conn.execute(
+            "INSERT INTO items(kind, scope, text, ref, signature, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (kind, scope, text, ref, self._pack(signature), time.time())
+        ).lastrowid
+        conn.executemany("INSERT OR IGNORE INTO lsh(key, item) VALUES (?, ?)", [(key, item) for key in keys])
+
+    @staticmethod
+    def _delete(conn: sqlite3.Connection, kind: str, ref: str) -> None:
+        ids = [(row[0],) for row in conn.execute(
+            "SELECT id FROM items WHERE kind = ? AND ref = ?", (kind, ref)
+        )]
+        if ids:
+            conn.executemany("DELETE FROM lsh WHERE item = ?", ids)
+            conn.executemany("DELETE FROM items WHERE id = ?", ids)
+
+    def nearest(
+        self,
+        kind: str,
+        signature: List[int],
+        scope: str = '',
+        exclude_ref: Optional[str] = None
+    ) -> Optional[SimilarMatch]:
+        """查找同类别中最相似的条目（只比较LSH候选）"""
+        if not signature:
+            return None
+        keys = self._band_keys(kind, scope, signature)
+        return self._nearest(self._connect(), keys, signature, exclude_ref)
+
+    def check_and_add(
+        self,
+        kind: str,
+        text: str,
+        signature: List[int],
+        threshold: float,
+        scope: str = '',
+        ref: Optional[str] = None,
+        add_on_match: bool = True
+    ) -> Optional[SimilarMatch]:
+        """
+        原子地查找相似条目并登记当前条目
+
+        同一 ref 的旧条目会被替换，且不与自身比较（重跑同一任务不会被判为重复）。
+
+        Args:
+            kind: 类别（topic / article）
+            text: 条目文本（主题或文章标题，用于展示）
+            signature: MinHash签名
+            threshold: 相似度阈值
+            scope: 子类别（不同子类别互不匹配）
+            ref: 关联的文件路径等标识
+            add_on_match: 命中时是否仍登记当前条目
+
+        Returns:
+            Optional[SimilarMatch]: 相似度不低于阈值的最相似条目
+        """
+        if not signature:
+            return None
+        keys = self._band_keys(kind, scope, signature)
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            match = self._nearest(conn, keys, signature, ref)
+            if match is not None and match.similarity < threshold:
+                match = None
+            if match is None or add_on_match:
+                self._insert(conn, kind, scope, text, ref, signature, keys)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return match
+
+    def add_many(self, kind: str, entries: List[tuple], scope: str = '') -> int:
+        """
+        在一个事务中批量登记条目（导入历史文章等）
+
+        Args:
+            kind: 类别
+            entries: (text, signature, ref) 列表
+            scope: 子类别
+
+        Returns:
+            int: 登记的条目数
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            added = 0
+            for text, signature, ref in entries:
+                if signature:
+                    self._insert(conn, kind, scope, text, ref, signature, self._band_keys(kind, scope, signature))
+                    added += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def remove(self, kind: str, ref: str) -> None:
+        """删除关联 ref 的条目"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete(conn, kind, ref)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def count(self, kind: Optional[str] = None) -> int:
+        """条目数"""
+        if kind is None:
+            return self._connect().execute("SELECT COUNT(*) FROM items").fetchone()[0]
+        return self._connect().execute("SELECT COUNT(*) FROM items WHERE kind = ?", (kind,)).fetchone()[0]
+
+
+_similarity_indexes: Dict[str, SimilarityIndex] = {}
+_similarity_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(path: Optional[str] = None) -> SimilarityIndex:
+    """获取（进程内共享的）相似度索引实例"""
+    key = str(Path(path) if path else DEFAULT_SIMILARITY_PATH)
+    with _similarity_indexes_lock:
+        if key not in _similarity_indexes:
+            _similarity_indexes[key] = SimilarityIndex(key)
+        return _similarity_indexes[key]
+
+
+class DuplicateChecker:
+    """
+    生成前检查近重复主题、生成后检查近重复文章
+
+    mode 为 flag 时只提示，为 skip 时跳过与历史主题相似的生成。
+    主题按 风格 + 发布平台 分开比较（同一主题的不同风格不算重复），文章不区分。
+    索引不可用时只记录警告，不影响生成。
+    """
+
+    def __init__(
+        self,
+        mode: str = DEFAULT_DEDUP_MODE,
+        index: Optional[SimilarityIndex] = None,
+        topic_threshold: float = DEFAULT_TOPIC_SIMILARITY,
+        article_threshold: float = DEFAULT_ARTICLE_SIMILARITY
+    ):
+        if mode not in DEDUP_MODES:
+            raise ValidationError(f"无效的去重策略: {mode}，可选: {list(DEDUP_MODES)}")
+        self.mode = mode
+        self.index = index or get_similarity_index()
+        self.topic_threshold = topic_threshold
+        self.article_threshold = article_threshold
+
+    @property
+    def skip(self) -> bool:
+        return self.mode == 'skip'
+
+    @staticmethod
+    def _topic_scope(config: GenerationConfig) -> str:
+        return f"{config.style}|{config.target_platform or ''}"
+
+    def check_topic(self, config: GenerationConfig, ref: Optional[str] = None) -> Optional[SimilarMatch]:
+        """
+        检查主题是否与历史主题相似，并登记本次主题
+
+        Args:
+            config: 生成配置
+            ref: 本次的输出路径（生成失败时用 discard_topic 撤销登记）
+        """
+        signature = minhash_signature(shingles(config.topic, TOPIC_SHINGLE_SIZE))
+        try:
+            match = self.index.check_and_add(
+                'topic', config.topic, signature, self.topic_threshold,
+                scope=self._topic_scope(config), ref=ref, add_on_match=not self.skip
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"相似度索引不可用: {e}")
+            return None
+        if match is not None:
+            logger.warning(f"主题与历史主题相似（{match.similarity:.0%}）: {config.topic} ≈ {match.text}")
+        return match
+
+    def discard_topic(self, ref: str) -> None:
+        """撤销 check_topic 的登记（生成失败时调用，重试时不会与自身比较）"""
+        try:
+            self.index.remove('topic', ref)
+        except sqlite3.Error as e:
+            logger.warning(f"相似度索引不可用: {e}")
+
+    def check_article(self, content: str, topic: str, ref: Optional[str] = None) -> Optional[SimilarMatch]:
+        """检查文章是否与历史文章相似，并登记本篇文章"""
+        signature = minhash_signature(shingles(content, ARTICLE_SHINGLE_SIZE))
+        try:
+            match = self.index.check_and_add(
+                'article', topic, signature, self.article_threshold, ref=ref
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"相似度索引不可用: {e}")
+            return None
+        if match is not None:
+            logger.warning(f"文章与历史文章相似（{match.similarity:.0%}）: {topic} ≈ {match.text}")
+        return match
 
 
 # ============================================================================
-# 参数验证
-# ============================================================================
+# 质量评分（HKR / 4次判断的结构指标）
+# ============================================================================
 
-def validate_parameters(
-    topic: str,
-    style: str,
-    word_count: int,
-    platform: str
-) -> None:
+_LIST_ITEM_RE = re.compile(r'^\s*(?:[-*+•]|\d+[.、)）])\s+')
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[。！？!?…；;])|\n')
+_NUMBER_RE = re.compile(r'\d+(?:[.,]\d+)*%?')
+_QUESTION_END_RE = re.compile(r'[？?][”」』"]?$')
+_SECOND_PERSON_RE = re.compile(r'你|您')
+_CALL_TO_ACTION_RE = re.compile(r'评论|留言|关注|点赞|收藏|转发|分享|私信|在看')
+
+# 结构指标（特征矩阵的列顺序）
+QUALITY_FEATURES = (
+    'words', 'word_deviation', 'hook_words', 'hook_topic_coverage', 'topic_coverage',
+    'trust_signals', 'paragraph_mean', 'paragraph_std', 'sentence_mean', 'sentence_std',
+    'short_sentence_ratio', 'heading_density', 'list_density', 'data_density',
+    'question_ratio', 'second_person_density', 'call_to_action',
+)
+
+# 各指标的理想区间 (下限, 上限, 缓冲)：区间内得满分，超出部分在缓冲宽度内线性降为0。
+# 密度均为每千字的次数；区间依据Skill中的创作原则（前3句抓人、长短句结合、适时小标题、
+# 每300字一个价值点、结尾引导互动）设定，是启发式近似，只用于排序与筛选。
+QUALITY_TARGETS = {
+    'abs_word_deviation': (0.0, 0.1, 0.3),
+    'hook_words': (20.0, 90.0, 60.0),
+    'hook_topic_coverage': (0.5, 1.0, 0.5),
+    'topic_coverage': (0.8, 1.0, 0.6),
+    'trust_signals': (3.0, 1e9, 3.0),
+    'paragraph_mean': (30.0, 150.0, 100.0),
+    'sentence_mean': (10.0, 35.0, 15.0),
+    'sentence_std': (8.0, 40.0, 8.0),
+    'short_sentence_ratio': (0.15, 0.5, 0.15),
+    'heading_density': (1.0, 6.0, 2.0),
+    'list_density': (2.0, 20.0, 4.0),
+    'data_density': (3.0, 30.0, 5.0),
+    'question_ratio': (0.05, 0.3, 0.1),
+    'second_person_density': (3.0, 30.0, 5.0),
+    'call_to_action': (1.0, 1.0, 1.0),
+}
+
+# HKR各项与4次判断由上述单项得分加权得到（权重之和为1）
+QUALITY_WEIGHTS = {
+    'hook': {'hook_words': 0.35, 'hook_topic_coverage': 0.4, 'question_ratio': 0.25},
+    'knowledge': {
+        'topic_coverage': 0.25, 'data_density': 0.25, 'heading_density': 0.2,
+        'list_density': 0.15, 'abs_word_deviation': 0.15,
+    },
+    'resonance': {
+        'second_person_density': 0.35, 'call_to_action': 0.3,
+        'short_sentence_ratio': 0.2, 'sentence_std': 0.15,
+    },
+    'relevance': {'hook_topic_coverage': 0.6, 'hook_words': 0.4},
+    'trust': {'trust_signals': 0.5, 'paragraph_mean': 0.25, 'sentence_mean': 0.25},
+    'follow': {'call_to_action': 0.6, 'second_person_density': 0.4},
+}
+
+# Skill中的及格线：总分≥24且单项≥7
+QUALITY_PASS_TOTAL = 24.0
+QUALITY_PASS_ITEM = 7.0
+# 批量评分时篇数达到该值才启用多进程特征提取（进程启动的开销约等于数百篇的计算量）
+QUALITY_PARALLEL_MIN = 200
+
+
+def _mean_std(values: List[int]) -> tuple:
+    if not values:
+        return 0.0, 0.0
+    mean = sum(values) / len(values)
+    return mean, (sum((v - mean) ** 2 for v in values) / len(values)) ** 0.5
+
+
+def article_features(content: str, topic: str, target_words: int = 0) -> List[float]:
     """
-    验证输入参数
+    提取一篇文章的结构指标（顺序同 QUALITY_FEATURES）
+
+    开头取正文（不含标题）的前3句，信任信号统计前20个非空行中的数字、列表项与小标题，
+    主题覆盖率为主题的2字片段在开头/全文中出现的比例。
+
+    逐行单遍扫描：每句只统计一次字数，段落与全文字数由句子字数累加得到
+    （字数统计的匹配单元不含换行与断句标点，累加结果与整段统计相同）。
+    """
+    match = _FRONT_MATTER_RE.match(content)
+    if match:
+        content = content[match.end():]
+
+    lines: List[str] = []
+    sentences: List[str] = []
+    sentence_words: List[int] = []
+    paragraphs: List[int] = []
+    headings = list_items = words = 0
+    block_words = block_lines = 0
+    block_heading = False
+    first = True
+
+    def end_block() -> None:
+        # 只由一行标题构成的段落不计入段落长度
+        if block_lines and not (block_lines == 1 and block_heading):
+            paragraphs.append(block_words)
+
+    for line in content.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            end_block()
+            block_words = block_lines = 0
+            continue
+        # 首个非空行为 "# 标题" 时只计入全文字数
+        is_title = first and line.startswith('# ')
+        first = False
+        block_lines += 1
+        block_heading = bool(_HEADING_RE.match(stripped))
+        if is_title or _HEADING_RE.match(line):
+            line_words = count_words(line)
+            if not is_title:
+                lines.append(line)
+                headings += 1
+                list_items += 1 if _LIST_ITEM_RE.match(line) else 0
+        else:
+            lines.append(line)
+            list_items += 1 if _LIST_ITEM_RE.match(line) else 0
+            line_words = 0
+            for sentence in _SENTENCE_SPLIT_RE.split(line):
+                sentence = sentence.strip()
+                if sentence:
+                    n = count_words(sentence)
+                    sentences.append(sentence)
+                    line_words += n
+                    if n:
+                        sentence_words.append(n)
+        words += line_words
+        block_words += line_words
+    end_block()
+
+    per_thousand = 1000.0 / max(words, 1)
+    hook = ''.join(sentences[:3])
+    topic_shingles = shingles(topic, TOPIC_SHINGLE_SIZE)
+
+    def coverage(text: str) -> float:
+        text = normalize_text(text)
+        return sum(1 for s in topic_shingles if s in text) / len(topic_shingles) if topic_shingles else 0.0
+
+    first_lines = lines[:20]
+    trust_signals = (
+        sum(len(_NUMBER_RE.findall(line)) for line in first_lines)
+        + sum(1 for line in first_lines if _LIST_ITEM_RE.match(line) or _HEADING_RE.match(line))
+    )
+    paragraph_mean, paragraph_std = _mean_std(paragraphs)
+    sentence_mean, sentence_std = _mean_std(sentence_words)
+    ending = '\n'.join(lines[-3:])
+    body = '\n'.join(line for line in lines if not _HEADING_RE.match(line))
+
+    return [
+        float(words),
+        (words - target_words) / target_words if target_words > 0 else 0.0,
+        float(count_words(hook)),
+        coverage(hook),
+        coverage(content),
+        float(trust_signals),
+        paragraph_mean,
+        paragraph_std,
+        sentence_mean,
+        sentence_std,
+        sum(1 for n in sentence_words if n <= 15) / len(sentence_words) if sentence_words else 0.0,
+        headings * per_thousand,
+        list_items * per_thousand,
+        len(_NUMBER_RE.findall(content)) * per_thousand,
+        sum(1 for s in sentences if _QUESTION_END_RE.search(s)) / len(sentences) if sentences else 0.0,
+        len(_SECOND_PERSON_RE.findall(body)) * per_thousand,
+        1.0 if _CALL_TO_ACTION_RE.search(ending) else 0.0,
+    ]
+
+
+def score_features(features: List[List[float]]) -> List[Dict[str, float]]:
+    """
+    由结构指标矩阵批量计算评分
+
+    已安装 numpy 时整批向量化计算，否则逐行计算，结果相同。
+
+    Returns:
+        List[Dict[str, float]]: 每篇的 hook/knowledge/resonance（0-10）、total（0-30）、
+            relevance/trust/value/follow（4次判断，0-1）、passed（是否达到及格线）及各结构指标
+    """
+    if not features:
+        return []
+    columns = {name: i for i, name in enumerate(QUALITY_FEATURES)}
+    targets = list(QUALITY_TARGETS.items())
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+
+    if np is not None:
+        matrix = np.asarray(features, dtype=float)
+        values = np.column_stack([
+            np.abs(matrix[:, columns['word_deviation']]) if name == 'abs_word_deviation' else matrix[:, columns[name]]
+            for name, _ in targets
+        ])
+        lo, hi, soft = (np.array([t[i] for _, t in targets]) for i in range(3))
+        distance = np.maximum(np.maximum(lo - values, values - hi), 0.0)
+        item_scores = np.clip(1.0 - distance / soft, 0.0, 1.0)
+        weights = np.array([
+            [QUALITY_WEIGHTS[dim].get(name, 0.0) for dim in QUALITY_WEIGHTS] for name, _ in targets
+        ])
+        dims = (item_scores @ weights).tolist()
+    else:
+        dims = []
+        for row in features:
+            item = {}
+            for name, (lo, hi, soft) in targets:
+                value = abs(row[columns['word_deviation']]) if name == 'abs_word_deviation' else row[columns[name]]
+                item[name] = min(max(1.0 - max(lo - value, value - hi, 0.0) / soft, 0.0), 1.0)
+            dims.append([
+                sum(item[name] * weight for name, weight in QUALITY_WEIGHTS[dim].items())
+                for dim in QUALITY_WEIGHTS
+            ])
+
+    scores = []
+    for row, dim_values in zip(features, dims):
+        dim = dict(zip(QUALITY_WEIGHTS, dim_values))
+        hkr = {name: round(dim[name] * 10, 2) for name in ('hook', 'knowledge', 'resonance')}
+        total = round(sum(hkr.values()), 2)
+        scores.append({
+            **hkr,
+            'total': total,
+            'relevance': round(dim['relevance'], 3),
+            'trust': round(dim['trust'], 3),
+            'value': round(dim['knowledge'], 3),
+            'follow': round(dim['follow'], 3),
+            'passed': total >= QUALITY_PASS_TOTAL and min(hkr.values()) >= QUALITY_PASS_ITEM,
+            **{name: round(value, 4) for name, value in zip(QUALITY_FEATURES, row)},
+        })
+    return scores
+
+
+def _article_features_batch(articles: List[tuple]) -> List[List[float]]:
+    """一组文章的结构指标（进程池中按块执行）"""
+    return [article_features(content, topic, target) for content, topic, target in articles]
+
+
+def score_articles(articles: List[tuple], workers: Optional[int] = None) -> List[Dict[str, float]]:
+    """
+    批量评分
+
+    篇数达到 QUALITY_PARALLEL_MIN 且有多个CPU时，特征提取分块交给进程池并行执行，
+    评分加权再整批计算。
 
     Args:
-        topic: 文章主题
-        style: 写作风格
-        word_count: 目标字数
-        platform: AI平台
+        articles: (正文, 主题, 目标字数) 列表
+        workers: 特征提取的进程数（默认为CPU数）
+
+    Returns:
+        List[Dict[str, float]]: 与输入顺序一致的评分（见 score_features）
+    """
+    workers = workers or os.cpu_count() or 1
+    if len(articles) < QUALITY_PARALLEL_MIN or workers < 2:
+        return score_features(_article_features_batch(articles))
+
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    size = -(-len(articles) // (workers * 4))
+    chunks = [articles[i:i + size] for i in range(0, len(articles), size)]
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            features = [row for rows in executor.map(_article_features_batch, chunks) for row in rows]
+    except (OSError, BrokenProcessPool) as e:
+        logger.warning(f"评分进程池不可用，改为单进程计算: {e}")
+        features = _article_features_batch(articles)
+    return score_features(features)
+
+
+def record_quality(result: GenerationResult, config: GenerationConfig) -> None:
+    """计算单篇结果的质量评分并记录到 result.quality"""
+    result.quality = score_articles([(result.content, config.topic, config.word_count)])[0]
+
+
+# 清单与指标中只记录的评分字段（完整指标保存在生成结果中）
+QUALITY_SUMMARY_FIELDS = ('hook', 'knowledge', 'resonance', 'total', 'passed')
+
+
+def quality_summary(quality: Dict[str, float]) -> Optional[Dict[str, float]]:
+    """评分摘要：HKR各项、总分与是否及格"""
+    if not quality:
+        return None
+    return {name: quality[name] for name in QUALITY_SUMMARY_FIELDS}
+
+
+# ============================================================================
+# 批量生成
+# ============================================================================
+
+# 主题文件中允许的列名 -> GenerationConfig 字段
+BATCH_FIELD_ALIASES = {
+    'topic': 'topic',
+    'style': 'style',
+    'words': 'word_count',
+    'word_count': 'word_count',
+    'platform': 'platform',
+    'model': 'model',
+    'temperature': 'temperature',
+    'max_tokens': 'max_tokens',
+    'output': 'output_path',
+    'output_path': 'output_path',
+    'target_platform': 'target_platform',
+}
+
+_BATCH_FIELD_TYPES = {
+    'word_count': int,
+    'temperature': float,
+    'max_tokens': int,
+}
+
+
+def _read_topic_rows(path: Path) -> Iterator[Dict[str, Any]]:
+    """逐行读取主题文件（CSV 或 JSONL）"""
+    if path.suffix.lower() in ('.jsonl', '.ndjson', '.json'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValidationError(f"{path}:{line_no} 不是有效的JSON: {e}")
+                if isinstance(row, str):
+                    row = {'topic': row}
+                yield row
+    else:
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            for row in csv.DictReader(f):
+                yield row
+
+
+def load_topics(path: str, defaults: Optional[Dict[str, Any]] = None) -> List[GenerationConfig]:
+    """
+    从主题文件加载批量生成配置
+
+    支持 CSV（带表头）与 JSONL 两种格式，每行可单独设置
+    style / words / platform / model 等字段，未设置的字段使用 defaults。
+
+    Args:
+        path: 主题文件路径
+        defaults: 默认的 GenerationConfig 字段
+
+    Returns:
+        List[GenerationConfig]: 生成配置列表
 
     Raises:
-        ValidationError: 当参数无效时
+        ValidationError: 当文件不存在或内容无效时
     """
-    # 验证主题
-    if not topic or len(topic.strip()) == 0:
-        raise ValidationError("主题不能为空")
-    if len(topic) > 200:
-        raise ValidationError("主题长度不能超过200字符")
+    topic_path = Path(path)
+    if not topic_path.exists():
+        raise ValidationError(f"主题文件不存在: {path}")
+
+    configs = []
+    for index, row in enumerate(_read_topic_rows(topic_path), 1):
+        values = dict(defaults or {})
+        for key, value in row.items():
+            key_name = BATCH_FIELD_ALIASES.get((key or '').strip().lower())
+            if key_name is None or value is None or value == '':
+                continue
+            try:
+                values[key_name] = _BATCH_FIELD_TYPES.get(key_name, str)(value)
+            except (TypeError, ValueError):
+                raise ValidationError(f"{path} 第{index}行字段 {key} 无效: {value}")
+        if not values.get('topic'):
+            raise ValidationError(f"{path} 第{index}行缺少 topic")
+        values['stream'] = False
+        configs.append(GenerationConfig(**values))
 
-    # 验证风格
-    if style not in SUPPORTED_STYLES:
-        logger.warning(f"使用自定义风格: {style}")
+    logger.info(f"已加载 {len(configs)} 个主题: {path}")
+    return configs
 
-    # 验证字数
-    if not isinstance(word_count, int):
-        raise ValidationError("字数必须是整数")
-    if word_count < MIN_WORD_COUNT:
-        raise ValidationError(f"字数不能少于{MIN_WORD_COUNT}")
-    if word_count > MAX_WORD_COUNT:
-        raise ValidationError(f"字数不能超过{MAX_WORD_COUNT}")
 
-    # 验证平台
-    if platform not in SUPPORTED_PLATFORMS:
-        raise ValidationError(f"不支持的平台: {platform}，支持的平台: {SUPPORTED_PLATFORMS}")
+def parse_worker_spec(spec: Any) -> Dict[str, int]:
+    """
+    解析并发数设置
+
+    "16" 表示每个平台16个并发；"openai=32,claude=16" 按平台分别设置。
+    也接受配置文件中的整数或 {平台: 并发数} 字典。
+
+    Raises:
+        ValidationError: 当格式无效时
+    """
+    workers = {platform: DEFAULT_BATCH_WORKERS for platform in SUPPORTED_PLATFORMS}
+    if not spec:
+        return workers
+    if isinstance(spec, dict):
+        spec = ','.join(f'{platform}={count}' for platform, count in spec.items())
+    spec = str(spec)
+    try:
+        if '=' not in spec:
+            workers = {platform: int(spec) for platform in SUPPORTED_PLATFORMS}
+        else:
+            for part in spec.split(','):
+                platform, count = part.split('=', 1)
+                workers[platform.strip()] = int(count)
+    except ValueError:
+        raise ValidationError(f"无效的并发设置: {spec}")
+    if any(count < 1 for count in workers.values()):
+        raise ValidationError(f"并发数必须大于0: {spec}")
+    return workers
+
+
+@dataclass
+class BatchSummary:
+    """批量生成汇总"""
+    total: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    tokens_used: int = 0
+    duration_seconds: float = 0.0
+    manifest_path: Optional[str] = None
+
+
+def _run_batch_item(
+    index: int,
+    config: GenerationConfig,
+    output_dir: Path,
+    checker: Optional[DuplicateChecker] = None,
+    store: Optional[ArticleStore] = None,
+    output_path: Optional[str] = None,
+    router: Optional[AdaptiveRouter] = None,
+    metrics: Optional[MetricsTarget] = None
+) -> Dict[str, Any]:
+    """
+    执行单个批量任务：生成并立即落盘，只返回摘要记录
+
+    使用文章库时文章只写入文章库，配置中显式指定了 output_path 时同时写出文件；
+    使用自适应路由时平台与模型由路由决定，记录中的 platform 为实际使用的平台。
+    设置 metrics 时每篇成功的文章导出一条指标。
+    """
+    record: Dict[str, Any] = {
+        'index': index,
+        'topic': config.topic,
+        'style': config.style,
+        'platform': config.platform,
+    }
+    output_path = str(Path(config.output_path or output_path or (
+        output_dir / f"{index:05d}_{safe_filename(config.topic)}.md"
+    )).absolute())
+    checked = False
+    try:
+        validate_parameters(config.topic, config.style, config.word_count, config.platform, config.max_tokens)
+        if not config.api_key and router is None:
+            raise ValidationError(f"缺少API Key，请设置环境变量 {API_KEY_ENV_VARS[config.platform]}")
+
+        if checker is not None:
+            match = checker.check_topic(config, ref=output_path)
+            checked = not (match is not None and checker.skip)
+            if match is not None:
+                record.update(similar_topic=match.text, topic_similarity=round(match.similarity, 3))
+                if checker.skip:
+                    record.update(status='skipped', similar_path=match.ref)
+                    return record
+
+        if router is not None:
+            result = router.generate(config)
+            record['platform'] = result.platform
+        else:
+            result = create_generator(config).generate()
+        record_quality(result, config)
+        start = time.perf_counter()
+        if store is not None:
+            record['article_id'] = store.add(config, result)
+        if store is None or config.output_path:
+            saved_path = save_output(result.content, output_path, config.topic)
+        else:
+            saved_path = store.ref(record['article_id'])
+        result.timings.save = time.perf_counter() - start
+        if metrics is not None:
+            metrics.export(result, config.topic)
+        if checker is not None:
+            match = checker.check_article(result.content, config.topic, ref=saved_path)
+            if match is not None:
+                record.update(
+                    similar_article=match.text,
+                    article_similarity=round(match.similarity, 3),
+                    similar_path=match.ref,
+                )
+        record.update(
+            status='ok',
+            model=result.model,
+            path=saved_path,
+            chars=len(result.content),
+            tokens_used=result.tokens_used,
+            cache_read_tokens=result.cache_read_tokens,
+            cache_write_tokens=result.cache_write_tokens,
+            duration_seconds=round(result.duration_seconds, 3),
+            truncated=result.truncated,
+            cached=result.cached,
+            words=result.word_count,
+            word_deviation=result.word_deviation,
+            quality=quality_summary(result.quality),
+            timings=asdict(result.timings),
+        )
+    except ViralContentError as e:
+        record.update(
+            status='error', error=str(e), error_type=type(e).__name__,
+            retryable=classify_error(e).retryable
+        )
+    except Exception as e:
+        logger.exception(f"批量任务 {index} 未预期的错误: {e}")
+        record.update(
+            status='error', error=str(e), error_type=type(e).__name__,
+            retryable=classify_error(e).retryable
+        )
+    if record.get('status') == 'error' and checked:
+        checker.discard_topic(output_path)
+    return record
+
+
+def run_batch(
+    configs: List[GenerationConfig],
+    output_dir: str = '.',
+    workers: Optional[Dict[str, int]] = None,
+    manifest_path: Optional[str] = None,
+    on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+    checker: Optional[DuplicateChecker] = None,
+    store: Optional[ArticleStore] = None,
+    router: Optional[AdaptiveRouter] = None,
+    metrics: Optional[MetricsTarget] = None
+) -> BatchSummary:
+    """
+    并发批量生成
+
+    每个平台使用独立的线程池，并发数由 workers 控制。每篇文章完成后
+    立即写入 output_dir，并向清单文件追加一行JSON记录，内存中不保留正文。
+
+    Args:
+        configs: 生成配置列表
+        output_dir: 输出目录
+        workers: 各平台并发数（默认每个平台 DEFAULT_BATCH_WORKERS）
+        manifest_path: 结果清单（JSONL）路径，默认 output_dir/batch_manifest.jsonl
+        on_record: 每完成一篇时的回调
+        checker: 近重复检测（为None时不检测）
+        store: 文章库（为None时写入 output_dir）
+        router: 自适应路由（为None时按配置中的平台生成）；路由时所有任务共用一个线程池，
+            线程数为各候选平台并发数之和，各平台并发仍受 workers 限制
+        metrics: 指标导出目标（为None时不导出）
 
+    Returns:
+        BatchSummary: 汇总信息
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    workers = workers or parse_worker_spec(None)
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Path(manifest_path) if manifest_path else out_dir / 'batch_manifest.jsonl'
+    summary = BatchSummary(total=len(configs), manifest_path=str(manifest.absolute()))
+
+    executors: Dict[str, ThreadPoolExecutor] = {}
+    futures = []
+    start_time = time.time()
+    try:
+        for index, config in enumerate(configs, 1):
+            platform = 'route' if router is not None else config.platform
+            if platform not in executors:
+                executors[platform] = ThreadPoolExecutor(
+                    max_workers=(
+                        sum(workers.get(name, DEFAULT_BATCH_WORKERS) for name in router.platforms())
+                        if router is not None else workers.get(platform, DEFAULT_BATCH_WORKERS)
+                    ),
+                    thread_name_prefix=f"batch-{platform}"
+                )
+            futures.append(executors[platform].submit(
+                _run_batch_item, index, config, out_dir, checker, store, None, router, metrics
+            ))
+
+        with open(manifest, 'a', encoding='utf-8') as manifest_file:
+            for future in as_completed(futures):
+                record = future.result()
+                manifest_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                manifest_file.flush()
+
+                if record['status'] == 'ok':
+                    summary.succeeded += 1
+                    if not record.get('cached'):
+                        summary.tokens_used += record.get('tokens_used', 0)
+                elif record['status'] == 'skipped':
+                    summary.skipped += 1
+                else:
+                    summary.failed += 1
+                    logger.warning(f"批量任务失败 [{record['index']}] {record['topic']}: {record['error']}")
+                if on_record:
+                    on_record(record)
+    finally:
+        for future in futures:
+            future.cancel()
+        for executor in executors.values():
+            executor.shutdown(wait=True)
+
+    summary.duration_seconds = time.time() - start_time
     logger.info(
-        f"参数验证通过: topic={topic[:20]}..., "
-        f"style={style}, words={word_count}, platform={platform}"
+        f"批量生成完成: 成功 {summary.succeeded}/{summary.total}，"
+        f"失败 {summary.failed}，跳过 {summary.skipped}，耗时 {summary.duration_seconds:.2f}秒"
     )
+    return summary
 
 
 # ============================================================================
-# 内容保存
+# 持久化任务队列（SQLite，断点续跑与多进程领取）
+# ============================================================================
+
+# 决定生成结果的配置字段，相同取值的任务视为同一任务
+JOB_IDENTITY_FIELDS = (
+    'topic', 'style', 'word_count', 'platform', 'model', 'temperature',
+    'max_tokens', 'target_platform', 'full_skill', 'adaptation', 'max_continuations',
+    'stop_policy', 'length_tolerance', 'base_url', 'output_path',
+)
+
+
+def job_id_for(config: GenerationConfig) -> str:
+    """按决定生成结果的配置字段计算幂等任务ID"""
+    identity = {name: getattr(config, name) for name in JOB_IDENTITY_FIELDS}
+    payload = json.dumps(identity, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def default_worker_id() -> str:
+    """当前进程的领取者标识（主机名:进程号）"""
+    import socket
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(pid: int) -> bool:
+    """判断本机进程是否仍在运行（无法判断时视为运行中，交由租约过期处理）"""
+    if os.name == 'nt':
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+@dataclass
+class Job:
+    """已领取的任务"""
+    id: str
+    seq: int
+    config: GenerationConfig
+    attempts: int
+
+
+class JobStore:
+    """
+    持久化任务队列
+
+    每个任务保存 GenerationConfig（不含API Key）、状态、尝试次数、结果路径与token用量。
+    任务ID由配置内容决定，重复入队会被忽略，重跑同一主题文件只执行未完成的任务。
+    领取在 BEGIN IMMEDIATE 事务中完成，多个进程可以同时从同一个库领取任务而不会重复调用API；
+    领取者定期续租，进程崩溃后任务在租约到期时（同一主机上进程退出后立即）重新变为可领取。
+
+    WAL 模式要求所有进程位于同一主机；多台机器通过网络文件系统共享任务库时
+    使用 wal=False（回滚日志模式，依赖文件锁）。
+    """
+
+    def __init__(
+        self,
+        path: str,
+        lease_seconds: float = DEFAULT_JOB_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_JOB_MAX_ATTEMPTS,
+        wal: bool = True
+    ):
+        self.path = Path(path)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.wal = wal
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL UNIQUE,
+                platform TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                config TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                result_path TEXT,
+                tokens_used INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, platform, lease_until)")
+
+    def _connect(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（自动提交，写事务显式开启）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+            if self.wal:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            else:
+                conn.execute("PRAGMA journal_mode=DELETE")
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, configs: List[GenerationConfig]) -> int:
+        """
+        批量入队，已存在的任务（相同ID）保持原状态
+
+        Returns:
+            int: 新增的任务数
+        """
+        now = time.time()
+        rows = []
+        for config in configs:
+            stored = asdict(config)
+            stored.pop('api_key', None)
+            rows.append((
+                job_id_for(config), config.platform, config.topic,
+                json.dumps(stored, ensure_ascii=False), now, now
+            ))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs(id, platform, topic, config, created, updated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            added = conn.total_changes - before
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, worker: str, platforms: Optional[List[str]] = None) -> Optional[Job]:
+        """
+        领取下一个可执行的任务
+
+        可领取的任务：等待中且已过重试等待时间，或运行中但租约已过期（领取者已崩溃）。
+        租约过期次数达到上限的任务标记为失败，避免反复导致进程崩溃的任务无限重试。
+
+        Args:
+            worker: 领取者标识
+            platforms: 只领取这些平台的任务（默认不限）
+
+        Returns:
+            Optional[Job]: 任务，没有可领取的任务时返回None
+        """
+        now = time.time()
+        query = (
+            "SELECT seq, id, config, attempts FROM jobs "
+            "WHERE ((status = 'pending' AND lease_until <= ?) "
+            "OR (status = 'running' AND lease_until < ?))"
+        )
+        params: List[Any] = [now, now]
+        if platforms:
+            query += f" AND platform IN ({', '.join('?' * len(platforms))})"
+            params.extend(platforms)
+        query += " ORDER BY seq LIMIT 1"
+
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', worker = NULL, updated = ?, "
+                "error = COALESCE(error, '领取者多次中断，已达到最大尝试次数') "
+                "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts)
+            )
+            row = conn.execute(query, params).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, "
+                    "lease_until = ?, updated = ? WHERE seq = ?",
+                    (worker, now + self.lease_seconds, now, row[0])
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if row is None:
+            return None
+
+        data = json.loads(row[2])
+        known = {f.name for f in fields(GenerationConfig)}
+        config = GenerationConfig(**{k: v for k, v in data.items() if k in known})
+        return Job(id=row[1], seq=row[0], config=config, attempts=row[3] + 1)
+
+    def heartbeat(self, worker: str) -> int:
+        """为领取者持有的所有任务续租，返回续租的任务数"""
+        now = time.time()
+        return self._connect().execute(
+            "UPDATE jobs SET lease_until = ?, updated = ? WHERE worker = ? AND status = 'running'",
+            (now + self.lease_seconds, now, worker)
+        ).rowcount
+
+    def complete(self, job_id: str, result_path: str, tokens_used: int = 0) -> None:
+        """标记任务完成"""
+        self._connect().execute(
+            "UPDATE jobs SET status = 'done', worker = NULL, lease_until = 0, result_path = ?, "
+            "tokens_used = ?, error = NULL, updated = ? WHERE id = ?",
+            (result_path, tokens_used, time.time(), job_id)
+        )
+
+    def skip(self, job_id: str, reason: str) -> None:
+        """标记任务已跳过（如与历史主题近重复），不再执行"""
+        self._connect().execute(
+            "UPDATE jobs SET status = 'skipped', worker = NULL, lease_until = 0, error = ?, "
+            "updated = ? WHERE id = ?",
+            (reason, time.time(), job_id)
+        )
+
+    def fail(self, job: Job, error: str, retryable: bool = True) -> str:
+        """
+        记录任务失败：可重试且未达到最大尝试次数时放回队列（等待时间随次数递增）
+
+        Returns:
+            str: 任务的新状态（pending 或 failed）
+        """
+        now = time.time()
+        if retryable and job.attempts < self.max_attempts:
+            status, not_before = 'pending', now + JOB_RETRY_DELAY * job.attempts
+        else:
+            status, not_before = 'failed', 0
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, worker = NULL, lease_until = ?, error = ?, updated = ? "
+            "WHERE id = ?",
+            (status, not_before, error, now, job.id)
+        )
+        return status
+
+    def release(self, worker: str) -> int:
+        """将领取者持有但未完成的任务放回队列（不计入尝试次数），返回数量"""
+        return self._connect().execute(
+            "UPDATE jobs SET status = 'pending', worker = NULL, lease_until = 0, "
+            "attempts = MAX(attempts - 1, 0), updated = ? WHERE worker = ? AND status = 'running'",
+            (time.time(), worker)
+        ).rowcount
+
+    def recover_stale(self) -> int:
+        """将本主机上已退出进程持有的任务放回队列，无需等待租约过期，返回数量"""
+        host = default_worker_id().rsplit(':', 1)[0]
+        conn = self._connect()
+        stale = []
+        for (worker,) in conn.execute(
+            "SELECT DISTINCT worker FROM jobs WHERE status = 'running' AND worker LIKE ?",
+            (f"{host}:%",)
+        ).fetchall():
+            pid = worker.rsplit(':', 1)[1]
+            if pid.isdigit() and not _process_alive(int(pid)):
+                stale.append(worker)
+        return sum(
+            conn.execute(
+                "UPDATE jobs SET lease_until = 0, updated = ? WHERE worker = ? AND status = 'running'",
+                (time.time(), worker)
+            ).rowcount
+            for worker in stale
+        )
+
+    def retry_failed(self) -> int:
+        """将失败的任务重置为等待中（尝试次数清零），返回数量"""
+        return self._connect().execute(
+            "UPDATE jobs SET status = 'pending', attempts = 0, lease_until = 0, error = NULL, "
+            "updated = ? WHERE status = 'failed'",
+            (time.time(),)
+        ).rowcount
+
+    def next_ready_in(self, platforms: Optional[List[str]] = None) -> Optional[float]:
+        """距离下一个等待中任务可领取的秒数，没有等待中的任务时返回None"""
+        query = "SELECT MIN(lease_until) FROM jobs WHERE status = 'pending'"
+        params: List[Any] = []
+        if platforms:
+            query += f" AND platform IN ({', '.join('?' * len(platforms))})"
+            params.extend(platforms)
+        ready_at = self._connect().execute(query, params).fetchone()[0]
+        return None if ready_at is None else max(0.0, ready_at - time.time())
+
+    def platforms(self) -> List[str]:
+        """有未完成任务的平台"""
+        rows = self._connect().execute(
+            "SELECT DISTINCT platform FROM jobs WHERE status IN ('pending', 'running')"
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """各状态任务数与已完成任务的token用量"""
+        counts = {status: 0 for status in ('pending', 'running', 'done', 'failed', 'skipped')}
+        tokens = 0
+        for status, count, used in self._connect().execute(
+            "SELECT status, COUNT(*), COALESCE(SUM(tokens_used), 0) FROM jobs GROUP BY status"
+        ):
+            counts[status] = count
+            tokens += used
+        return {'path': str(self.path), 'total': sum(counts.values()), **counts, 'tokens_used': tokens}
+
+    def failures(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """最近失败的任务"""
+        rows = self._connect().execute(
+            "SELECT seq, id, topic, platform, attempts, error FROM jobs "
+            "WHERE status = 'failed' ORDER BY updated DESC LIMIT ?",
+            (limit,)
+        ).fetchall()
+        keys = ('seq', 'id', 'topic', 'platform', 'attempts', 'error')
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def job_output_path(job: Job, output_dir: Path) -> str:
+    """任务的输出路径：由任务ID决定，重跑时覆盖而不是产生重复文件"""
+    if job.config.output_path:
+        return job.config.output_path
+    return str(output_dir / f"{safe_filename(job.config.topic)}_{job.id[:8]}.md")
+
+
+def run_job_queue(
+    store: JobStore,
+    output_dir: str = '.',
+    workers: Optional[Dict[str, int]] = None,
+    api_keys: Optional[Dict[str, Optional[str]]] = None,
+    worker_id: Optional[str] = None,
+    manifest_path: Optional[str] = None,
+    on_record: Optional[Callable[[Dict[str, Any]], None]] = None,
+    checker: Optional[DuplicateChecker] = None,
+    article_store: Optional[ArticleStore] = None,
+    router: Optional[AdaptiveRouter] = None,
+    metrics: Optional[MetricsTarget] = None
+) -> BatchSummary:
+    """
+    从任务队列领取并执行任务，直到没有可执行的任务
+
+    每个平台按 workers 启动对应数量的线程，各自从队列领取该平台的任务；
+    同一任务库可由多个进程同时执行。任务完成后立即写入 output_dir 并更新任务库，
+    进程中断后重新运行即可从未完成的任务继续。
+
+    Args:
+        store: 任务库
+        output_dir: 输出目录
+        workers: 各平台并发数（默认每个平台 DEFAULT_BATCH_WORKERS）
+        api_keys: 各平台API Key（任务库中不保存API Key）
+        worker_id: 领取者标识（默认 主机名:进程号）
+        manifest_path: 结果清单（JSONL）路径，默认 output_dir/batch_manifest.jsonl
+        on_record: 每执行完一个任务时的回调
+        checker: 近重复检测（为None时不检测）；跳过的任务在任务库中标记为 skipped
+        article_store: 文章库（为None时写入 output_dir）
+        router: 自适应路由（为None时按任务的平台执行）；路由时线程不区分平台领取任务，
+            线程数为各候选平台并发数之和，由路由决定每个任务使用的平台
+        metrics: 指标导出目标（为None时不导出）
+
+    Returns:
+        BatchSummary: 本次运行的汇总信息
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    workers = workers or parse_worker_spec(None)
+    api_keys = api_keys or {}
+    worker_id = worker_id or default_worker_id()
+    out_dir = Path(output_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest = Path(manifest_path) if manifest_path else out_dir / 'batch_manifest.jsonl'
+    summary = BatchSummary(manifest_path=str(manifest.absolute()))
+
+    recovered = store.recover_stale()
+    if recovered:
+        logger.info(f"已回收 {recovered} 个中断进程持有的任务")
+
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def heartbeat() -> None:
+        while not stop.wait(store.lease_seconds / 3):
+            try:
+                store.heartbeat(worker_id)
+            except sqlite3.Error as e:
+                logger.warning(f"任务续租失败: {e}")
+
+    def work(platform: Optional[str], manifest_file) -> None:
+        platforms = [platform] if platform else None
+        while not stop.is_set():
+            job = store.claim(worker_id, platforms)
+            if job is None:
+                ready_in = store.next_ready_in(platforms)
+                if ready_in is None:
+                    return
+                stop.wait(min(max(ready_in, 0.1), RateLimiter.MAX_SLEEP))
+                continue
+
+            config = replace(job.config, api_key=api_keys.get(job.config.platform))
+            record = _run_batch_item(
+                job.seq, config, out_dir, checker, article_store,
+                output_path=job_output_path(job, out_dir), router=router, metrics=metrics
+            )
+            record.update(job_id=job.id, attempt=job.attempts)
+            if record['status'] == 'ok':
+                store.complete(job.id, record['path'], record.get('tokens_used', 0))
+            elif record['status'] == 'skipped':
+                store.skip(job.id, f"与历史主题相似: {record['similar_topic']}")
+            else:
+                # 是否可重试由 classify_error 判断：参数/配置错误与不可重试的状态码直接标记为失败
+                record['job_status'] = store.fail(job, record['error'], record['retryable'])
+
+            with lock:
+                manifest_file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                manifest_file.flush()
+                summary.total += 1
+                if record['status'] == 'ok':
+                    summary.succeeded += 1
+                    if not record.get('cached'):
+                        summary.tokens_used += record.get('tokens_used', 0)
+                elif record['status'] == 'skipped':
+                    summary.skipped += 1
+                else:
+                    summary.failed += 1
+                    logger.warning(f"任务失败 [{job.seq}] {job.config.topic}: {record['error']}")
+                if on_record:
+                    on_record(record)
+
+    if router is not None:
+        slot_platforms = [None] * (
+            sum(workers.get(name, DEFAULT_BATCH_WORKERS) for name in router.platforms())
+            if store.platforms() else 0
+        )
+    else:
+        slot_platforms = [
+            platform for platform in store.platforms()
+            for _ in range(workers.get(platform, DEFAULT_BATCH_WORKERS))
+        ]
+    slots = len(slot_platforms)
+    start_time = time.time()
+    if slots:
+        heartbeat_thread = threading.Thread(target=heartbeat, name="job-heartbeat", daemon=True)
+        heartbeat_thread.start()
+        executor = ThreadPoolExecutor(max_workers=slots, thread_name_prefix="job")
+        try:
+            with open(manifest, 'a', encoding='utf-8') as manifest_file:
+                futures = [executor.submit(work, platform, manifest_file) for platform in slot_platforms]
+                for future in futures:
+                    future.result()
+        finally:
+            # 中断时不再领取新任务，等待执行中的任务落盘
+            stop.set()
+            executor.shutdown(wait=True)
+            store.release(worker_id)
+
+    summary.duration_seconds = time.time() - start_time
+    logger.info(
+        f"任务队列执行完成: 成功 {summary.succeeded}/{summary.total}，"
+        f"失败 {summary.failed}，跳过 {summary.skipped}，耗时 {summary.duration_seconds:.2f}秒"
+    )
+    return summary
+
+
 # ============================================================================
+# 服务模式（常驻进程，复用SDK客户端、连接与Skill）
+# ============================================================================
+
+# 可由请求设置的生成配置字段（输出路径、是否使用响应缓存等仍由各自一端决定）；
+# base_url 只有在请求自带 api_key 时才接受，避免把服务端的Key发往请求方指定的地址
+SERVER_REQUEST_FIELDS = (
+    'topic', 'style', 'word_count', 'platform', 'api_key', 'model', 'temperature',
+    'max_tokens', 'stream', 'prompt_cache', 'target_platform', 'full_skill',
+    'max_continuations', 'base_url', 'stop_policy', 'length_tolerance',
+)
+
+
+def result_to_dict(result: GenerationResult) -> Dict[str, Any]:
+    """生成结果转为可JSON序列化的字典"""
+    return asdict(result)
+
+
+def result_from_dict(data: Dict[str, Any]) -> GenerationResult:
+    """从 result_to_dict 的输出还原生成结果"""
+    known = {f.name for f in fields(GenerationResult)}
+    values = {k: v for k, v in data.items() if k in known}
+    timings = values.pop('timings', None) or {}
+    timing_fields = {f.name for f in fields(PhaseTimings)}
+    result = GenerationResult(**values)
+    result.timings = PhaseTimings(**{k: v for k, v in timings.items() if k in timing_fields})
+    return result
+
+
+def is_loopback_host(host: str) -> bool:
+    """地址是否只在本机可访问（localhost / 127.0.0.0/8 / ::1）"""
+    import ipaddress
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        return False
+
+
+def parse_server_address(address: str) -> tuple:
+    """解析 "host:port" 或 "port"，返回 (host, port)"""
+    host, _, port = address.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise ValidationError(f"无效的服务地址: {address}，格式为 host:port")
+
+
+class GenerationServer:
+    """
+    常驻生成服务
+
+    在一个进程内持续运行，SDK客户端、HTTP连接池与Skill提示词在请求间复用，
+    每篇文章只剩模型调用本身的耗时。并发生成数受 concurrency 限制，超出的
+    请求排队等待。
+
+    接口：
+        POST /generate  请求体为 GenerationConfig 字段的JSON；stream 为 true 时
+                        以JSON行逐块返回 {"type": "chunk"} 与最终 {"type": "result"}
+        GET  /health    运行状态
+        GET  /queue     进行中与排队中的任务数
+
+    设置 token 后，除 /health 外的请求都须携带 "Authorization: Bearer <token>"；
+    设置 metrics 时每个成功的请求导出一条指标。是否使用响应缓存由服务端的
+    use_cache 决定，请求无法绕过或刷新缓存。
+    """
+
+    def __init__(
+        self,
+        config_file: Optional[Dict[str, Any]] = None,
+        concurrency: int = DEFAULT_SERVER_CONCURRENCY,
+        base_url: Optional[str] = None,
+        token: Optional[str] = None,
+        metrics: Optional[MetricsTarget] = None,
+        use_cache: bool = True
+    ):
+        self.config_file = config_file or {}
+        self.base_url = base_url or self.config_file.get('base_url')
+        self.token = token
+        self.metrics = metrics
+        self.use_cache = use_cache
+        self.concurrency = max(1, concurrency)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {'active': 0, 'queued': 0, 'completed': 0, 'failed': 0}
+
+    def _bump(self, name: str, delta: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += delta
+
+    def status(self) -> Dict[str, Any]:
+        """运行状态与队列深度"""
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(
+            counters,
+            status='ok',
+            concurrency=self.concurrency,
+            uptime_seconds=round(time.time() - self.started_at, 1),
+            pooled_clients=len(client_pool),
+        )
+
+    def authorized(self, header: Optional[str]) -> bool:
+        """校验 Authorization 请求头；未设置 token 时放行"""
+        if not self.token:
+            return True
+        import hmac
+        scheme, _, value = (header or '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(value.strip(), self.token)
+
+    def build_config(self, data: Dict[str, Any]) -> GenerationConfig:
+        """
+        由请求体创建生成配置
+
+        Raises:
+            ValidationError: 当字段无效、缺少API Key，或指定 base_url 却未自带 api_key 时
+        """
+        if not isinstance(data, dict) or not data.get('topic'):
+            raise ValidationError("请求缺少 topic")
+        if data.get('base_url') and not data.get('api_key'):
+            raise ValidationError("请求指定 base_url 时必须同时提供自己的 api_key")
+        values = {k: data[k] for k in SERVER_REQUEST_FIELDS if data.get(k) is not None}
+        try:
+            config = GenerationConfig(**values)
+        except TypeError as e:
+            raise ValidationError(f"请求字段无效: {e}")
+        validate_parameters(config.topic, config.style, config.word_count, config.platform, config.max_tokens)
+        config.api_key = resolve_api_key(config.platform, config.api_key, self.config_file)
+        if not config.api_key:
+            raise ValidationError(f"服务端缺少API Key，请设置环境变量 {API_KEY_ENV_VARS[config.platform]}")
+        config.use_cache = self.use_cache
+        config.cache_path = self.config_file.get('cache_path')
+        if config.base_url is None:
+            config.base_url = self.base_url
+        return config
 
-def save_output(
-    content: str,
-    output_path: Optional[str] = None,
-    topic: str = "article"
-) -> str:
+    def generate(self, config: GenerationConfig, on_chunk: Optional[Callable[[str], None]] = None) -> GenerationResult:
+        """占用一个并发名额执行生成；名额用完时排队"""
+        self._bump('queued')
+        self._slots.acquire()
+        self._bump('queued', -1)
+        self._bump('active')
+        try:
+            generator = create_generator(config)
+            if config.stream and on_chunk is not None:
+                generator.add_sink(CallbackSink(on_chunk))
+            result = generator.generate()
+            if self.metrics is not None:
+                self.metrics.export(result, config.topic)
+            self._bump('completed')
+            return result
+        except BaseException:
+            self._bump('failed')
+            raise
+        finally:
+            self._bump('active', -1)
+            self._slots.release()
+
+    def make_handler(self) -> type:
+        """创建绑定到本服务的请求处理类"""
+        from http.server import BaseHTTPRequestHandler
+        app = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                logger.debug(f"{self.address_string()} {format % args}")
+
+            def _check_auth(self) -> bool:
+                if app.authorized(self.headers.get('Authorization')):
+                    return True
+                self._send_json(401, {'error': "未授权：缺少或错误的服务令牌", 'type': 'ValidationError'})
+                return False
+
+            def do_GET(self) -> None:
+                if self.path == '/queue' and not self._check_auth():
+                    return
+                if self.path in ('/health', '/queue'):
+                    self._send_json(200, app.status())
+                else:
+                    self._send_json(404, {'error': f"未知路径: {self.path}"})
+
+            def do_POST(self) -> None:
+                if not self._check_auth():
+                    self.close_connection = True
+                    return
+                if self.path != '/generate':
+                    self._send_json(404, {'error': f"未知路径: {self.path}"})
+                    return
+                try:
+                    length = int(self.headers.get('Content-Length') or 0)
+                    config = app.build_config(json.loads(self.rfile.read(length) or b'{}'))
+                except ValueError as e:
+                    self._send_json(400, {'error': f"请求体不是有效的JSON: {e}", 'type': 'ValidationError'})
+                    return
+                except ViralContentError as e:
+                    self._send_json(400, {'error': str(e), 'type': type(e).__name__})
+                    return
+
+                if config.stream:
+                    self._generate_stream(config)
+                    return
+                try:
+                    result = app.generate(config)
+                except ViralContentError as e:
+                    self._send_json(502, {'error': str(e), 'type': type(e).__name__})
+                    return
+                self._send_json(200, result_to_dict(result))
+
+            def _generate_stream(self, config: GenerationConfig) -> None:
+                # 以 chunked 编码逐行输出JSON，客户端边收边显示
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson; charset=utf-8')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+
+                def send(record: Dict[str, Any]) -> None:
+                    data = (json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8')
+                    self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+                    self.wfile.flush()
+
+                disconnected = False
+
+                def on_chunk(text: str) -> None:
+                    # 客户端断开后继续生成完（结果进入响应缓存，重试时直接命中），只是不再发送
+                    nonlocal disconnected
+                    if disconnected:
+                        return
+                    try:
+                        send({'type': 'chunk', 'text': text})
+                    except (BrokenPipeError, ConnectionResetError):
+                        logger.warning("客户端已断开，丢弃剩余输出")
+                        disconnected = True
+
+                try:
+                    result = app.generate(config, on_chunk=on_chunk)
+                    record = {'type': 'result', 'result': result_to_dict(result)}
+                except ViralContentError as e:
+                    record = {'type': 'error', 'error': str(e), 'error_type': type(e).__name__}
+                if disconnected:
+                    self.close_connection = True
+                    return
+                try:
+                    send(record)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True
+
+            def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+                payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        return Handler
+
+    def serve_forever(self, host: str, port: int) -> None:
+        """启动HTTP服务并阻塞运行，Ctrl+C 退出"""
+        from http.server import ThreadingHTTPServer
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 128
+
+        httpd = Server((host, port), self.make_handler())
+        logger.info(f"生成服务已启动: http://{host}:{httpd.server_address[1]} (并发 {self.concurrency})")
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+            client_pool.close()
+
+
+def generate_remote(
+    server: str,
+    config: GenerationConfig,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    timeout: float = DEFAULT_HTTP_TIMEOUT,
+    token: Optional[str] = None
+) -> GenerationResult:
     """
-    保存生成的内容
+    把生成任务转发到常驻服务
 
     Args:
-        content: 生成的内容
-        output_path: 输出文件路径（可选）
-        topic: 文章主题（用于自动命名）
+        server: 服务地址（http://host:port 或 host:port）
+        config: 生成配置（api_key 为空时由服务端解析）
+        on_chunk: 流式模式下每收到一块文本时的回调
+        timeout: 请求超时（秒）
+        token: 服务令牌（服务端以 --serve-token 启动时需要）
 
     Returns:
-        str: 保存的文件路径
+        GenerationResult: 生成结果
+
+    Raises:
+        APIError: 当无法连接服务或生成失败时
+        ValidationError: 当服务端拒绝请求参数时
     """
+    from urllib.error import HTTPError, URLError
+    from urllib.request import Request, urlopen
+
+    base = server if '://' in server else f"http://{server}"
+    payload = {k: getattr(config, k) for k in SERVER_REQUEST_FIELDS if getattr(config, k) is not None}
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f"Bearer {token}"
+    request = Request(
+        f"{base.rstrip('/')}/generate",
+        data=json.dumps(payload, ensure_ascii=False).encode('utf-8'),
+        headers=headers,
+        method='POST'
+    )
+
+    def raise_remote(message: str, error_type: Optional[str]) -> None:
+        if error_type == 'ValidationError':
+            raise ValidationError(message)
+        raise APIError(message)
+
     try:
-        if output_path:
-            file_path = Path(output_path)
-        else:
-            # 自动生成文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_topic = "".join(c for c in topic if c.isalnum() or c in (' ', '-', '_'))[:30]
-            filename = f"{safe_topic}_{timestamp}.md"
-            file_path = Path(filename)
+        with urlopen(request, timeout=timeout) as response:
+            if not config.stream:
+                return result_from_dict(json.loads(response.read()))
+            for line in response:
+                record = json.loads(line)
+                if record['type'] == 'chunk':
+                    if on_chunk is not None:
+                        on_chunk(record['text'])
+                elif record['type'] == 'result':
+                    return result_from_dict(record['result'])
+                else:
+                    raise_remote(record.get('error', '生成失败'), record.get('error_type'))
+    except HTTPError as e:
+        try:
+            body = json.loads(e.read())
+        except ValueError:
+            body = {}
+        raise_remote(body.get('error') or f"生成服务返回 {e.code}", body.get('type'))
+    except URLError as e:
+        raise APIError(f"无法连接生成服务 {base}: {e.reason}") from e
+    raise APIError("生成服务未返回结果")
 
-        # 确保目录存在
-        file_path.parent.mkdir(parents=True, exist_ok=True)
 
-        # 添加元数据头部
-        metadata = f"""---
-生成时间: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
-工具: 爆款内容生成器 v3.1
----
+# ============================================================================
+# 主函数
+# ============================================================================
 
-"""
-        full_content = metadata + content
+def _max_continuations(args: argparse.Namespace, config_file: Dict[str, Any]) -> int:
+    """续写次数上限：命令行优先，其次 config.yaml"""
+    if args.max_continuations is not None:
+        return max(0, args.max_continuations)
+    return max(0, int(config_file.get('max_continuations', DEFAULT_MAX_CONTINUATIONS)))
 
-        # 保存文件
-        with open(file_path, 'w', encoding='utf-8') as f:
-            f.write(full_content)
 
-        logger.info(f"内容已保存到: {file_path.absolute()}")
-        return str(file_path.absolute())
+def _length_settings(args: argparse.Namespace, config_file: Dict[str, Any]) -> Dict[str, Any]:
+    """字数截止策略与容差：命令行优先，其次 config.yaml"""
+    policy = args.length_stop or config_file.get('length_stop', DEFAULT_STOP_POLICY)
+    if policy not in STOP_POLICIES:
+        raise ValidationError(f"无效的截止策略: {policy}，可选: {list(STOP_POLICIES)}")
+    tolerance = args.length_tolerance
+    if tolerance is None:
+        tolerance = float(config_file.get('length_tolerance', DEFAULT_LENGTH_TOLERANCE))
+    if tolerance < 0:
+        raise ValidationError(f"字数容差不能为负数: {tolerance}")
+    return {'stop_policy': policy, 'length_tolerance': tolerance}
 
-    except Exception as e:
-        logger.error(f"保存文件失败: {e}")
-        raise
 
+def _server_token(args: argparse.Namespace, config_file: Dict[str, Any]) -> Optional[str]:
+    """服务令牌：命令行优先，其次环境变量与 config.yaml"""
+    return args.serve_token or os.getenv(SERVER_TOKEN_ENV_VAR) or config_file.get('server_token') or None
 
-# ============================================================================
-# 配置文件支持
-# ============================================================================
 
-def load_config() -> Dict[str, Any]:
+def _run_server_cli(args: argparse.Namespace, config_file: Dict[str, Any], metrics: MetricsTarget) -> int:
+    """执行 --serve 常驻服务模式"""
+    host, port = parse_server_address(args.serve)
+    token = _server_token(args, config_file)
+    if not token and not is_loopback_host(host):
+        raise ValidationError(
+            f"监听非本机地址 {host} 时必须设置服务令牌（--serve-token 或环境变量 {SERVER_TOKEN_ENV_VAR}）"
+        )
+    app = GenerationServer(
+        config_file,
+        concurrency=config_file.get('server_concurrency', DEFAULT_SERVER_CONCURRENCY),
+        base_url=args.base_url,
+        token=token,
+        metrics=metrics,
+        use_cache=not args.no_cache
+    )
+    # 提前加载默认风格的Skill提示词，首个请求无需读取文件
+    load_skill_prompt(GenerationConfig(topic='', style=args.style, full_skill=args.full_skill))
+    print(f"生成服务: http://{host}:{port}  （Ctrl+C 停止）")
+    try:
+        app.serve_forever(host, port)
+    except KeyboardInterrupt:
+        logger.info("生成服务已停止")
+    return 0
+
+
+def _run_remote_cli(
+    args: argparse.Namespace,
+    config_file: Dict[str, Any],
+    server: str,
+    metrics: MetricsTarget
+) -> int:
+    """执行 --server 客户端模式：参数在本地校验，生成在常驻服务中完成，结果保存到本地"""
+    validate_parameters(args.topic, args.style, args.words, args.platform, args.max_tokens)
+    config = GenerationConfig(
+        topic=args.topic,
+        style=args.style,
+        word_count=args.words,
+        platform=args.platform,
+        api_key=args.api_key,
+        model=args.model,
+        temperature=args.temperature,
+        max_tokens=args.max_tokens,
+        stream=args.stream,
+        prompt_cache=not args.no_prompt_cache,
+        target_platform=args.target_platform,
+        full_skill=args.full_skill,
+        base_url=args.base_url,
+        max_continuations=_max_continuations(args, config_file),
+        **_length_settings(args, config_file)
+    )
+    if args.no_cache or args.refresh:
+        logger.warning("--server 模式下是否使用响应缓存由常驻服务决定，忽略 --no-cache/--refresh")
+    output_file = args.output or str(default_output_path(args.topic))
+    sinks: List[StreamSink] = [StdoutSink(), FileSink(output_file)] if args.stream else []
+
+    def on_chunk(text: str) -> None:
+        for sink in sinks:
+            sink.write(text)
+
+    for sink in sinks:
+        sink.open()
+    try:
+        result = generate_remote(server, config, on_chunk=on_chunk, token=_server_token(args, config_file))
+    finally:
+        for sink in sinks:
+            sink.close()
+    record_quality(result, config)
+    start = time.perf_counter()
+    output_path = save_output(result.content, output_file, args.topic)
+    result.timings.save = time.perf_counter() - start
+    metrics.export(result, args.topic)
+    _print_result(result, output_path)
+    return 0
+
+
+def _open_job_store(args: argparse.Namespace, config_file: Dict[str, Any], must_exist: bool = False) -> JobStore:
+    """打开任务库（默认 output_dir/batch_jobs.sqlite3）"""
+    path = Path(args.job_db or config_file.get('job_db') or Path(args.output_dir) / DEFAULT_JOB_DB_NAME)
+    if must_exist and not path.exists():
+        raise ValidationError(f"任务库不存在: {path}，请先使用 --batch 创建")
+    return JobStore(
+        str(path),
+        lease_seconds=config_file.get('job_lease_seconds', DEFAULT_JOB_LEASE_SECONDS),
+        max_attempts=config_file.get('job_max_attempts', DEFAULT_JOB_MAX_ATTEMPTS),
+        wal=config_file.get('job_db_wal', True)
+    )
+
+
+def _article_store(
+    args: argparse.Namespace,
+    config_file: Dict[str, Any],
+    required: bool = False
+) -> Optional[ArticleStore]:
     """
-    加载配置文件
+    按 --store 与配置文件 article_store 打开文章库
+
+    Args:
+        required: 为True时（查询、导出、导入）总是打开，未指定路径时使用默认文章库
 
     Returns:
-        Dict: 配置字典
+        Optional[ArticleStore]: 未启用文章库时返回None
     """
-    if not CONFIG_PATH.exists():
-        return {}
-
-    try:
-        import yaml
-        with open(CONFIG_PATH, 'r', encoding='utf-8') as f:
-            config = yaml.safe_load(f) or {}
-        logger.info(f"已加载配置文件: {CONFIG_PATH}")
-        return config
-    except ImportError:
-        logger.warning("未安装pyyaml，跳过配置文件加载")
-        return {}
-    except Exception as e:
-        logger.warning(f"加载配置文件失败: {e}")
-        return {}
+    configured = config_file.get('article_store')
+    if args.store is None and not configured and not required:
+        return None
+    path = args.store or (configured if isinstance(configured, str) else None)
+    return get_article_store(path)
+
+
+def _parse_store_filters(spec: Optional[str]) -> Dict[str, Any]:
+    """解析 --where "platform=claude,style=专业风格,topic=AI,since=2026-01-01,until=2026-02-01,min_score=20" """
+    filters: Dict[str, Any] = {}
+    for item in (spec or '').split(','):
+        if not item.strip():
+            continue
+        key, sep, value = item.partition('=')
+        key, value = key.strip(), value.strip()
+        if not sep or key not in ('platform', 'style', 'topic', 'since', 'until', 'min_score'):
+            raise ValidationError(
+                f"无效的查询条件: {item}，格式为 key=value，key 可选: platform, style, topic, since, until, min_score"
+            )
+        if key in ('since', 'until'):
+            filters[key] = parse_date(value)
+        elif key == 'min_score':
+            try:
+                filters[key] = float(value)
+            except ValueError:
+                raise ValidationError(f"无效的最低评分: {value}")
+        else:
+            filters[key] = value
+    return filters
+
+
+def _run_store_cli(args: argparse.Namespace, config_file: Dict[str, Any]) -> int:
+    """执行文章库命令：--import-md 导入、--export 导出、--search 查询、--store-stats 统计"""
+    store = _article_store(args, config_file, required=True)
+
+    if args.import_md:
+        files: List[Path] = []
+        for entry in args.import_md:
+            path = Path(entry)
+            files.extend(sorted(path.rglob('*.md')) if path.is_dir() else [path])
+        imported = skipped = 0
+        for path in files:
+            if store.import_markdown(str(path)) is None:
+                skipped += 1
+            else:
+                imported += 1
+        print(f"已导入 {imported} 篇到文章库 {store.path}" + (f"，跳过已导入的 {skipped} 篇" if skipped else ""))
+
+    if args.export:
+        ids = [int(value) for value in args.export.split(',') if value.strip()]
+        for article_id in ids:
+            output = args.output if args.output and len(ids) == 1 else None
+            if output is None:
+                article = store.get(article_id)
+                output = str(Path(args.output_dir) / (
+                    f"{safe_filename(article.topic)}_{datetime.fromtimestamp(article.created):%Y%m%d_%H%M%S}.md"
+                ))
+            print(f"📄 #{article_id} → {store.export(article_id, output)}")
+
+    if args.search is not None:
+        articles = store.query(
+            text=args.search or None, sort=args.sort, limit=args.limit, **_parse_store_filters(args.where)
+        )
+        for article in articles:
+            score = f"{article.score:4.1f}分" if article.score is not None else "  -  "
+            print(
+                f"#{article.id}  {article.created_text}  {score}  {article.platform or '-'}/{article.model or '-'}  "
+                f"{article.style or '-'}  {article.words}字  {article.topic}"
+            )
+        print(f"共 {len(articles)} 篇" + ("（已达到 --limit）" if len(articles) >= args.limit else ""))
 
+    if args.store_stats:
+        stats = store.stats()
+        print(f"文章库: {stats['path']}")
+        print(f"文章数: {stats['articles']}，正文压缩后 {stats['body_bytes'] / 1024:.1f}KB，文件 {stats['file_bytes'] / 1024:.1f}KB")
+        for platform, count in stats['platforms'].items():
+            print(f"  {platform}: {count}")
+    return 0
 
-# ============================================================================
-# 主函数
-# ============================================================================
 
-def main() -> int:
+def _run_score_cli(args: argparse.Namespace, config_file: Dict[str, Any]) -> int:
     """
-    主函数
+    执行 --score：批量计算结构评分并按总分排序输出
 
-    Returns:
-        int: 退出码（0表示成功，非0表示失败）
+    指定文件或目录时为其中的Markdown评分（目标字数取 --words），可用 --output 写出JSONL；
+    不指定时为文章库中的全部文章重新评分并写回。
     """
-    parser = argparse.ArgumentParser(
-        description='爆款内容生成器 - 命令行工具 v3.1',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog="""
+    start = time.perf_counter()
+    if not args.score:
+        store = _article_store(args, config_file, required=True)
+        count = store.rescore(on_batch=lambda done: print(f"已评分 {done} 篇", flush=True))
+        print(f"文章库 {store.path}: {count} 篇已评分，耗时 {time.perf_counter() - start:.2f}秒\n")
+        for article in store.query(sort='score', limit=args.limit, **_parse_store_filters(args.where)):
+            print(f"#{article.id}  {article.score:4.1f}分  {article.platform or '-'}  {article.topic}")
+        return 0
+
+    files: List[Path] = []
+    for entry in args.score:
+        path = Path(entry)
+        files.extend(sorted(path.rglob('*.md')) if path.is_dir() else [path])
+    articles = []
+    for path in files:
+        text = path.read_text(encoding='utf-8')
+        match = _FRONT_MATTER_RE.match(text)
+        topic = None
+        if match:
+            for line in match.group(1).splitlines():
+                key, _, value = line.partition(':')
+                if key.strip() == '主题':
+                    topic = value.strip()
+        articles.append((text, topic or _TIMESTAMP_SUFFIX_RE.sub('', path.stem), args.words))
+    scores = score_articles(articles)
+    print(f"已评分 {len(scores)} 篇，耗时 {time.perf_counter() - start:.2f}秒\n")
+
+    ranked = sorted(zip(files, scores), key=lambda item: item[1]['total'], reverse=True)
+    for path, score in ranked[:args.limit]:
+        print(
+            f"{score['total']:4.1f}分（H {score['hook']:.1f} K {score['knowledge']:.1f} R {score['resonance']:.1f}）"
+            f"{' ✅' if score['passed'] else ''}  {path}"
+        )
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for path, score in ranked:
+                f.write(json.dumps({'path': str(path), **score}, ensure_ascii=False) + '\n')
+        print(f"\n评分明细: {Path(args.output).absolute()}")
+    return 0
+
+
+def _adaptive_router(
+    args: argparse.Namespace,
+    config_file: Dict[str, Any],
+    capacity: Optional[Dict[str, int]] = None
+) -> Optional[AdaptiveRouter]:
+    """按 --route 与配置文件 route 创建自适应路由（未启用时返回None）"""
+    spec = args.route or config_file.get('route')
+    if not spec:
+        return None
+    backends = parse_route_spec(spec)
+    api_keys = {
+        backend.platform: resolve_api_key(
+            backend.platform, args.api_key if backend.platform == args.platform else None, config_file
+        )
+        for backend in backends
+    }
+    return AdaptiveRouter(
+        backends,
+        api_keys,
+        stats=RouterStats(
+            config_file.get('route_stats_path'),
+            alpha=config_file.get('route_alpha', DEFAULT_ROUTER_ALPHA)
+        ),
+        capacity=capacity,
+        explore=config_file.get('route_explore', DEFAULT_ROUTER_EXPLORE)
+    )
+
+
+def _run_route_stats_cli(args: argparse.Namespace, config_file: Dict[str, Any]) -> int:
+    """执行 --route-stats：显示各路由候选的滚动统计"""
+    backends = parse_route_spec(args.route or config_file.get('route') or ','.join(SUPPORTED_PLATFORMS))
+    stats = RouterStats(config_file.get('route_stats_path'))
+    print(f"路由统计: {stats.path}")
+    for row in route_report(backends, stats):
+        speed = f"{row['seconds_per_kword']:.1f}秒/千字" if row['seconds_per_kword'] is not None else "无样本"
+        ttft = f"首字 {row['ttft']:.2f}秒" if row['ttft'] is not None else "首字 -"
+        state = "" if row['available'] else "  ⚠️ 熔断中"
+        print(
+            f"  {row['backend']:<40} {speed:<12} {ttft:<12} 错误率 {row['error_rate']:.0%}  "
+            f"权重 {row['cost']:g}  样本 {row['samples']}{state}"
+        )
+    return 0
+
+
+def _duplicate_checker(args: argparse.Namespace, config_file: Dict[str, Any]) -> Optional[DuplicateChecker]:
+    """按 --dedup 与配置文件创建近重复检测（off 时返回None）"""
+    mode = args.dedup or config_file.get('dedup', DEFAULT_DEDUP_MODE)
+    if mode == 'off':
+        return None
+    return DuplicateChecker(
+        mode,
+        index=get_similarity_index(config_file.get('dedup_path')),
+        topic_threshold=config_file.get('dedup_topic_threshold', DEFAULT_TOPIC_SIMILARITY),
+        article_threshold=config_file.get('dedup_article_threshold', DEFAULT_ARTICLE_SIMILARITY)
+    )
+
+
+def _print_job_stats(store: JobStore) -> None:
+    stats = store.stats()
+    print(
+        f"任务库: {stats['path']}\n"
+        f"共 {stats['total']} 个任务: 已完成 {stats['done']}，等待 {stats['pending']}，"
+        f"执行中 {stats['running']}，失败 {stats['failed']}，跳过 {stats['skipped']}"
+    )
+    if stats['tokens_used'] > 0:
+        print(f"Token使用: {stats['tokens_used']}")
+
+
+def _run_job_status_cli(args: argparse.Namespace, config_file: Dict[str, Any]) -> int:
+    """执行 --job-status：显示任务库各状态数量与最近的失败"""
+    store = _open_job_store(args, config_file, must_exist=True)
+    _print_job_stats(store)
+    failures = store.failures()
+    if failures:
+        print("\n最近失败的任务:")
+        for failure in failures:
+            print(
+                f"  [{failure['seq']}] {failure['topic']} ({failure['platform']}，"
+                f"尝试 {failure['attempts']} 次): {failure['error']}"
+            )
+    return 0
+
+
+def _run_job_queue_cli(
+    args: argparse.Namespace,
+    config_file: Dict[str, Any],
+    store: JobStore,
+    metrics: MetricsTarget
+) -> int:
+    """执行任务库中未完成的任务并输出汇总"""
+    api_keys = {
+        platform: resolve_api_key(
+            platform, args.api_key if platform == args.platform else None, config_file
+        )
+        for platform in SUPPORTED_PLATFORMS
+    }
+    workers = parse_worker_spec(args.workers or config_file.get('batch_workers'))
+
+    print(f"并发: {workers}")
+    print("-" * 60)
+
+    def report(record: Dict[str, Any]) -> None:
+        if record['status'] == 'ok':
+            mark = "✅"
+        elif record['status'] == 'skipped':
+            mark = "⏭️"
+        elif record.get('job_status') == 'pending':
+            mark = "🔁"
+        else:
+            mark = "❌"
+        line = f"{mark} [{record['index']}] {record['topic']}"
+        if record.get('similar_topic'):
+            line += f"（主题与「{record['similar_topic']}」相似 {record['topic_similarity']:.0%}）"
+        if record.get('similar_article'):
+            line += f"（正文与「{record['similar_article']}」相似 {record['article_similarity']:.0%}）"
+        print(line, flush=True)
+
+    checker = _duplicate_checker(args, config_file)
+    router = _adaptive_router(args, config_file, capacity={
+        platform: workers.get(platform, DEFAULT_BATCH_WORKERS) for platform in SUPPORTED_PLATFORMS
+    })
+    if router is not None:
+        print(f"自适应路由: {', '.join(backend.key for backend in router.backends)}")
+    summary = run_job_queue(
+        store, args.output_dir, workers, api_keys, on_record=report,
+        checker=checker, article_store=_article_store(args, config_file), router=router, metrics=metrics
+    )
+
+    print("\n" + "=" * 60)
+    print(
+        f"本次执行: 成功 {summary.succeeded}/{summary.total}，失败 {summary.failed}，"
+        f"跳过 {summary.skipped}"
+    )
+    if summary.tokens_used > 0:
+        print(f"Token使用: {summary.tokens_used}")
+    print(f"耗时: {summary.duration_seconds:.2f}秒")
+    _print_job_stats(store)
+    print(f"结果清单: {summary.manifest_path}")
+    print("=" * 60)
+    stats = store.stats()
+    return 0 if stats['failed'] == 0 and stats['pending'] == 0 else 1
+
+
+def _run_batch_cli(args: argparse.Namespace, config_file: Dict[str, Any], metrics: MetricsTarget) -> int:
+    """执行 --batch 批量模式：主题入队后执行，重跑时跳过已完成的任务"""
+    defaults = {
+        'style': args.style,
+        'word_count': args.words,
+        'platform': args.platform,
+        'model': args.model,
+        'temperature': args.temperature,
+        'max_tokens': args.max_tokens,
+        'prompt_cache': not args.no_prompt_cache,
+        'target_platform': args.target_platform,
+        'full_skill': args.full_skill,
+        'use_cache': not args.no_cache,
+        'refresh_cache': args.refresh,
+        'cache_path': config_file.get('cache_path'),
+        'base_url': args.base_url or config_file.get('base_url'),
+        'max_continuations': _max_continuations(args, config_file),
+        **_length_settings(args, config_file),
+    }
+    configs = load_topics(args.batch, defaults)
+    store = _open_job_store(args, config_file)
+    added = store.enqueue(configs)
+    if args.retry_failed:
+        store.retry_failed()
+
+    print(f"\n批量生成 {len(configs)} 个主题，新增任务 {added} 个，已在任务库中（含重复）{len(configs) - added} 个")
+    return _run_job_queue_cli(args, config_file, store, metrics)
+
+
+def _run_resume_cli(args: argparse.Namespace, config_file: Dict[str, Any], metrics: MetricsTarget) -> int:
+    """执行 --resume：继续执行任务库中未完成的任务"""
+    store = _open_job_store(args, config_file, must_exist=True)
+    if args.retry_failed:
+        retried = store.retry_failed()
+        if retried:
+            print(f"已将 {retried} 个失败任务重新放回队列")
+    print("\n继续执行未完成的任务")
+    return _run_job_queue_cli(args, config_file, store, metrics)
+
+
+def _print_result(result: GenerationResult, output_path: str) -> None:
+    """打印生成结果摘要"""
+    print("\n" + "=" * 60)
+    print("✅ 生成成功！")
+    print("=" * 60)
+    print(f"文件路径: {output_path}")
+    print(f"平台/模型: {result.platform} / {result.model}")
+    print(f"内容长度: {len(result.content)}字")
+    if result.word_count:
+        print(f"字数统计: {result.word_count}（偏差 {result.word_deviation:+.1%}）")
+    if result.stopped_early:
+        print("⏹  已达到目标字数，在段落边界提前结束生成")
+    if result.quality:
+        quality = result.quality
+        print(
+            f"结构评分: H {quality['hook']:.1f} + K {quality['knowledge']:.1f} + R {quality['resonance']:.1f}"
+            f" = {quality['total']:.1f}/30{'（达到及格线）' if quality['passed'] else ''}，"
+            f"4次判断 相关性 {quality['relevance']:.0%} / 信任度 {quality['trust']:.0%} / "
+            f"价值感 {quality['value']:.0%} / 关注 {quality['follow']:.0%}"
+        )
+    if result.tokens_used > 0:
+        print(f"Token使用: {result.tokens_used}")
+    if result.cache_read_tokens or result.cache_write_tokens:
+        print(f"提示词缓存: 命中 {result.cache_read_tokens} / 写入 {result.cache_write_tokens} tokens")
+    print(f"耗时: {result.duration_seconds:.2f}秒")
+    timings = result.timings
+    if timings.ttft is not None:
+        print(f"首字延迟: {timings.ttft:.2f}秒")
+    if timings.tokens_per_second:
+        print(f"输出速度: {timings.tokens_per_second:.1f} tokens/秒")
+    if timings.retries:
+        print(f"重试次数: {timings.retries}")
+    if result.cached:
+        print("♻️  结果来自本地响应缓存（使用 --refresh 重新生成）")
+    if result.continuations:
+        print(f"续写次数: {result.continuations}")
+    if result.truncated:
+        print("⚠️  续写次数已用完，内容仍被截断，尝试增加 --max-continuations / --max-tokens 或使用 --long-form")
+    print("=" * 60)
+
+
+def _run_long_form_cli(args: argparse.Namespace, config: GenerationConfig, metrics: MetricsTarget) -> int:
+    """执行 --long-form 长文模式"""
+    print(f"\n长文模式：使用 {args.platform} 生成约 {args.words} 字")
+    print(f"主题：{args.topic}")
+    print("-" * 60)
+
+    def report(index: int, section: OutlineSection) -> None:
+        print(f"✅ 第{index + 1}部分完成: {section.title}（{section.word_count}字预算）", flush=True)
+
+    # 流式输出时各部分按顺序写出，不再打印完成进度以免与正文交错
+    output_file = args.output or str(default_output_path(args.topic))
+    sinks: List[StreamSink] = [StdoutSink(), FileSink(output_file)] if args.stream else []
+    generator = LongFormGenerator(config, max_workers=args.section_workers, sinks=sinks)
+    result = generator.generate(on_section=None if sinks else report)
+    record_quality(result, config)
+    start = time.perf_counter()
+    output_path = save_output(result.content, output_file, args.topic)
+    result.timings.save = time.perf_counter() - start
+    metrics.export(result, args.topic)
+    _print_result(result, output_path)
+    return 0
+
+
+def _run_matrix_cli(args: argparse.Namespace, config: GenerationConfig, metrics: MetricsTarget) -> int:
+    """执行 --matrix 内容矩阵模式"""
+    targets = parse_matrix_spec(args.matrix)
+    print(f"\n内容矩阵：使用 {args.platform} 生成约 {args.words} 字母版，改编为 {'、'.join(targets)}")
+    print(f"主题：{args.topic}")
+    print("-" * 60)
+
+    output_file = args.output or str(default_output_path(args.topic))
+    saved: Dict[str, str] = {}
+
+    # 配置加载耗时只计入母版一次
+    variant_metrics = MetricsTarget(metrics.path)
+
+    def on_master(result: GenerationResult) -> None:
+        saved['母版'] = save_output(result.content, output_file, args.topic)
+        metrics.export(result, args.topic)
+        print(f"✅ 母版完成（{len(result.content)}字），开始并发改编", flush=True)
+
+    def on_variant(target: str, result: Optional[GenerationResult], error: Optional[str]) -> None:
+        if result is None:
+            print(f"❌ {target}: {error}", flush=True)
+            return
+        saved[target] = save_output(result.content, matrix_output_path(output_file, target), args.topic)
+        variant_metrics.export(result, f"{args.topic}（{target}）")
+        print(f"✅ {target}（{len(result.content)}字）", flush=True)
+
+    generator = MatrixGenerator(
+        config, targets, max_workers=args.section_workers, long_form=args.long_form
+    )
+    matrix = generator.generate(on_master=on_master, on_variant=on_variant)
+
+    print("\n" + "=" * 60)
+    print(f"内容矩阵完成: {len(matrix.variants)}/{len(targets)} 个平台")
+    print("=" * 60)
+    for name, path in saved.items():
+        print(f"{name}: {path}")
+    if matrix.tokens_used > 0:
+        print(f"Token使用: {matrix.tokens_used}（母版 {matrix.master.tokens_used}）")
+    print(f"耗时: {matrix.duration_seconds:.2f}秒（母版 {matrix.master.duration_seconds:.2f}秒）")
+    print("=" * 60)
+    return 0 if not matrix.errors else 1
+
+
+def _run_hedged_cli(
+    args: argparse.Namespace,
+    config: GenerationConfig,
+    config_file: Dict[str, Any],
+    metrics: MetricsTarget
+) -> int:
+    """执行 --hedge 对冲模式"""
+    backup_platform, backup_model = parse_platform_spec(args.hedge)
+    backup_key = resolve_api_key(backup_platform, None, config_file)
+    if not backup_key:
+        raise ValidationError(f"备用平台缺少API Key，请设置环境变量 {API_KEY_ENV_VARS[backup_platform]}")
+    backup = replace(config, platform=backup_platform, model=backup_model, api_key=backup_key)
+
+    print(f"\n对冲模式：主平台 {config.platform}，备用平台 {backup_platform}")
+    print(f"主题：{args.topic}")
+    print("-" * 60)
+
+    output_file = args.output or str(default_output_path(args.topic))
+    sinks: List[StreamSink] = [StdoutSink(), FileSink(output_file)] if args.stream else []
+    result = generate_hedged(config, backup, args.hedge_delay, sinks=sinks)
+    record_quality(result, config)
+    start = time.perf_counter()
+    output_path = save_output(result.content, output_file, args.topic)
+    result.timings.save = time.perf_counter() - start
+    metrics.export(result, args.topic)
+    _print_result(result, output_path)
+    return 0
+
+
+def _cli_epilog() -> str:
+    """命令行帮助末尾的示例与说明（只在显示帮助时生成）"""
+    return """
 示例:
   # 基本使用
   %(prog)s "AI工具使用技巧"
@@ -670,6 +6817,15 @@ def main() -> int:
   # 保存到指定文件
   %(prog)s "AI工具使用技巧" -o article.md
 
+  # 批量生成（CSV/JSONL，每行可覆盖 style/words/platform/model）
+  %(prog)s --batch topics.csv --workers openai=32,claude=16 --output-dir out/
+
+  # 内容矩阵：一篇母版 + 抖音/小红书/B站/知乎 改编版
+  %(prog)s "AI工具使用技巧" --matrix 抖音,小红书,B站,知乎
+
+  # 批量任务中断后继续执行（也可在其他进程/机器上同时运行以增加并发）
+  %(prog)s --resume --output-dir out/
+
   # 完整示例
   %(prog)s "AI工具使用技巧" \\
     --style 老司机风格 \\
@@ -688,12 +6844,34 @@ def main() -> int:
 
 配置文件:
   config.yaml - 在项目目录下创建配置文件，可设置默认值
-        """
+"""
+
+
+class _LazyEpilogParser(argparse.ArgumentParser):
+    """显示帮助时才生成 epilog，普通调用不构建大段帮助文本"""
+
+    def format_help(self) -> str:
+        if self.epilog is None:
+            self.epilog = _cli_epilog()
+        return super().format_help()
+
+
+def main() -> int:
+    """
+    主函数
+
+    Returns:
+        int: 退出码（0表示成功，非0表示失败）
+    """
+    parser = _LazyEpilogParser(
+        description='爆款内容生成器 - 命令行工具 v3.1',
+        formatter_class=argparse.RawDescriptionHelpFormatter
     )
 
     parser.add_argument(
         'topic',
-        help='文章主题'
+        nargs='?',
+        help='文章主题（使用 --batch 时可省略）'
     )
     parser.add_argument(
         '--style',
@@ -721,6 +6899,10 @@ def main() -> int:
         '--api-key',
         help='API Key（或设置对应的环境变量）'
     )
+    parser.add_argument(
+        '--base-url',
+        help='自定义API地址（代理或本地mock服务，config.yaml: base_url）'
+    )
     parser.add_argument(
         '--output', '-o',
         help='输出文件路径（不指定则自动生成）'
@@ -733,8 +6915,33 @@ def main() -> int:
     parser.add_argument(
         '--max-tokens',
         type=int,
-        default=DEFAULT_MAX_TOKENS,
-        help=f'最大token数（默认: {DEFAULT_MAX_TOKENS}）'
+        help='单次请求最大输出token数（默认按目标字数与模型输出上限自动计算）'
+    )
+    parser.add_argument(
+        '--max-continuations',
+        type=int,
+        help=f'输出被截断时自动续写的最大次数，0为关闭（默认: {DEFAULT_MAX_CONTINUATIONS}）'
+    )
+    parser.add_argument(
+        '--length-stop',
+        choices=STOP_POLICIES,
+        help=(
+            '流式生成的字数截止策略：超过目标字数（含容差）后在下一个段落（paragraph）'
+            f'或章节（section）边界结束并关闭连接，off 为不截止（默认: {DEFAULT_STOP_POLICY}）'
+        )
+    )
+    parser.add_argument(
+        '--length-tolerance',
+        type=float,
+        help=f'字数截止的容差比例（默认: {DEFAULT_LENGTH_TOLERANCE}，即目标字数的110%%）'
+    )
+    parser.add_argument(
+        '--dedup',
+        choices=DEDUP_MODES,
+        help=(
+            '近重复检测：生成前比较历史主题、生成后比较历史文章，flag 只提示，'
+            f'skip 跳过与历史主题相似的生成，off 关闭（默认: {DEFAULT_DEDUP_MODE}）'
+        )
     )
     parser.add_argument(
         '--temperature', '-t',
@@ -742,6 +6949,214 @@ def main() -> int:
         default=0.7,
         help='温度参数（0.0-1.0，默认: 0.7）'
     )
+    parser.add_argument(
+        '--target-platform',
+        help=f'内容发布平台，只发送该平台的Skill策略章节（如: {", ".join(TARGET_PLATFORMS)}）'
+    )
+    parser.add_argument(
+        '--full-skill',
+        action='store_true',
+        help='发送完整Skill文件（默认只发送核心方法论+所选风格+目标平台章节）'
+    )
+    parser.add_argument(
+        '--no-prompt-cache',
+        action='store_true',
+        help='关闭Skill系统提示词的平台提示词缓存'
+    )
+    parser.add_argument(
+        '--long-form',
+        action='store_true',
+        help='长文模式：先生成大纲，再并发生成各部分后拼接（适合10000字以上）'
+    )
+    parser.add_argument(
+        '--matrix',
+        nargs='?',
+        const=','.join(DEFAULT_MATRIX_PLATFORMS),
+        metavar='PLATFORMS',
+        help=(
+            '内容矩阵模式：生成一篇母版后并发改编为各平台版本，'
+            f'如 抖音,小红书=1200（默认: {",".join(DEFAULT_MATRIX_PLATFORMS)}；可与 --long-form 同用）'
+        )
+    )
+    parser.add_argument(
+        '--section-workers',
+        type=int,
+        default=DEFAULT_SECTION_WORKERS,
+        help=f'长文模式下并发生成的部分数、矩阵模式下并发改编的平台数（默认: {DEFAULT_SECTION_WORKERS}）'
+    )
+    parser.add_argument(
+        '--hedge',
+        metavar='PLATFORM[:MODEL]',
+        help='对冲请求：主平台在 --hedge-delay 秒内无首token时，同时请求该备用平台，取先完成者'
+    )
+    parser.add_argument(
+        '--hedge-delay',
+        type=float,
+        help=f'对冲等待秒数（默认取主平台首token延迟p95，无样本时 {DEFAULT_HEDGE_DELAY:.0f} 秒）'
+    )
+    parser.add_argument(
+        '--route',
+        nargs='?',
+        const=','.join(SUPPORTED_PLATFORMS),
+        metavar='SPEC',
+        help=(
+            '自适应路由：按各平台/模型最近的耗时、首字延迟与错误率（EWMA）把每个任务发往预计最快的候选，'
+            '失败时自动切换；SPEC 如 "openai:gpt-4o-mini,claude=1.5,gemini"（=后为成本权重，'
+            '不带SPEC时为全部平台；config.yaml: route）'
+        )
+    )
+    parser.add_argument(
+        '--route-stats',
+        action='store_true',
+        help='显示自适应路由各候选的滚动统计后退出'
+    )
+    parser.add_argument(
+        '--rpm',
+        type=float,
+        help='客户端限流：所选平台每分钟最大请求数（多进程共享）'
+    )
+    parser.add_argument(
+        '--tpm',
+        type=float,
+        help='客户端限流：所选平台每分钟最大token数（多进程共享）'
+    )
+    parser.add_argument(
+        '--serve',
+        nargs='?',
+        const=DEFAULT_SERVER_ADDRESS,
+        metavar='HOST:PORT',
+        help=f'以常驻服务模式运行，复用SDK客户端、连接与Skill（默认: {DEFAULT_SERVER_ADDRESS}）'
+    )
+    parser.add_argument(
+        '--server',
+        metavar='URL',
+        help='把生成任务转发到已运行的常驻服务（如 127.0.0.1:8766，config.yaml: server）'
+    )
+    parser.add_argument(
+        '--serve-token',
+        metavar='TOKEN',
+        help='常驻服务的共享令牌：--serve 时要求、--server 时携带'
+             f'（环境变量 {SERVER_TOKEN_ENV_VAR}，config.yaml: server_token；监听非本机地址时必填）'
+    )
+    parser.add_argument(
+        '--no-warm-up',
+        action='store_true',
+        help='不在启动时预先导入SDK并建立API连接'
+    )
+    parser.add_argument(
+        '--metrics',
+        metavar='PATH',
+        help='导出各阶段耗时：.prom 为 Prometheus textfile，其他为追加JSON行'
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='不使用本地响应缓存'
+    )
+    parser.add_argument(
+        '--refresh',
+        action='store_true',
+        help='忽略已缓存的响应，重新生成并更新缓存'
+    )
+    parser.add_argument(
+        '--cache-stats',
+        action='store_true',
+        help='显示本地响应缓存统计并退出'
+    )
+    parser.add_argument(
+        '--batch',
+        metavar='FILE',
+        help='批量模式：从CSV/JSONL主题文件读取主题并发生成'
+    )
+    parser.add_argument(
+        '--workers',
+        help=f'批量并发数，如 16 或 openai=32,claude=16（默认每个平台 {DEFAULT_BATCH_WORKERS}）'
+    )
+    parser.add_argument(
+        '--output-dir',
+        default='.',
+        help='批量模式输出目录（默认: 当前目录）'
+    )
+    parser.add_argument(
+        '--job-db',
+        metavar='PATH',
+        help=f'批量任务库路径（默认: 输出目录/{DEFAULT_JOB_DB_NAME}），记录每个任务的状态，可多个进程共用'
+    )
+    parser.add_argument(
+        '--resume',
+        action='store_true',
+        help='继续执行任务库中未完成的任务（无需主题文件）'
+    )
+    parser.add_argument(
+        '--retry-failed',
+        action='store_true',
+        help='与 --batch 或 --resume 同用：重新执行已失败的任务'
+    )
+    parser.add_argument(
+        '--job-status',
+        action='store_true',
+        help='显示任务库中各状态的任务数与最近的失败后退出'
+    )
+    parser.add_argument(
+        '--store',
+        nargs='?',
+        const='',
+        metavar='PATH',
+        help=(
+            '把文章连同生成配置与用量保存到文章库（SQLite，正文压缩、全文索引），'
+            f'不再写出单独的Markdown文件（指定 --output 时仍写出；默认: {DEFAULT_ARTICLE_STORE_PATH}，'
+            'config.yaml: article_store）'
+        )
+    )
+    parser.add_argument(
+        '--search',
+        nargs='?',
+        const='',
+        metavar='TEXT',
+        help='在文章库中查询后退出：按主题与正文全文检索（不带TEXT时列出最近的文章），可配合 --where、--limit'
+    )
+    parser.add_argument(
+        '--where',
+        metavar='SPEC',
+        help='文章库查询条件，如 "platform=claude,style=专业风格,topic=AI,since=2026-01-01,until=2026-02-01"'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=20,
+        help='文章库查询与评分排名最多显示的篇数（默认: 20）'
+    )
+    parser.add_argument(
+        '--sort',
+        choices=('created', 'score'),
+        default='created',
+        help='文章库查询的排序：created 按生成时间，score 按结构评分（默认: created）'
+    )
+    parser.add_argument(
+        '--score',
+        nargs='*',
+        metavar='PATH',
+        help=(
+            '批量计算结构评分（HKR与4次判断的本地启发式指标）并按总分排名后退出：'
+            '指定Markdown文件或目录时为其评分（--output 写出JSONL明细），不指定时为文章库全部文章重新评分'
+        )
+    )
+    parser.add_argument(
+        '--export',
+        metavar='ID[,ID...]',
+        help='从文章库导出Markdown后退出（单篇时可用 --output 指定路径，否则写入 --output-dir）'
+    )
+    parser.add_argument(
+        '--import-md',
+        nargs='+',
+        metavar='PATH',
+        help='把已有的Markdown文件（或目录下的全部 .md）导入文章库后退出，已导入的文件会跳过'
+    )
+    parser.add_argument(
+        '--store-stats',
+        action='store_true',
+        help='显示文章库统计后退出'
+    )
     parser.add_argument(
         '--version',
         action='version',
@@ -755,38 +7170,109 @@ def main() -> int:
 
     args = parser.parse_args()
 
+    setup_logging()
+
     # 设置日志级别
     if args.verbose:
         logger.setLevel(logging.DEBUG)
 
+    if args.cache_stats:
+        stats = get_response_cache(load_config().get('cache_path')).stats()
+        for name, value in stats.items():
+            print(f"{name}: {value}")
+        return 0
+
+    if args.job_status:
+        return _run_job_status_cli(args, load_config())
+
+    if args.route_stats:
+        try:
+            return _run_route_stats_cli(args, load_config())
+        except ValidationError as e:
+            print(f"\n❌ {e}\n", file=sys.stderr)
+            return 1
+
+    if args.score is not None:
+        try:
+            return _run_score_cli(args, load_config())
+        except (ValidationError, OSError) as e:
+            print(f"\n❌ {e}\n", file=sys.stderr)
+            return 1
+
+    if args.search is not None or args.export or args.import_md or args.store_stats:
+        try:
+            return _run_store_cli(args, load_config())
+        except (ValidationError, OSError) as e:
+            print(f"\n❌ {e}\n", file=sys.stderr)
+            return 1
+
+    if not args.topic and not args.batch and not args.serve and not args.resume:
+        parser.error('请提供文章主题，或使用 --batch 指定主题文件')
+
+    # SDK导入在加载配置前开始；连接等连接池参数确定后再建立
+    warm_up_connect = None
+    if not args.no_warm_up:
+        from concurrent.futures import Future
+        warm_up_connect = Future()
+        start_warm_up(args.platform, args.base_url, connect=warm_up_connect)
+
     try:
         # 加载配置文件
+        start = time.perf_counter()
         config_file = load_config()
-        # 命令行参数优先级高于配置文件
-        api_key = args.api_key or config_file.get(f'{args.platform}_api_key')
+        metrics_path = args.metrics or config_file.get('metrics_path')
+        metrics = MetricsTarget(metrics_path, time.perf_counter() - start)
 
         logger.info("=" * 60)
         logger.info("爆款内容生成器 v3.1 启动")
         logger.info("=" * 60)
 
+        server = args.server or config_file.get('server')
+        if server and not (
+            args.serve or args.batch or args.resume or args.long_form or args.hedge or args.matrix
+        ):
+            return _run_remote_cli(args, config_file, server, metrics)
+
+        client_pool.configure(
+            max_connections=config_file.get('http_max_connections', DEFAULT_HTTP_MAX_CONNECTIONS),
+            max_keepalive=config_file.get('http_max_keepalive', DEFAULT_HTTP_MAX_KEEPALIVE)
+        )
+        limits = dict(config_file.get('rate_limits') or {})
+        if args.rpm or args.tpm:
+            limits[args.platform] = {'rpm': args.rpm, 'tpm': args.tpm}
+        configure_rate_limits(limits, config_file.get('rate_limit_path'))
+
+        # 连接池参数确定后立即建立预热连接，与参数校验、Skill加载并行
+        if warm_up_connect is not None:
+            if config_file.get('warm_up', True):
+                warm_up_connect.set_result(config_file.get('base_url'))
+            else:
+                warm_up_connect.cancel()
+
+        retry_settings = config_file.get('retry') or {}
+        for name in ('max_attempts', 'base_delay', 'max_delay', 'max_retry_after'):
+            if name in retry_settings:
+                setattr(default_retry_policy, name, retry_settings[name])
+
+        # 常驻服务与批量任务在一次配置加载后处理多篇文章，各篇不计配置加载耗时
+        if args.serve:
+            return _run_server_cli(args, config_file, MetricsTarget(metrics_path))
+        if args.batch:
+            return _run_batch_cli(args, config_file, MetricsTarget(metrics_path))
+        if args.resume:
+            return _run_resume_cli(args, config_file, MetricsTarget(metrics_path))
+
         # 验证参数
-        validate_parameters(args.topic, args.style, args.words, args.platform)
-
-        # 获取API Key
-        if not api_key:
-            env_var_map = {
-                'openai': 'OPENAI_API_KEY',
-                'claude': 'ANTHROPIC_API_KEY',
-                'gemini': 'GOOGLE_API_KEY'
-            }
-            env_var = env_var_map[args.platform]
-            api_key = os.getenv(env_var)
-
-            if not api_key:
-                error_msg = f"错误：请提供API Key或设置环境变量 {env_var}"
-                logger.error(error_msg)
-                print(f"\n{error_msg}\n", file=sys.stderr)
-                return 1
+        validate_parameters(args.topic, args.style, args.words, args.platform, args.max_tokens)
+
+        # 获取API Key（命令行参数优先级高于配置文件和环境变量）
+        api_key = resolve_api_key(args.platform, args.api_key, config_file)
+        router = _adaptive_router(args, config_file)
+        if not api_key and router is None:
+            error_msg = f"错误：请提供API Key或设置环境变量 {API_KEY_ENV_VARS[args.platform]}"
+            logger.error(error_msg)
+            print(f"\n{error_msg}\n", file=sys.stderr)
+            return 1
 
         # 创建生成配置
         config = GenerationConfig(
@@ -799,37 +7285,102 @@ def main() -> int:
             temperature=args.temperature,
             max_tokens=args.max_tokens,
             stream=args.stream,
-            output_path=args.output
+            output_path=args.output,
+            prompt_cache=not args.no_prompt_cache,
+            target_platform=args.target_platform,
+            full_skill=args.full_skill,
+            use_cache=not args.no_cache,
+            refresh_cache=args.refresh,
+            cache_path=config_file.get('cache_path'),
+            base_url=args.base_url or config_file.get('base_url'),
+            max_continuations=_max_continuations(args, config_file),
+            **_length_settings(args, config_file)
         )
 
-        # 创建生成器
-        generator = create_generator(config)
+        if args.matrix:
+            return _run_matrix_cli(args, config, metrics)
+        if args.long_form:
+            return _run_long_form_cli(args, config, metrics)
+        if args.hedge:
+            return _run_hedged_cli(args, config, config_file, metrics)
+
+        # 近重复检测：与历史主题相似时提示（skip 模式下不再生成）
+        output_file = args.output or str(default_output_path(args.topic))
+        checker = _duplicate_checker(args, config_file)
+        # 使用文章库时只在指定了 --output 时另外写出文件
+        article_store = _article_store(args, config_file)
+        write_file = article_store is None or bool(args.output)
+        topic_ref = str(Path(output_file).absolute())
+        if checker is not None:
+            match = checker.check_topic(config, ref=topic_ref)
+            if match is not None:
+                print(
+                    f"\n⚠️  主题与历史主题「{match.text}」相似（{match.similarity:.0%}）"
+                    + (f"：{match.ref}" if match.ref else "")
+                )
+                if checker.skip:
+                    print("已跳过生成（--dedup flag 只提示不跳过，--dedup off 关闭检测）")
+                    return 0
+
+        # 流式模式下边生成边写入输出文件，最终由 save_output 补全元数据
+        sinks: List[StreamSink] = []
+        if args.stream:
+            sinks.append(StdoutSink())
+            if write_file:
+                sinks.append(FileSink(output_file))
+
+        # 自适应路由：平台与模型由路由按当前延迟与错误率决定
+        if router is not None:
+            if not args.stream:
+                print(f"\n自适应路由: {', '.join(backend.key for backend in router.backends)}")
+                print(f"主题：{args.topic}")
+                print("-" * 60)
+            generate = partial(router.generate, config, sinks)
+        else:
+            generator = create_generator(config)
+            for sink in sinks:
+                generator.add_sink(sink)
+            generate = generator.generate
 
         # 生成内容
-        if not args.stream:
+        if not args.stream and router is None:
             print(f"\n正在使用 {args.platform} ({generator.model}) 生成内容...")
             print(f"主题：{args.topic}")
             print(f"风格：{args.style}")
             print(f"字数：{args.words}")
+            budget = generator.budget
+            print(
+                f"预计Token：输入约 {budget.input_tokens}（Skill {budget.skill_tokens} + "
+                f"提示词 {budget.prompt_tokens}），输出约 {budget.expected_output_tokens}，"
+                f"max_tokens {generator.config.max_tokens}"
+            )
             print("-" * 60)
 
-        result = generator.generate()
+        try:
+            result = generate()
+        except BaseException:
+            if checker is not None:
+                checker.discard_topic(topic_ref)
+            raise
+        record_quality(result, config)
 
         # 保存内容
-        output_path = save_output(result.content, args.output, args.topic)
+        start = time.perf_counter()
+        if article_store is not None:
+            article_id = article_store.add(config, result)
+        if write_file:
+            output_path = save_output(result.content, output_file, args.topic)
+        else:
+            output_path = article_store.ref(article_id)
+        result.timings.save = time.perf_counter() - start
+        metrics.export(result, args.topic)
 
         # 输出结果
-        print("\n" + "=" * 60)
-        print("✅ 生成成功！")
-        print("=" * 60)
-        print(f"文件路径: {output_path}")
-        print(f"内容长度: {len(result.content)}字")
-        if result.tokens_used > 0:
-            print(f"Token使用: {result.tokens_used}")
-        print(f"耗时: {result.duration_seconds:.2f}秒")
-        if result.truncated:
-            print("⚠️  内容可能被截断，尝试增加 --max-tokens 参数")
-        print("=" * 60)
+        _print_result(result, output_path)
+        if checker is not None:
+            match = checker.check_article(result.content, args.topic, ref=output_path)
+            if match is not None:
+                print(f"⚠️  正文与历史文章「{match.text}」相似（{match.similarity:.0%}）: {match.ref}")
 
         # 如果没有指定输出文件，也打印内容预览
         if not args.output and not args.stream:
@@ -867,6 +7418,11 @@ def main() -> int:
         print(f"\n❌ 发生错误: {e}\n", file=sys.stderr)
         return 1
 
+    finally:
+        # 未走到连接池配置（远程生成、提前出错）时不再建立预热连接
+        if warm_up_connect is not None:
+            warm_up_connect.cancel()
+
 
 if __name__ == '__main__':
     sys.exit(main())